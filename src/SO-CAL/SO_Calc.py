@@ -49,7 +49,22 @@
 
 import operator
 import argparse
+import collections
+import array
+import io
+import json
+import math
+import mmap
+import multiprocessing
 import os
+import pickle
+import shutil
+import struct
+
+try:
+    import numpy
+except ImportError: # numpy is only needed for the columnar export
+    numpy = None
 
 
 def get_command_arguments():
@@ -59,7 +74,7 @@ def get_command_arguments():
     '''
     parser = argparse.ArgumentParser(description='SFU Sentiment Calculator')
     parser.add_argument('--input', '-i', type=str, dest='input', action='store',
-                        default='/Users/denggeyileao/Library/CloudStorage/OneDrive-UniversitätZürichUZH/SO-CAL/Sample/output/Preprocessed_Output/BOOKS/21_AlecLegge.txt',
+                        default='/Users/denggeyileao/Library/CloudStorage/OneDrive-UniversitätZürichUZH/SO-CAL/Sample/output/Preprocessed_Output/BOOKS/21_AlecLegge.txt',
                         help="The input folder containing SO_CAL preprocessed text files")
 
     parser.add_argument('--basicout_path', '-bo', type=str, dest='basicout_path', action='store',
@@ -70,6 +85,10 @@ def get_command_arguments():
                         default='',
                         help="The rich output")
 
+    parser.add_argument('--jsonout_path', '-jo', type=str, dest='jsonout_path', action='store',
+                        default='',
+                        help="The JSON lines output, one record per scored word, sentence and text")
+
     parser.add_argument('--config', '-c', type=str, dest='config', action='store',
                         default='/Users/denggeyileao/Desktop/SO-CAL/Resources/config_files/en_SO_Calc.ini',
                         help="The configuration file for SO-CAL")
@@ -77,16 +96,11 @@ def get_command_arguments():
     args = parser.parse_args()
     return args
 
-args = get_command_arguments()
-configfile = open(args.config, "r")
-
-basicout = open(args.basicout_path, "a")
-richout = open(args.richout_path, "a")
 
-config = {}
-
-def get_configuration_from_file():
+def get_configuration_from_file(config_path):
 # gets the configuration settings from the supplied .ini file
+    config = {}
+    configfile = open(config_path, "r")
     for line in configfile.readlines():
         if line:
             line = line.split("#")[0].strip()
@@ -117,159 +131,61 @@ def get_configuration_from_file():
                                  svalues[skey] = svalue
                              config[key] = svalues
                          else:
-                             config[key] = map(str.strip, elements)
+                             config[key] = list(map(str.strip, elements))
     configfile.close()
+    return config
 
-get_configuration_from_file()
-
-language = config["language"]
-use_adjectives = config["use_adjectives"]
-use_nouns = config["use_nouns"]
-use_verbs = config["use_verbs"]
-use_adverbs = config["use_adverbs"]
-use_intensifiers = config["use_intensifiers"]
-use_negation = config["use_negation"]
-use_comparatives = config["use_comparatives"]
-use_superlatives = config["use_superlatives"]
-use_multiword_dictionaries = config["use_multiword_dictionaries"]
-use_extra_dict = config["use_extra_dict"]
-use_XML_weighing = config["use_XML_weighing"]
-use_weight_by_location = config["use_weight_by_location"]
-use_irrealis = config["use_irrealis"]
-use_subjunctive = config["use_subjunctive"]
-use_imperative = config["use_imperative"]
-use_conditional = config["use_conditional"]
-use_highlighters = config["use_highlighters"]
-use_cap_int = config["use_cap_int"]
-fix_cap_tags = config["fix_cap_tags"]
-use_exclam_int = config["use_exclam_int"]
-use_quest_mod = config["use_quest_mod"]
-use_quote_mod = config["use_quote_mod"]
-use_definite_assertion = config["use_definite_assertion"]
-use_clause_final_int = config["use_clause_final_int"]
-use_heavy_negation = config["use_heavy_negation"]
-use_word_counts_lower = config["use_word_counts_lower"]
-use_word_counts_block = config["use_word_counts_block"]
-use_blocking = config["use_blocking"]
-adv_learning = config["adv_learning"]
-limit_shift = config["limit_shift"]
-neg_negation_nullification = config["neg_negation_nullification"]
-polarity_switch_neg = config["polarity_switch_neg"]
-restricted_neg = config["restricted_neg"]
-simple_SO = config["simple_SO"]
-use_boundary_words = config["use_boundary_words"]
-use_boundary_punct = config["use_boundary_punctuation"]
-
-### Modifiers ###
-
-adj_multiplier = config["adj_multiplier"]
-adv_multiplier = config["adv_multiplier"]
-verb_multiplier = config["verb_multiplier"]
-noun_multiplier = config["noun_multiplier"]
-int_multiplier = config["int_multiplier"]
-neg_multiplier = config["neg_multiplier"]
-capital_modifier = config["capital_modifier"]
-exclam_modifier = config["exclam_modifier"]
-verb_neg_shift = config["verb_neg_shift"]
-noun_neg_shift = config["noun_neg_shift"]
-adj_neg_shift = config["adj_neg_shift"]
-adv_neg_shift = config["adv_neg_shift"]
-blocker_cutoff = config["blocker_cutoff"]
-
-### Dictionaries ###
-
-dic_dir = config["dic_dir"]
-adj_dict_path = dic_dir + config["adj_dict"]
-adv_dict_path = dic_dir + config["adv_dict"]
-noun_dict_path = dic_dir + config["noun_dict"]
-verb_dict_path = dic_dir + config["verb_dict"]
-int_dict_path = dic_dir + config["int_dict"]
-if use_extra_dict and config["extra_dict"]:
-    extra_dict_path = dic_dir + config["extra_dict"]
-else:
-    extra_dict_path = False
-adj_dict = {} # simple (single-word) dictionaries
-adv_dict = {}
-noun_dict = {}
-verb_dict = {}
-int_dict = {}
-c_adj_dict = {} # complex (multi-word) dictionaries
-c_adv_dict = {}
-c_noun_dict = {}
-c_verb_dict = {}
-c_int_dict = {}
-new_adv_dict = {}
-
-### Text ###
-
-text = [] # the text is a list of word, tag lists
-weights = [] # weights should be the same length as the text, one for each token
-word_counts = [{},{},{},{}] # keeps track of number of times each word lemma appears in the text
-text_SO = 0 # a sum of the SO value of all the words in the text
-SO_counter = 0 # a count of the number of SO carrying terms
-boundaries = [] # the location of newline boundaries from the input
-
-### Internal Word lists ###
-if language == "English":
-    not_wanted_adj = ["other", "same", "such", "first", "next", "last", "few", "many", "less", "more", "least", "most"]
-    not_wanted_adv = [ "really", "especially", "apparently", "actually", "evidently", "suddenly", "completely","honestly", "basically", "probably", "seemingly", "nearly", "highly", "exactly", "equally", "literally", "definitely", "practically", "obviously", "immediately", "intentionally", "usually", "particularly", "shortly", "clearly", "mildly", "sincerely", "accidentally", "eventually", "finally", "personally", "importantly", "specifically", "likely", "absolutely", "necessarily", "strongly", "relatively", "comparatively", "entirely", "possibly", "generally", "expressly", "ultimately", "originally", "initially", "virtually", "technically", "frankly", "seriously", "fairly",  "approximately", "critically", "continually", "certainly",  "regularly", "essentially", "lately", "explicitly", "right", "subtly",  "lastly", "vocally", "technologically", "firstly", "tally", "ideally", "specially", "humanly", "socially", "sexually", "preferably", "immediately", "legally", "hopefully", "largely", "frequently", "factually", "typically"]
-    not_wanted_verb = []
-    negators = ["not", "no", "n't", "neither", "nor", "nothing", "never", "none", "lack", "lacked", "lacking", "lacks", "missing", "without", "absence", "devoid"];
-    punct = [".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-"]
-    sent_punct = [".", ";", "!", "?", ":", "\n", "\r"]
-    skipped = {"JJ": ["even", "to", "being", "be", "been", "is", "was", "'ve", "have", "had", "do", "did", "done", "of", "as", "DT", "PSP$"], "RB": ["VB", "VBZ", "VBP", "VBG"], "VB":["TO", "being", "been", "be"], "NN":["DT", "JJ", "NN", "of", "have", "has", "come", "with", "include"]}
-    comparatives = ["less", "more", "as"]
-    superlatives = ["most", "least"]
-    definites = ["the","this", "POS", "PRP$"]
-    noun_tag = "NN"
-    verb_tag = "VB"
-    adj_tag = "JJ"
-    adv_tag = "RB"
-    macro_replace = {"#NP?#": "[PDT]?_[DET|PRP|PRP$|NN|NNP]?_[POS]?_[NN|NNP|JJ]?_[NN|NNP|NNS|NNPS]?","#PER?#": "[me|us|her|him]?","#give#": "give|gave|given","#fall#": "fall|fell|fallen","#get#": "get|got|gotten","#come#": "come|came","#go#": "go|went|gone", "#show#": "show|shown","#make#": "make|made","#hang#": "hang|hung","#break#": "break|broke|broken", "#see#": "see|saw|seen", "#be#": "be|am|are|was|were|been", "#bring#": "bring|brought", "#think#" : "think|thought", "#have#": "has|have|had", "#blow#": "blow|blew", "#build#": "build|built", "#do#": "do|did|done", "#can#": "can|could", "#grow#":"grow|grew|grown", "#hang#": "hang|hung", "#run#": "run|ran", "#stand#": "stand|stood", "#string#": "string|strung", "#hold#" : "hold|held", "#take#" : "take|took|taken"}
-elif language == "Spanish":
-    not_wanted_adj = ["otro","mio","tuyo","suyo","nuestro","vuestro","mismo","primero","segundo","último"]
-    additional = []
-    for adj in not_wanted_adj:
-       additional += [adj[:-1] + "a",adj[:-2] + "os", adj[:-2] + "as"]
-    not_wanted_adj += additional
-    not_wanted_adv = ["básicamente", "claramente","ampliamente", "atentamente", "completamente"]
-    not_wanted_verb = ["haber", "estar"]
-    negators = ["no", "ni", "nunca", "jam"+ chr(225) + "s", "nada", "nadie", "ninguno", "ningunos", "ninguna", "ningunas", "faltar", "falta", "sin"];
-    punct = [".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-", chr(161), chr(191)]
-    sent_punct = [".", ";", "!", "?", ":", "\n", "\r", chr(161), chr(191)]
-    skipped = {"AQ": [ "a", "estar", "haber", "hacer", "de", "como", "NC", "PP", "DP", "DD", "DI", "DA", "RG"], "RG": ["VM", "VA", "VS"], "VM":["haber", "estar", "PP"], "NC":["DP", "DD", "DI", "DA", "AQ", "AO", "de", "tener", "hacer", "estar", "con", "incluso"]}
-    comparatives = ["m" + chr(225) + "s", "menos", "como"]
-    definites = ["el", "la", "los", "las", "este", "esta","estos", "estas", "de", "DP"]
-    accents = {chr(237):"i", chr(243):"o", chr(250):"u", chr(233):"e", chr(225):"a",chr(241):"n"}
-    noun_tag = "NC"
-    verb_tag = "VM"
-    adj_tag = "AQ"
-    adv_tag = "RG"
-    macro_replace = {"#NP?#": "[DI|DP|DA]?_[AQ|AC]?_[NC|NP]?_[AQ]?"}
-
-weight_tags= config["weight_tags"]
-weights_by_location = config["weights_by_location"]
-highlighters = config["highlighters"]
-irrealis = config["irrealis"]
-boundary_words = config["boundary_words"]
-
-
-### Multi-word dictionary macros:
-### These macros allow for relatively simple and uncluttered multiword
-### dictionary definitions. The dictionary keys will be replaced by the
-### their corresponding values when they appear in definitions (in the
-### dictionary files). In particular, allows the forms of irregular verbs
-### to be listed only once (here, rather than in the dictionary)
-
-### Output ###
-
-output_calculations = config["output_calculations"]
-output_sentences = config["output_sentences"]
-output_unknown = config["output_unknown"]
-output_used = config["output_used"]
-output_used_lemma = config["output_used_lemma"]
-search = config["search"]
-contain_all_words = config["contain_all_words"]
+class Settings():
+    '''
+    The settings of a SO-CAL configuration file as read-only attributes
+    (settings.use_adjectives, settings.adj_multiplier, ...), with the types
+    given by get_configuration_from_file. List settings become frozensets and
+    the dictionary settings are copies, so one Settings object can be shared
+    by any number of calculators, and pickled for worker processes.
+    '''
+    def __init__(self, config):
+        '''
+        :param config: the settings, as returned by get_configuration_from_file
+        '''
+        for (key, value) in config.items():
+            if isinstance(value, list):
+                value = frozenset(value)
+            elif isinstance(value, dict):
+                value = dict(value)
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("the settings are read-only")
+
+    def __delattr__(self, key):
+        raise AttributeError("the settings are read-only")
+
+    def replace(self, **changes):
+        '''
+        Copy the settings with some of them changed.
+        :param changes: the new value of each changed setting
+        :return: a new Settings object
+        '''
+        config = dict(self.__dict__)
+        config.update(changes)
+        return Settings(config)
+
+settings_memo = {} # (path, modification time, size) -> Settings
+
+def read_settings(config_path):
+    '''
+    Read a configuration file into a Settings object. Each file is parsed
+    once per process, and again only if it changes.
+    :param config_path: the path of the SO-CAL .ini configuration file
+    :return: the Settings of the file
+    '''
+    status = os.stat(config_path)
+    key = (os.path.abspath(config_path), status.st_mtime_ns, status.st_size)
+    settings = settings_memo.get(key)
+    if settings is None:
+        settings = Settings(get_configuration_from_file(config_path))
+        settings_memo[key] = settings
+    return settings
 
 ### Loading functions ###
 
@@ -282,174 +198,6 @@ def same_lists (list1, list2):
     '''
     return list1 == list2
 
-def get_multiword_entries (string):
-### Coverts the multiword dictionary entry in a file to something that can
-### be accessed by the calculator
-### In the dictionary, each word of a multi-word definition is separated by
-### an underscore. The primary word (the one whose part of speech is the same
-### as the phrase as a whole, except for intensifiers) should be in parentheses;
-### it becomes the key (if there are multiple keys, multiple entries are created)
-### The value of an c_dict is a list of all multi-word phrases a key word
-### appears in (as a key) and each of these contains a 2-ple: the list all the
-### words in the phrase, with the key word removed and replaced with a #,
-### and the SO value for the phrase. If a word or words is modified by an
-### operator (such as ?,*,+,|, or a number), the operator should be placed in
-### []--all operators but | appear outside the right bracket
-### ? = optional, + = one or more, * = zero or more, 2 (3, etc.) = two of these
-### | = or. INT refers to a word or words in the intensifier dictionary.
-### with that key (minus the last word), together with the modifier value
-### ex.: c_int_dict["little"] = [[["a", "#"], -0.5]]
-    if "#" in string:  #if there is a macro, replace
-        for item in macro_replace:
-            string = string.replace(item, macro_replace[item])
-    words = string.split("_")
-    entry = []
-    keyindex = len(words) - 1 # if no parens, default to last word
-    for index in range(len(words)):
-        word = words[index]
-        slot = []
-        if word[0] == "(":
-            slot.append(1)
-            slot.append(word[1:-1].split("|"))
-            keyindex = index # found the key
-        elif word[0] == "[":
-            ordinality = False
-            if word[-1] != "]":
-                ordinality = True
-            if ordinality:
-                slot.append(word[-1])
-                word = word[:-1]
-            else:
-                slot.append(1)
-            slot.append(word[1:-1].split("|"))
-        else:
-            slot = word
-        entry.append(slot)
-    final_entries = []
-    if not isinstance(entry[keyindex], list):
-        key = entry[keyindex]
-        entry[keyindex] = "#"
-        final_entries = [[key,entry]]
-    else:
-        for key in entry[keyindex][1]:
-            final_entry = []
-            for index in range(len(entry)):
-                if index == keyindex:
-                    final_entry.append("#")
-                else:
-                    final_entry.append(entry[index])
-            final_entries.append([key, final_entry])
-    return final_entries
-
-def has_accent(word):
-    for accent in accents:
-        if accent in word:
-            return True
-    return False
-
-def remove_accents(word):
-    for accent in accents:
-        word = word.replace(accent, accents[accent])
-    return word
-
-def load_dictionary (filepointer, s_dict, c_dict):
-### General function for loading dictionaries from files and putting them
-### either in the simple or complex dictionary, as appropriate
-    for line in filepointer.readlines():
-        pair = line.strip().split()
-        if len(pair) == 2:
-            if "_" not in pair[0]:  #if single word
-                if language == "Spanish" and has_accent(pair[0]):
-                    s_dict[remove_accents(pair[0])] = float(pair[1])
-                s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
-            elif use_multiword_dictionaries:
-                entries = get_multiword_entries(pair[0])
-                for entry in entries:
-                    if entry[0] not in c_dict:
-                        c_dict[entry[0]] = [[entry[1], float(pair[1])]]
-                    else:
-                        c_dict[entry[0]].append([entry[1], float(pair[1])])
-    filepointer.close()
-
-def load_extra_dict (filepointer):
-### loads the optional dictionary, which contains entries from all the
-### various types of words
-    s_dict = False
-    c_dict = False
-    for line in filepointer.readlines():
-        line = line.strip()
-        if line:
-            if line == "adjectives":
-                s_dict = adj_dict
-                c_dict = c_adj_dict
-            elif line == "nouns":
-                s_dict = noun_dict
-                c_dict = c_noun_dict
-            elif line == "verbs":
-                s_dict = verb_dict
-                c_dict = c_verb_dict
-            elif line == "adverbs":
-                s_dict = adv_dict
-                c_dict = c_adv_dict
-            elif line == "intensifiers":
-                s_dict = int_dict
-                c_dict = c_adv_dict
-            elif s_dict:
-                pair = line.split()
-                if "_" not in pair[0]:  #if single word
-                    s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
-                elif use_multiword_dictionaries:
-                    entries = get_multiword_entries(pair[0])
-                    for entry in entries:
-                        if entry[0] not in c_dict:
-                            c_dict[entry[0]] = [[entry[1], float(pair[1])]]
-                        else:
-                             for old_entry in c_dict[entry[0]]: # duplicate entry
-                                if same_lists(old_entry[0], entry[1]):
-                                    c_dict[entry[0]].remove(old_entry)
-                             c_dict[entry[0]].append([entry[1], float(pair[1])])
-    filepointer.close()
-
-def load_dictionaries ():
-### load the five kinds of dictionaries
-    load_dictionary (open (adj_dict_path, encoding = "ISO-8859-1"), adj_dict, c_adj_dict)
-    load_dictionary (open (adv_dict_path, encoding = "ISO-8859-1"), adv_dict, c_adv_dict)
-    load_dictionary (open (verb_dict_path, encoding = "ISO-8859-1"), verb_dict, c_verb_dict)
-    load_dictionary (open (noun_dict_path, encoding = "ISO-8859-1"), noun_dict, c_noun_dict)
-    load_dictionary (open (int_dict_path, encoding = "ISO-8859-1"), int_dict, c_int_dict)
-    if extra_dict_path:
-        load_extra_dict(open (extra_dict_path, encoding = "ISO-8859-1"))
-    if simple_SO:
-        for s_dict in [adj_dict,adv_dict,verb_dict, noun_dict]:
-            for entry in s_dict:
-                if s_dict[entry] > 0:
-                    s_dict[entry] = 2
-                elif s_dict[entry] < 0:
-                    s_dict[entry] = -2
-        for entry in int_dict:
-            if int_dict[entry] > 0:
-                int_dict[entry] = .5
-            elif int_dict[entry] < 0 and int_dict[entry] > -1:
-                int_dict[entry] = -.5
-            elif int_dict[entry] < -1:
-                int_dict[entry] = -2
-        for c_dict in [c_adj_dict,c_adv_dict,c_verb_dict, c_noun_dict]:
-            for entry in c_dict:
-                for i in range(len(c_dict[entry])):
-                    if c_dict[entry][i][1] > 0:
-                        c_dict[entry][i] = [c_dict[entry][i][0], 2]
-                    elif c_dict[entry][i][1] < 0:
-                        c_dict[entry][i] = [c_dict[entry][i][0], -2]
-        for entry in c_int_dict:
-             for i in range(len(c_int_dict[entry])):
-                 if c_int_dict[entry][i][1] > 0:
-                     c_int_dict[entry][i] = [c_int_dict[entry][i][0], .5]
-                 elif c_int_dict[entry][i][1] < 0 and c_int_dict[entry][i][1] > -1:
-                     c_int_dict[entry][i] = [c_int_dict[entry][i][0], -.5]
-                 elif c_int_dict[entry][i][1] < -1:
-                     c_int_dict[entry][i] = [c_int_dict[entry][i][0], -2]
-
-
 def convert_fraction(fraction):
 ### coverts a fraction string into a float
     if "/" not in fraction:
@@ -476,222 +224,6 @@ def is_decimal(string):
                 decimal_yet = True
     return True
 
-def convert_ranges():
-### converts a list of string ranges in faction form (e.g. ["1/4-1/2", 2]) into a
-### a list of numerical ranges plus weight (e.g. [0.25, .5, 2]
-    new_ranges = []
-    for range in weights_by_location:
-        pair = range.split("-")
-        if len(pair) == 2:
-            start = convert_fraction(pair[0].strip())
-            end = convert_fraction(pair[1].strip())
-            if start >= 0 and start <= 1 and end >= 0 and end <= 1 and start < end:
-                new_ranges.append([start,end, weights_by_location[range]])
-    return new_ranges
-
-
-def fill_text_and_weights(infile):
-### Read in the textfile. The file is assumed to be properly spaced and tagged,
-### i.e. there should be a space between every word/tag pair or XML tag
-### if there are XML tags and those tags have been assigned weight, the weight
-### will be applied after the opening tag and will be removed at the closing
-### tag. All XML tags are removed for the SO calculation
-    global text, weights, boundaries
-    text = []
-    weights = []
-    boundaries = []
-    weight = 1.0 # start with weight 1
-    temp_weight = 1.0 # keep track of weight before a zero
-    for line in infile.readlines():
-        line = line.replace("<", " <").replace(">", "> ")
-        for word in line.strip().split(" "):
-            if word:
-                if word[0] == "<" and word[-1] == ">": #XML tag
-                    XML_tag = word.strip("<>/")
-                    if use_XML_weighing:
-                        if XML_tag in weight_tags:
-                            weight_modifier = weight_tags[XML_tag]
-                        elif is_decimal(XML_tag):
-                            weight_modifier = float(XML_tag)
-                        else:
-                            weight_modifier = 1
-                        if word[1] == "/":
-                            if weight_modifier != 0:
-                                weight /= weight_modifier # remove weight
-                            else:
-                                weight = temp_weight # use pre-zero weight
-                        else:
-                            if weight_modifier != 0:
-                                weight *= weight_modifier # add weight
-                            else:
-                                temp_weight = weight # save weight
-                                weight = 0
-                elif "/" in word:
-                    text.append(word.split("/"))
-                    weights.append(weight)
-        boundaries.append(len(text))
-    if use_weight_by_location:  # add location weights
-        range_dict = convert_ranges()
-        for i in range(len(weights)):
-            for interval in range_dict:  #if the current index in range
-                if interval[0] <= float(i)/len(weights) and interval[1] > float(i)/len(weights):
-                    weights[i] *= interval[2]  #add the weight
-    infile.close()
-
-### English steming functions ###
-
-def stem_NN(NN):
-    if NN not in noun_dict and NN not in c_noun_dict and  len(NN) > 2 and NN[-1] == "s":   # boys -> boy
-        NN = NN[:-1]
-        if NN not in noun_dict and NN not in c_noun_dict and NN[-1] == "e": # watches -> watch
-            NN = NN[:-1]
-            if NN not in noun_dict and NN not in c_noun_dict and NN[-1] == "i": # flies -> fly
-                NN = NN[:-1] + "y"
-    return NN
-
-def stem_VB(VB, type):
-    if type == "" or type == "P" or len(VB) < 4 or VB in verb_dict or VB in c_verb_dict:
-        return VB
-    elif type == "D" or type == "N":
-        if VB[-1] == "d":
-            VB = VB[:-1]   #  loved -> love
-            if not VB in verb_dict and not VB in c_verb_dict:
-                if VB[-1] == "e":
-                    VB = VB[:-1]   # enjoyed -> enjoy
-                if not VB in verb_dict and not VB in c_verb_dict:
-                    if VB[-1] == "i":
-                        VB = VB[:-1] + "y" # tried -> try
-                    elif len(VB) > 1 and VB[-1] == VB[-2]:
-                        VB = VB[:-1]   # compelled -> compel
-        return VB
-    elif type == "G":
-        VB = VB[:-3] # obeying -> obey
-        if not VB in verb_dict and not VB in c_verb_dict:
-            if len(VB) > 1 and VB[-1] == VB[-2]:
-                VB = VB[:-1] # stopping -> stop
-            else:
-                VB = VB + "e" # amusing -> amuse
-        return VB
-    elif type == "Z" and len(VB) > 3:
-        if VB[-1] == "s":
-            VB = VB[:-1]  # likes -> like
-            if VB not in verb_dict and not VB in c_verb_dict and VB[-1] == "e":
-                VB = VB[:-1]  # watches -> watch
-                if VB not in verb_dict and not VB in c_verb_dict and VB[-1] == "i":
-                    VB = VB[:-1] + "y"  # flies -> fly
-        return VB
-
-def stem_RB_to_JJ(RB):
-### used to find the adjective that is the stem of an adverb so that the adverb
-### can be added automatically to the dictionary
-    JJ = RB
-    if len(JJ) > 3 and JJ[-2:] == "ly":
-        JJ = JJ[:-2]  # sharply -> sharp
-        if not JJ in adj_dict:
-            if JJ + "l" in adj_dict:
-                JJ += "l" # full -> fully
-            elif JJ + "le" in adj_dict:
-                JJ += "le" # simply -> simple
-            elif JJ[-1] == "i" and JJ[:-1] + "y" in adj_dict:
-                JJ = JJ[:-1] + "y" # merrily -> merry
-            elif len(JJ) > 5 and JJ[-2:] == "al" and JJ[:-2] in adj_dict:
-                JJ = JJ[:-2] # angelic -> angelically
-    return JJ
-
-def stem_ative_adj(JJ):
-# this function does stemming for both comparative and superlative adjectives
-# after the suffix "er" or "est" has been removed
-    if JJ not in adj_dict:
-        if JJ + "e" in adj_dict:
-            JJ += "e" # abler/ablest -> able
-        elif JJ[:-1] in adj_dict:
-            JJ = JJ[:-1] # bigger/biggest -> big
-        elif JJ[-1] == "i" and JJ[:-1] + "y" in adj_dict:
-            JJ = JJ[:-1] + "y" # easier/easiest -> easy
-    return JJ
-
-
-def stem_comp_JJ(JJ):
-    if JJ[-2:] == "er":
-        JJ = stem_ative_adj(JJ[:-2]) # fairer -> fair
-    return JJ
-
-def stem_super_JJ(JJ):
-    if JJ[-3:] == "est":
-        JJ = stem_ative_adj(JJ[:-3]) # fairest -> fair
-    return JJ
-
-### Spanish Stemming Fuctions
-
-def stem_NC(NC):
-    if NC not in noun_dict and len(NC) > 2 and NC[-1] == "s":   # diplomas -> diploma
-        NC = NC[:-1]
-    if NC not in noun_dict and NC not in c_noun_dict and len(NC) > 1:
-        if NC[-1] == "a":
-            NC = NC[:-1] + "o" #hermanas -> hermano
-        elif NC[-1] == "e": # actor -> actores
-            NC = NC[:-1]
-    return NC
-
-def stem_AQ(AQ):
-    if AQ not in adj_dict and len(AQ) > 2 and AQ[-1] == "s":   # buenos -> bueno
-        AQ = AQ[:-1]
-    if AQ not in adj_dict and AQ not in c_adj_dict and len(AQ) > 1:
-        if AQ[-1] == "a":    # buena -> bueno
-            AQ = AQ[:-1] +  "o"
-        elif AQ[-1] == "e": #  -> watch
-            AQ = AQ[:-1]
-    return AQ
-
-def stem_RG_to_AQ(RG):
-### used to find the adjective that is the stem of an adverb so that the adverb
-### can be added automatically to the dictionary
-    AQ = RG
-    if len(AQ) > 6 and AQ[-5:] == "mente" :
-        AQ = AQ[:-5]  # felizmente -> feliz
-        if not AQ in adj_dict:
-            if AQ[-1] == "a":
-                AQ = AQ[:-1] + "o" # nuevamente -> nuevo
-    return AQ
-
-
-def stem_super_AQ(AQ):
-# this function removes "isima" or "isimo" from the word
-    if AQ not in adj_dict:
-        if len(AQ) > 6 and AQ[-5:] in [chr(237) + "sima", chr(237) + "simo", "isima", "isimo"]:
-            AQ = AQ[:-5]
-            if AQ not in adj_dict:
-                if AQ[-2:] == "qu":
-                    AQ = AQ[:-2] + "co"
-                elif AQ[-2] == "gu":
-                    AQ = AQ[:-1] = "o"
-                else:
-                    AQ += "o"
-    return AQ
-
-### Language general stemming functions ###
-
-def stem_noun(noun):
-    if language == "English":
-        return stem_NN(noun)
-    elif language == "Spanish":
-        return stem_NC(noun)
-
-def stem_adv_to_adj(adverb):
-    if language == "English":
-        return stem_RB_to_JJ(adverb)
-    elif language == "Spanish":
-        return stem_RG_to_AQ(adverb)
-
-def stem_super_adj(adj):
-    if language == "English":
-        return stem_super_JJ(adj)
-    elif language == "Spanish":
-        return stem_super_AQ(adj)
-
-
-### General functions ###
-
 def get_word (pair): return pair[0] # get word from (word, tag) pair
 def get_tag (pair) : return pair[1] # get tag from (word, tag) pair
 
@@ -702,1099 +234,2440 @@ def sum_word_counts (word_count_dict):
         count+= word_count_dict[word]
     return count
 
-def find_intensifier(index):
-### this function determines whether the given index is the last word (or,
-### trivially, the only word) in an intensifier. If so, it returns a list
-### containing, as its first element, the length of the intensifier and,
-### as its second element, the modifier from the relevant intensifier dictionary
-    if index < 0 or index >= len(text) or get_tag(text[index]) == "MOD": # already modifying something
-        return False
-    if get_word(text[index]).lower() in c_int_dict: # might be complex
-        for word_mod_pair in c_int_dict[get_word(text[index]).lower()]:
-            if same_lists(word_mod_pair[0][:-1],map(str.lower, map(get_word,text[index - len(word_mod_pair[0]) + 1:index]))):
-                return [len(word_mod_pair[0]), word_mod_pair[1]]
-    if get_word(text[index]).lower() in int_dict: # simple intensifier
-        modifier = int_dict[get_word(text[index]).lower()]
-        if get_word(text[index]).isupper() and use_cap_int: # if capitalized
-             modifier *= capital_modifier   # increase intensification
-        return [1, modifier]
-    return False
-
-def match_multiword_f(index, words):
-### this function recursively matches the (partial) multi-word dictionary entry
-### (words) with the corresponding part of the text (from index)
-### the function returns a list containing the number of words matched (or -1
-### if the match failed) and the value of any intensifier found
-    if len (words) == 0:
-        return [0, 0] #done
-    else:
-        current = words[0]
-        if not isinstance(current,list):
-            current = [1, [current]] # unmodified words should be appear once
-        if current[0] == "0":
-            return match_multiword_f(index, words[1:]) #this word done
-        if current[0] == "*" or current[0] == "?": # word optional - try
-            temp = match_multiword_f(index, words[1:]) # without first
-            if temp[0] != -1:
-                return temp
-        if index == len(text):
-            return [-1, 0] # reached the end of the text
-        match = False
-        for word_or_tag in current[1]:
+def location_index (fraction, length):
+### gives the first index i in a text of the given length at or after the
+### fraction of the text, i.e. the first one with i/length >= fraction
+    i = min(max(int(math.ceil(fraction * length)), 0), length)
+    while i > 0 and float(i - 1)/length >= fraction: # correct any rounding
+        i -= 1
+    while i < length and float(i)/length < fraction:
+        i += 1
+    return i
+
+def compile_multiword_slots (words):
+### converts the words on one side of the # in a multi-word dictionary entry
+### into a tuple of slots for the matcher. Each slot is a 4-ple: the number of
+### times it must appear (an int, or one of "*", "?" or "+"), the set of words
+### it matches, the set of tags it matches and whether it matches an intensifier
+    slots = []
+    for word in words:
+        if not isinstance(word, list):
+            word = [1, [word]] # unmodified words should be appear once
+        count = word[0]
+        if count not in ("*", "?", "+"):
+            count = int(count)
+        lower_words = []
+        tags = []
+        for word_or_tag in word[1]:
             if word_or_tag.islower(): #match by word
-                match = match or get_word(text[index]).lower() == word_or_tag
+                lower_words.append(word_or_tag)
             elif word_or_tag.isupper(): #match by tag
-                if word_or_tag == "INT": # if looking for a intensifiers
-                    i = 1
-                    while index + i < len(text) and text[index + i][0] not in sent_punct:
-                        intensifier = find_intensifier(index + i - 1)
-                        if intensifier and intensifier[0] == i:
-                                result = match_multiword_f(index + i, words[1:])
-                                if result[0] != -1:
-                                    return [result[0] + i, intensifier[1]]
-                        i += 1
-                else:
-                    match = match or get_tag(text[index]) == word_or_tag
-        if not match:
-            return [-1, 0]
+                tags.append(word_or_tag)
+        slots.append((count, frozenset(lower_words), frozenset(tags) - {"INT"}, "INT" in tags))
+    return tuple(slots)
+
+def build_intensifier_trie (c_int_dict):
+### builds a trie over the multi-word intensifiers which is read from right to
+### left: it is keyed by the last word of each intensifier, then by the word
+### before it, and so on. A node where an intensifier starts holds its length
+### and modifier under the key None
+    trie = {}
+    for key in c_int_dict:
+        for (words, modifier) in c_int_dict[key]:
+            if all(isinstance(word, str) for word in words): # no operators
+                node = trie.setdefault(key, {})
+                for word in reversed(words[:-1]):
+                    node = node.setdefault(word, {})
+                if None not in node: # the first definition of a phrase is used
+                    node[None] = [len(words), modifier]
+    return trie
+
+### Text storage ###
+
+MOD_FLAG = 1 # the tag has been changed to "MOD", the word modifies another one
+
+### the closed word classes tested in the backward searches, as bits of the
+### mask kept for every string of the vocabulary
+PUNCT_CLASS = 1
+SENT_PUNCT_CLASS = 2
+BOUNDARY_WORD_CLASS = 4
+NEGATOR_CLASS = 8 # matched in lowercase, like the irrealis markers and highlighters
+IRREALIS_CLASS = 16
+HIGHLIGHTER_CLASS = 32
+
+class TokenStore():
+    '''
+    The tokens of a text. Words and tags are kept as ids into a vocabulary of
+    strings shared by all the texts, and whether a tag has been changed to
+    "MOD" (so that a modifier is not counted twice) is kept in a bytearray of
+    flags, instead of a list of [word, tag] lists.
+    '''
+    def __init__(self, strings, string_ids):
+        '''
+        :param strings: the vocabulary, a list of strings indexed by id
+        :param string_ids: the id of each string in the vocabulary
+        '''
+        self.strings = strings
+        self.string_ids = string_ids
+        self.word_ids = array.array("i")
+        self.tag_ids = array.array("i")
+        self.flags = bytearray()
+
+    def intern(self, string):
+        '''
+        Get the id of a string, adding it to the vocabulary if it is new.
+        :param string: a word or a tag
+        :return: its id
+        '''
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.string_ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    def append(self, word, tag):
+        '''
+        Add a token at the end of the text.
+        :param word: the word of the token
+        :param tag: its part of speech tag
+        :return: None
+        '''
+        self.word_ids.append(self.intern(word))
+        self.tag_ids.append(self.intern(tag))
+        self.flags.append(0)
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def word(self, index): return self.strings[self.word_ids[index]]
+
+    def tag(self, index):
+        if self.flags[index] & MOD_FLAG:
+            return "MOD"
+        return self.strings[self.tag_ids[index]]
+
+    def pair(self, index): return (self.word(index), self.tag(index))
+
+    def set_tag(self, index, tag):
+        if tag == "MOD":
+            self.flags[index] |= MOD_FLAG
         else:
-            if current[0] == "*":
-                temp = match_multiword_f(index + 1, words)
-            elif current[0] == "+":
-                temp = match_multiword_f(index + 1, [["*", current[1]]] + words[1:])
-            elif current[0] == "?":
-                temp = match_multiword_f(index + 1, words[1:])
-            else:
-                temp = match_multiword_f(index + 1, [[str(int(current[0]) - 1), current[1]]] + words[1:])
-            if temp[0] == -1:
-                return temp #failed
+            self.flags[index] &= ~MOD_FLAG
+            self.tag_ids[index] = self.intern(tag)
+
+    def words(self, start, end):
+        '''
+        Get the words of a slice of the text, with the usual slice semantics.
+        :param start: the start of the slice
+        :param end: the end of the slice
+        :return: a list of words
+        '''
+        return [self.strings[word_id] for word_id in self.word_ids[start:end]]
+
+    def word_list(self):
+        return [self.strings[word_id] for word_id in self.word_ids]
+
+
+### the dictionaries are cached in binary form in the dictionary folder; the
+### version must be increased whenever their in-memory layout changes
+DICTIONARY_CACHE_NAME = "SO_CAL_dictionaries.cache"
+DICTIONARY_CACHE_VERSION = 3
+
+### the number of (word, tag) pairs whose lemma is remembered across texts
+LEMMA_MEMO_SIZE = 100000
+
+
+class SOCalculator():
+    def __init__(self, config_path, dic_dir=None, dictionary_cache=True):
+        '''
+        Read the configuration file and load the dictionaries. This is done
+        once per calculator; every call to score() or score_file() then works
+        on a fresh per-document state, so the same calculator can be used to
+        score any number of texts.
+        :param config_path: the path of the SO-CAL .ini configuration file, or
+        its Settings
+        :param dic_dir: optional dictionary folder, overrides dic_dir in the config
+        :param dictionary_cache: whether to load the dictionaries from (and save
+        them to) the binary cache in the dictionary folder
+        :return: None
+        '''
+        if isinstance(config_path, Settings):
+            settings = config_path
+        else:
+            settings = read_settings(config_path)
+        if dic_dir:
+            settings = settings.replace(dic_dir = os.path.join(dic_dir, ""))
+        self.settings = settings
+
+        self.language = settings.language
+        self.use_adjectives = settings.use_adjectives
+        self.use_nouns = settings.use_nouns
+        self.use_verbs = settings.use_verbs
+        self.use_adverbs = settings.use_adverbs
+        self.use_intensifiers = settings.use_intensifiers
+        self.use_negation = settings.use_negation
+        self.use_comparatives = settings.use_comparatives
+        self.use_superlatives = settings.use_superlatives
+        self.use_multiword_dictionaries = settings.use_multiword_dictionaries
+        self.use_extra_dict = settings.use_extra_dict
+        self.use_XML_weighing = settings.use_XML_weighing
+        self.use_weight_by_location = settings.use_weight_by_location
+        self.use_irrealis = settings.use_irrealis
+        self.use_subjunctive = settings.use_subjunctive
+        self.use_imperative = settings.use_imperative
+        self.use_conditional = settings.use_conditional
+        self.use_highlighters = settings.use_highlighters
+        self.use_cap_int = settings.use_cap_int
+        self.fix_cap_tags = settings.fix_cap_tags
+        self.use_exclam_int = settings.use_exclam_int
+        self.use_quest_mod = settings.use_quest_mod
+        self.use_quote_mod = settings.use_quote_mod
+        self.use_definite_assertion = settings.use_definite_assertion
+        self.use_clause_final_int = settings.use_clause_final_int
+        self.use_heavy_negation = settings.use_heavy_negation
+        self.use_word_counts_lower = settings.use_word_counts_lower
+        self.use_word_counts_block = settings.use_word_counts_block
+        self.use_blocking = settings.use_blocking
+        self.adv_learning = settings.adv_learning
+        self.limit_shift = settings.limit_shift
+        self.neg_negation_nullification = settings.neg_negation_nullification
+        self.polarity_switch_neg = settings.polarity_switch_neg
+        self.restricted_neg = settings.restricted_neg
+        self.simple_SO = settings.simple_SO
+        self.use_boundary_words = settings.use_boundary_words
+        self.use_boundary_punct = settings.use_boundary_punctuation
+
+        ### Modifiers ###
+
+        self.adj_multiplier = settings.adj_multiplier
+        self.adv_multiplier = settings.adv_multiplier
+        self.verb_multiplier = settings.verb_multiplier
+        self.noun_multiplier = settings.noun_multiplier
+        self.int_multiplier = settings.int_multiplier
+        self.neg_multiplier = settings.neg_multiplier
+        self.capital_modifier = settings.capital_modifier
+        self.exclam_modifier = settings.exclam_modifier
+        self.verb_neg_shift = settings.verb_neg_shift
+        self.noun_neg_shift = settings.noun_neg_shift
+        self.adj_neg_shift = settings.adj_neg_shift
+        self.adv_neg_shift = settings.adv_neg_shift
+        self.blocker_cutoff = settings.blocker_cutoff
+
+        ### Dictionaries ###
+
+        dic_dir = settings.dic_dir
+        self.adj_dict_path = dic_dir + settings.adj_dict
+        self.adv_dict_path = dic_dir + settings.adv_dict
+        self.noun_dict_path = dic_dir + settings.noun_dict
+        self.verb_dict_path = dic_dir + settings.verb_dict
+        self.int_dict_path = dic_dir + settings.int_dict
+        if self.use_extra_dict and settings.extra_dict:
+            self.extra_dict_path = dic_dir + settings.extra_dict
+        else:
+            self.extra_dict_path = False
+        self.adj_dict = {} # simple (single-word) dictionaries
+        self.adv_dict = {}
+        self.noun_dict = {}
+        self.verb_dict = {}
+        self.int_dict = {}
+        self.c_adj_dict = {} # complex (multi-word) dictionaries
+        self.c_adv_dict = {}
+        self.c_noun_dict = {}
+        self.c_verb_dict = {}
+        self.c_int_dict = {}
+        self.c_int_trie = {} # the multi-word intensifiers, read from right to left
+        self.new_adv_dict = {} # adverbs learned from the adjective dictionary
+        self.lemma_memo = collections.OrderedDict() # (word, tag) -> lemma and dictionary hits
+        self.dictionary_cache = dictionary_cache
+
+        ### Text ###
+
+        self.strings = [] # the vocabulary of the texts, shared by their token stores
+        self.string_ids = {}
+        self.lower_strings = [] # the lowercase form of each string of the vocabulary
+        self.string_classes = bytearray() # the word classes of each string of the vocabulary
+        self.text = TokenStore(self.strings, self.string_ids) # the tokens of the text
+        self.lower_words = [] # the lowercase form of each word of the text
+        self.word_classes = bytearray() # the word classes of each word of the text
+        self.weights = [] # weights should be the same length as the text, one for each token
+        self.int_weights = set() # the words whose weight is an integer rather than a float
+        self.word_counts = [{},{},{},{}] # keeps track of number of times each word lemma appears in the text
+        self.boundaries = [] # the location of newline boundaries from the input
+        self.boundary_set = set() # the same boundaries, for constant time lookups
+        self.sentence_numbers = [] # the sentence number of each index in the text
+        self.sent_puncts = [] # the sentence punctuation ending each token's sentence
+        self.in_quotes = [] # whether each token is within quotation marks
+        self.clause_starts = [] # the last index at a boundary at or before each token
+        self.sentence_starts = [] # the last sentence punctuation at or before each token
+        self.clause_irrealis = [] # whether an irrealis marker precedes each token in its clause
+        self.clause_highlighters = [] # the nearest highlighter preceding each token in its clause
+        self.richout = None # the rich output of the current text
+        self.rich_records = [] # the rich output, written out at the end of the text
+        self.write_calculations = False # whether to output the calculations
+        self.write_sentences = False # and the sentence SO for the current text
+        self.jsonout = None # the JSON lines output of the current text
+        self.write_json = False
+        self.tokenout = None # the list collecting the scored words of the current text
+        self.record_tokens = False # whether to keep the calculation of each word
+        self.token_record = None # the calculation of the word being scored
+
+        ### Internal Word lists ###
+
+        if self.language == "English":
+            self.not_wanted_adj = frozenset(["other", "same", "such", "first", "next", "last", "few", "many", "less", "more", "least", "most"])
+            self.not_wanted_adv = frozenset([ "really", "especially", "apparently", "actually", "evidently", "suddenly", "completely","honestly", "basically", "probably", "seemingly", "nearly", "highly", "exactly", "equally", "literally", "definitely", "practically", "obviously", "immediately", "intentionally", "usually", "particularly", "shortly", "clearly", "mildly", "sincerely", "accidentally", "eventually", "finally", "personally", "importantly", "specifically", "likely", "absolutely", "necessarily", "strongly", "relatively", "comparatively", "entirely", "possibly", "generally", "expressly", "ultimately", "originally", "initially", "virtually", "technically", "frankly", "seriously", "fairly",  "approximately", "critically", "continually", "certainly",  "regularly", "essentially", "lately", "explicitly", "right", "subtly",  "lastly", "vocally", "technologically", "firstly", "tally", "ideally", "specially", "humanly", "socially", "sexually", "preferably", "immediately", "legally", "hopefully", "largely", "frequently", "factually", "typically"])
+            self.not_wanted_verb = frozenset()
+            self.negators = frozenset(["not", "no", "n't", "neither", "nor", "nothing", "never", "none", "lack", "lacked", "lacking", "lacks", "missing", "without", "absence", "devoid"])
+            self.punct = frozenset([".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-"])
+            self.sent_punct = frozenset([".", ";", "!", "?", ":", "\n", "\r"])
+            self.skipped = {"JJ": ["even", "to", "being", "be", "been", "is", "was", "'ve", "have", "had", "do", "did", "done", "of", "as", "DT", "PSP$"], "RB": ["VB", "VBZ", "VBP", "VBG"], "VB":["TO", "being", "been", "be"], "NN":["DT", "JJ", "NN", "of", "have", "has", "come", "with", "include"]}
+            self.comparatives = frozenset(["less", "more", "as"])
+            self.superlatives = frozenset(["most", "least"])
+            self.definites = frozenset(["the","this", "POS", "PRP$"])
+            self.noun_tag = "NN"
+            self.verb_tag = "VB"
+            self.adj_tag = "JJ"
+            self.adv_tag = "RB"
+            self.macro_replace = {"#NP?#": "[PDT]?_[DET|PRP|PRP$|NN|NNP]?_[POS]?_[NN|NNP|JJ]?_[NN|NNP|NNS|NNPS]?","#PER?#": "[me|us|her|him]?","#give#": "give|gave|given","#fall#": "fall|fell|fallen","#get#": "get|got|gotten","#come#": "come|came","#go#": "go|went|gone", "#show#": "show|shown","#make#": "make|made","#hang#": "hang|hung","#break#": "break|broke|broken", "#see#": "see|saw|seen", "#be#": "be|am|are|was|were|been", "#bring#": "bring|brought", "#think#" : "think|thought", "#have#": "has|have|had", "#blow#": "blow|blew", "#build#": "build|built", "#do#": "do|did|done", "#can#": "can|could", "#grow#":"grow|grew|grown", "#hang#": "hang|hung", "#run#": "run|ran", "#stand#": "stand|stood", "#string#": "string|strung", "#hold#" : "hold|held", "#take#" : "take|took|taken"}
+        elif self.language == "Spanish":
+            self.not_wanted_adj = ["otro","mio","tuyo","suyo","nuestro","vuestro","mismo","primero","segundo","último"]
+            additional = []
+            for adj in self.not_wanted_adj:
+               additional += [adj[:-1] + "a",adj[:-2] + "os", adj[:-2] + "as"]
+            self.not_wanted_adj = frozenset(self.not_wanted_adj + additional)
+            self.not_wanted_adv = frozenset(["básicamente", "claramente","ampliamente", "atentamente", "completamente"])
+            self.not_wanted_verb = frozenset(["haber", "estar"])
+            self.negators = frozenset(["no", "ni", "nunca", "jam"+ chr(225) + "s", "nada", "nadie", "ninguno", "ningunos", "ninguna", "ningunas", "faltar", "falta", "sin"])
+            self.punct = frozenset([".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-", chr(161), chr(191)])
+            self.sent_punct = frozenset([".", ";", "!", "?", ":", "\n", "\r", chr(161), chr(191)])
+            self.skipped = {"AQ": [ "a", "estar", "haber", "hacer", "de", "como", "NC", "PP", "DP", "DD", "DI", "DA", "RG"], "RG": ["VM", "VA", "VS"], "VM":["haber", "estar", "PP"], "NC":["DP", "DD", "DI", "DA", "AQ", "AO", "de", "tener", "hacer", "estar", "con", "incluso"]}
+            self.comparatives = frozenset(["m" + chr(225) + "s", "menos", "como"])
+            self.definites = frozenset(["el", "la", "los", "las", "este", "esta","estos", "estas", "de", "DP"])
+            self.accents = {chr(237):"i", chr(243):"o", chr(250):"u", chr(233):"e", chr(225):"a",chr(241):"n"}
+            self.noun_tag = "NC"
+            self.verb_tag = "VM"
+            self.adj_tag = "AQ"
+            self.adv_tag = "RG"
+            self.macro_replace = {"#NP?#": "[DI|DP|DA]?_[AQ|AC]?_[NC|NP]?_[AQ]?"}
+        # the word lists are only used for membership tests
+        self.skipped = {tag: frozenset(words) for (tag, words) in self.skipped.items()}
+
+        self.weight_tags = settings.weight_tags
+        self.weights_by_location = settings.weights_by_location
+        self.location_ranges = self.convert_ranges()
+        self.highlighters = settings.highlighters
+        self.irrealis = settings.irrealis
+        self.boundary_words = settings.boundary_words
+        self.search = settings.search
+        self.boundary_classes = 0 # the word classes that end a backward search
+        if self.use_boundary_punct:
+            self.boundary_classes |= PUNCT_CLASS
+        if self.use_boundary_words:
+            self.boundary_classes |= BOUNDARY_WORD_CLASS
+
+        ### Multi-word dictionary macros:
+        ### These macros allow for relatively simple and uncluttered multiword
+        ### dictionary definitions. The dictionary keys will be replaced by the
+        ### their corresponding values when they appear in definitions (in the
+        ### dictionary files). In particular, allows the forms of irregular verbs
+        ### to be listed only once (here, rather than in the dictionary)
+
+        ### Output ###
+
+        self.output_calculations = settings.output_calculations
+        self.output_sentences = settings.output_sentences
+        self.output_unknown = settings.output_unknown
+        self.output_used = settings.output_used
+        self.output_used_lemma = settings.output_used_lemma
+        self.contain_all_words = settings.contain_all_words
+
+        self.load_dictionaries()
+
+    def start_document(self, richout, jsonout=None, tokenout=None):
+        '''
+        Reset the per-document state before a new text is scored.
+        :param richout: the stream for the rich output, None to skip building it
+        :param jsonout: the stream for the JSON lines output, None to skip building it
+        :param tokenout: a list that receives a row for each scored word, see
+        write_token_record
+        :return: None
+        '''
+        self.word_counts = [{},{},{},{}]
+        self.richout = richout
+        self.rich_records = []
+        # without a stream there is no rich output, so none of it is built
+        self.write_calculations = self.output_calculations and richout is not None
+        self.write_sentences = self.output_sentences and richout is not None
+        self.jsonout = jsonout
+        self.write_json = jsonout is not None
+        self.tokenout = tokenout
+        self.record_tokens = self.write_json or tokenout is not None
+        self.token_record = None
+
+    def score(self, tokens, name="", weights=None, boundaries=None, richout=None, jsonout=None, tokenout=None):
+        '''
+        Calculate the SO value of an already tokenized text.
+        :param tokens: a list of (word, tag) pairs
+        :param name: the name of the text, used in the rich output
+        :param weights: a weight for each token, default 1 for all tokens
+        :param boundaries: the newline boundaries, default the end of the text
+        :param richout: the stream for the rich output, None to skip building it
+        :param jsonout: the stream for the JSON lines output, None to skip building it
+        :param tokenout: a list that receives a row for each scored word
+        :return: the SO value of the text
+        '''
+        self.start_document(richout, jsonout, tokenout)
+        self.text = TokenStore(self.strings, self.string_ids)
+        for (word, tag) in tokens:
+            self.text.append(word, tag)
+        if weights is None:
+            weights = [1.0] * len(self.text)
+        self.weights = array.array("d", weights)
+        self.int_weights = {index for (index, weight) in enumerate(weights) if type(weight) is int}
+        self.pack_weights()
+        if boundaries is None:
+            boundaries = [len(self.text)]
+        self.boundaries = list(boundaries)
+        self.lowercase_words()
+        self.index_boundaries()
+        self.index_punctuation()
+        self.index_clauses()
+        return self.calculate_text_SO(name)
+
+    def score_file(self, path, richout=None, jsonout=None, tokenout=None):
+        '''
+        Calculate the SO value of a SO-CAL preprocessed text file.
+        :param path: the path of the preprocessed file
+        :param richout: the stream for the rich output, None to skip building it
+        :param jsonout: the stream for the JSON lines output, None to skip building it
+        :param tokenout: a list that receives a row for each scored word
+        :return: the SO value of the text
+        '''
+        return self.score_stream(open(path, encoding = "ISO-8859-1"), os.path.basename(path), richout, jsonout, tokenout)
+
+    def score_stream(self, infile, name, richout=None, jsonout=None, tokenout=None):
+        '''
+        Calculate the SO value of a SO-CAL preprocessed text read from a stream.
+        :param infile: a text stream of the preprocessed text, closed when read
+        :param name: the name of the text, used in the rich output
+        :param richout: the stream for the rich output, None to skip building it
+        :param jsonout: the stream for the JSON lines output, None to skip building it
+        :param tokenout: a list that receives a row for each scored word
+        :return: the SO value of the text
+        '''
+        self.start_document(richout, jsonout, tokenout)
+        self.fill_text_and_weights(infile)
+        return self.calculate_text_SO(name)
+
+    def write_learned_adverbs(self):
+        '''
+        Append the adverbs learned from the adjective dictionary to the adverb
+        dictionary file.
+        :return: None
+        '''
+        if self.adv_learning and self.new_adv_dict: # output the new adverb
+            f = open(self.adv_dict_path, "a")  # dictionary
+            for adverb in self.new_adv_dict:
+                f.write(adverb + "\t" + str(int(self.adv_dict[adverb])) + "\n")
+            f.close()
+            self.new_adv_dict = {}
+
+    def get_multiword_entries (self, string):
+    ### Coverts the multiword dictionary entry in a file to something that can
+    ### be accessed by the calculator
+    ### In the dictionary, each word of a multi-word definition is separated by
+    ### an underscore. The primary word (the one whose part of speech is the same
+    ### as the phrase as a whole, except for intensifiers) should be in parentheses;
+    ### it becomes the key (if there are multiple keys, multiple entries are created)
+    ### The value of an c_dict is a list of all multi-word phrases a key word
+    ### appears in (as a key) and each of these contains a 2-ple: the list all the
+    ### words in the phrase, with the key word removed and replaced with a #,
+    ### and the SO value for the phrase. If a word or words is modified by an
+    ### operator (such as ?,*,+,|, or a number), the operator should be placed in
+    ### []--all operators but | appear outside the right bracket
+    ### ? = optional, + = one or more, * = zero or more, 2 (3, etc.) = two of these
+    ### | = or. INT refers to a word or words in the intensifier dictionary.
+    ### with that key (minus the last word), together with the modifier value
+    ### ex.: c_int_dict["little"] = [[["a", "#"], -0.5]]
+    ### (once loaded, the entries of the other c_dicts also carry the words before
+    ### and after the # compiled by compile_multiword_slots)
+        if "#" in string:  #if there is a macro, replace
+            for item in self.macro_replace:
+                string = string.replace(item, self.macro_replace[item])
+        words = string.split("_")
+        entry = []
+        keyindex = len(words) - 1 # if no parens, default to last word
+        for index in range(len(words)):
+            word = words[index]
+            slot = []
+            if word[0] == "(":
+                slot.append(1)
+                slot.append(word[1:-1].split("|"))
+                keyindex = index # found the key
+            elif word[0] == "[":
+                ordinality = False
+                if word[-1] != "]":
+                    ordinality = True
+                if ordinality:
+                    slot.append(word[-1])
+                    word = word[:-1]
+                else:
+                    slot.append(1)
+                slot.append(word[1:-1].split("|"))
             else:
-                return [temp[0] + 1, temp[1]] #success
+                slot = word
+            entry.append(slot)
+        final_entries = []
+        if not isinstance(entry[keyindex], list):
+            key = entry[keyindex]
+            entry[keyindex] = "#"
+            final_entries = [[key,entry]]
+        else:
+            for key in entry[keyindex][1]:
+                final_entry = []
+                for index in range(len(entry)):
+                    if index == keyindex:
+                        final_entry.append("#")
+                    else:
+                        final_entry.append(entry[index])
+                final_entries.append([key, final_entry])
+        return final_entries
 
+    def has_accent(self, word):
+        for accent in self.accents:
+            if accent in word:
+                return True
+        return False
 
-def match_multiword_b(index, words):
-### same as match_multiword_f, except it looks in the other direction
-    if len (words) == 0:
-        return [0, 0]
-    else:
-        current = words[-1]
-        if not isinstance(current,list):
-            current = [1, [current]]
-        if current[0] == "0":
-            return match_multiword_b(index, words[:-1])
-        if current[0] == "*" or current[0] == "?":
-            temp = match_multiword_b(index, words[:-1])
-            if temp[0] != -1:
-                return temp
-        if index == -1:
-            return [-1,0]
-        match = False
-        for word_or_tag in current[1]:
-            if word_or_tag.islower():
-                match = match or get_word(text[index]).lower() == word_or_tag
-            elif word_or_tag.isupper():
-                if word_or_tag == "INT":
-                    intensifier = find_intensifier(index)
-                    if intensifier:
-                        i = intensifier[0]
-                        result = match_multiword_b(index  - i, words[:-1])
-                        if result[0] != -1:
-                            return [result[0] + i, intensifier[1]]
+    def remove_accents(self, word):
+        for accent in self.accents:
+            word = word.replace(accent, self.accents[accent])
+        return word
+
+    def load_dictionary (self, filepointer, s_dict, c_dict):
+    ### General function for loading dictionaries from files and putting them
+    ### either in the simple or complex dictionary, as appropriate
+        for line in filepointer.readlines():
+            pair = line.strip().split()
+            if len(pair) == 2:
+                if "_" not in pair[0]:  #if single word
+                    if self.language == "Spanish" and self.has_accent(pair[0]):
+                        s_dict[self.remove_accents(pair[0])] = float(pair[1])
+                    s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
+                elif self.use_multiword_dictionaries:
+                    entries = self.get_multiword_entries(pair[0])
+                    for entry in entries:
+                        if entry[0] not in c_dict:
+                            c_dict[entry[0]] = [[entry[1], float(pair[1])]]
+                        else:
+                            c_dict[entry[0]].append([entry[1], float(pair[1])])
+        filepointer.close()
+
+    def load_extra_dict (self, filepointer):
+    ### loads the optional dictionary, which contains entries from all the
+    ### various types of words
+        s_dict = False
+        c_dict = False
+        for line in filepointer.readlines():
+            line = line.strip()
+            if line:
+                if line == "adjectives":
+                    s_dict = self.adj_dict
+                    c_dict = self.c_adj_dict
+                elif line == "nouns":
+                    s_dict = self.noun_dict
+                    c_dict = self.c_noun_dict
+                elif line == "verbs":
+                    s_dict = self.verb_dict
+                    c_dict = self.c_verb_dict
+                elif line == "adverbs":
+                    s_dict = self.adv_dict
+                    c_dict = self.c_adv_dict
+                elif line == "intensifiers":
+                    s_dict = self.int_dict
+                    c_dict = self.c_adv_dict
+                elif s_dict:
+                    pair = line.split()
+                    if "_" not in pair[0]:  #if single word
+                        s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
+                    elif self.use_multiword_dictionaries:
+                        entries = self.get_multiword_entries(pair[0])
+                        for entry in entries:
+                            if entry[0] not in c_dict:
+                                c_dict[entry[0]] = [[entry[1], float(pair[1])]]
+                            else:
+                                 for old_entry in c_dict[entry[0]]: # duplicate entry
+                                    if same_lists(old_entry[0], entry[1]):
+                                        c_dict[entry[0]].remove(old_entry)
+                                 c_dict[entry[0]].append([entry[1], float(pair[1])])
+        filepointer.close()
+
+    def dictionary_cache_key(self):
+    ### the cached dictionaries are only valid for the same dictionary files
+    ### (same modification time and size) and the same loading settings
+        files = []
+        for path in [self.adj_dict_path, self.adv_dict_path, self.verb_dict_path, self.noun_dict_path, self.int_dict_path, self.extra_dict_path]:
+            if path:
+                stat = os.stat(path)
+                files.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+        return [DICTIONARY_CACHE_VERSION, self.language, self.use_multiword_dictionaries, self.simple_SO, files]
+
+    def load_dictionaries (self):
+    ### load the dictionaries from the binary cache if it is up to date,
+    ### otherwise parse the dictionary files and write a new cache
+        if not self.dictionary_cache:
+            self.parse_dictionaries()
+            return
+        key = self.dictionary_cache_key()
+        cache_path = os.path.join(os.path.dirname(self.adj_dict_path), DICTIONARY_CACHE_NAME)
+        try:
+            with open(cache_path, "rb") as cache:
+                (cached_key, dictionaries) = pickle.load(cache)
+            if cached_key == key:
+                (self.adj_dict, self.adv_dict, self.verb_dict, self.noun_dict, self.int_dict,
+                 self.c_adj_dict, self.c_adv_dict, self.c_verb_dict, self.c_noun_dict, self.c_int_dict,
+                 self.c_int_trie) = dictionaries
+                return
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            pass # no usable cache, rebuild it
+        self.parse_dictionaries()
+        dictionaries = [self.adj_dict, self.adv_dict, self.verb_dict, self.noun_dict, self.int_dict,
+                        self.c_adj_dict, self.c_adv_dict, self.c_verb_dict, self.c_noun_dict, self.c_int_dict,
+                        self.c_int_trie]
+        temp_path = cache_path + "." + str(os.getpid())
+        try:
+            with open(temp_path, "wb") as cache:
+                pickle.dump([key, dictionaries], cache, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path) # never leave a half written cache
+        except OSError:
+            pass # the dictionary folder is not writable, work without a cache
+
+    def parse_dictionaries (self):
+    ### load the five kinds of dictionaries
+        self.load_dictionary (open (self.adj_dict_path, encoding = "ISO-8859-1"), self.adj_dict, self.c_adj_dict)
+        self.load_dictionary (open (self.adv_dict_path, encoding = "ISO-8859-1"), self.adv_dict, self.c_adv_dict)
+        self.load_dictionary (open (self.verb_dict_path, encoding = "ISO-8859-1"), self.verb_dict, self.c_verb_dict)
+        self.load_dictionary (open (self.noun_dict_path, encoding = "ISO-8859-1"), self.noun_dict, self.c_noun_dict)
+        self.load_dictionary (open (self.int_dict_path, encoding = "ISO-8859-1"), self.int_dict, self.c_int_dict)
+        if self.extra_dict_path:
+            self.load_extra_dict(open (self.extra_dict_path, encoding = "ISO-8859-1"))
+        if self.simple_SO:
+            for s_dict in [self.adj_dict,self.adv_dict,self.verb_dict, self.noun_dict]:
+                for entry in s_dict:
+                    if s_dict[entry] > 0:
+                        s_dict[entry] = 2
+                    elif s_dict[entry] < 0:
+                        s_dict[entry] = -2
+            for entry in self.int_dict:
+                if self.int_dict[entry] > 0:
+                    self.int_dict[entry] = .5
+                elif self.int_dict[entry] < 0 and self.int_dict[entry] > -1:
+                    self.int_dict[entry] = -.5
+                elif self.int_dict[entry] < -1:
+                    self.int_dict[entry] = -2
+            for c_dict in [self.c_adj_dict,self.c_adv_dict,self.c_verb_dict, self.c_noun_dict]:
+                for entry in c_dict:
+                    for i in range(len(c_dict[entry])):
+                        if c_dict[entry][i][1] > 0:
+                            c_dict[entry][i] = [c_dict[entry][i][0], 2]
+                        elif c_dict[entry][i][1] < 0:
+                            c_dict[entry][i] = [c_dict[entry][i][0], -2]
+            for entry in self.c_int_dict:
+                 for i in range(len(self.c_int_dict[entry])):
+                     if self.c_int_dict[entry][i][1] > 0:
+                         self.c_int_dict[entry][i] = [self.c_int_dict[entry][i][0], .5]
+                     elif self.c_int_dict[entry][i][1] < 0 and self.c_int_dict[entry][i][1] > -1:
+                         self.c_int_dict[entry][i] = [self.c_int_dict[entry][i][0], -.5]
+                     elif self.c_int_dict[entry][i][1] < -1:
+                         self.c_int_dict[entry][i] = [self.c_int_dict[entry][i][0], -2]
+        for c_dict in [self.c_adj_dict,self.c_adv_dict,self.c_verb_dict, self.c_noun_dict]:
+            for entry in c_dict: # compile the words before (reversed) and after the key
+                for i in range(len(c_dict[entry])):
+                    words = c_dict[entry][i][0]
+                    start = words.index("#")
+                    c_dict[entry][i] = [words, c_dict[entry][i][1],
+                                        compile_multiword_slots(reversed(words[:start])),
+                                        compile_multiword_slots(words[start + 1:])]
+        self.c_int_trie = build_intensifier_trie(self.c_int_dict)
+
+
+    def convert_ranges(self):
+    ### converts a list of string ranges in faction form (e.g. ["1/4-1/2", 2]) into a
+    ### a list of numerical ranges plus weight (e.g. [0.25, .5, 2]
+        new_ranges = []
+        for range in self.weights_by_location:
+            pair = range.split("-")
+            if len(pair) == 2:
+                start = convert_fraction(pair[0].strip())
+                end = convert_fraction(pair[1].strip())
+                if start >= 0 and start <= 1 and end >= 0 and end <= 1 and start < end:
+                    new_ranges.append([start,end, self.weights_by_location[range]])
+        return new_ranges
+
+
+    def read_tokens(self, infile):
+    ### Read in the textfile one line at a time. The file is assumed to be properly
+    ### spaced and tagged, i.e. there should be a space between every word/tag pair
+    ### or XML tag. Yields a (word, tag, weight) triple for every token, splitting
+    ### at the last "/" so that words containing one (e.g. 1/2/CD) keep it, and
+    ### None at the end of every line. If there are XML tags and those tags have
+    ### been assigned weight, the weight will be applied after the opening tag and
+    ### will be removed at the closing tag. XML tags themselves are not yielded
+        weight = 1.0 # start with weight 1
+        temp_weight = 1.0 # keep track of weight before a zero
+        for line in infile:
+            line = line.replace("<", " <").replace(">", "> ")
+            for word in line.strip().split(" "):
+                if word:
+                    if word[0] == "<" and word[-1] == ">": #XML tag
+                        XML_tag = word.strip("<>/")
+                        if self.use_XML_weighing:
+                            if XML_tag in self.weight_tags:
+                                weight_modifier = self.weight_tags[XML_tag]
+                            elif is_decimal(XML_tag):
+                                weight_modifier = float(XML_tag)
+                            else:
+                                weight_modifier = 1
+                            if word[1] == "/":
+                                if weight_modifier != 0:
+                                    weight /= weight_modifier # remove weight
+                                else:
+                                    weight = temp_weight # use pre-zero weight
+                            else:
+                                if weight_modifier != 0:
+                                    weight *= weight_modifier # add weight
+                                else:
+                                    temp_weight = weight # save weight
+                                    weight = 0
+                    elif "/" in word:
+                        (word, _, tag) = word.rpartition("/")
+                        yield (word, tag, weight)
+            yield None
+
+    def fill_text_and_weights(self, infile):
+    ### the tokens are stored as they are read, so the file is never held in
+    ### memory as a whole. All XML tags are removed for the SO calculation
+        self.text = TokenStore(self.strings, self.string_ids)
+        self.weights = array.array("d")
+        self.int_weights = set()
+        self.boundaries = []
+        for token in self.read_tokens(infile):
+            if token is None: # end of line
+                self.boundaries.append(len(self.text))
+            else:
+                self.text.append(token[0], token[1])
+                if type(token[2]) is int: # the 0 of a zero XML tag
+                    self.int_weights.add(len(self.weights))
+                self.weights.append(token[2])
+        self.pack_weights()
+        if self.use_weight_by_location:  # add location weights
+            self.weigh_by_location()
+        self.lowercase_words()
+        self.index_boundaries()
+        self.index_punctuation()
+        self.index_clauses()
+        infile.close()
+
+    def weight_string(self, index):
+    ### the weight of a word as the rich output prints it; the weights used to be
+    ### a list of Python numbers, where the 0 of a zero XML tag was an integer
+        if index in self.int_weights:
+            return str(int(self.weights[index]))
+        return str(float(self.weights[index]))
+
+    def pack_weights(self):
+    ### keeps the weights in a float64 array when numpy is available
+        if numpy is not None:
+            self.weights = numpy.array(self.weights, dtype = numpy.float64)
+
+    def weigh_by_location(self):
+    ### multiplies the weights of the words within each location range (as a
+    ### fraction of the text) by the weight of the range; the words of a range
+    ### are found directly, so each range is a single slice multiplication
+        length = len(self.weights)
+        for (start, end, weight) in self.location_ranges:
+            first = location_index(start, length)
+            last = location_index(end, length)
+            if first < last:
+                if self.int_weights: # a weight multiplied by a range is a float
+                    self.int_weights = {index for index in self.int_weights if not first <= index < last}
+                if numpy is not None:
+                    self.weights[first:last] *= weight
                 else:
-                    match = match or get_tag(text[index]) == word_or_tag
-        if not match:
-            return [-1, 0]
-        else:
-            if current[0] == "*":
-                temp = match_multiword_b(index - 1, words)
-            elif current[0] == "+":
-                temp = match_multiword_b(index - 1, words[:-1] + [["*", current[1]]])
-            elif current[0] == "?":
-                temp = match_multiword_b(index - 1, words[:-1])
+                    self.weights[first:last] = array.array("d", [old_weight * weight for old_weight in self.weights[first:last]])
+
+    def lowercase_words(self):
+    ### lowercases every word of the text and looks up its word classes once;
+    ### unlike the tags, the words do not change during the calculation
+        for string in self.strings[len(self.lower_strings):]: # new strings
+            lower = string.lower()
+            self.lower_strings.append(lower)
+            self.string_classes.append(self.get_word_classes(string, lower))
+        self.lower_words = [self.lower_strings[word_id] for word_id in self.text.word_ids]
+        self.word_classes = bytearray([self.string_classes[word_id] for word_id in self.text.word_ids])
+
+    def get_word_classes(self, word, lower):
+    ### the bitmask of the closed word classes of a word, given with its
+    ### lowercase form, so that the searches test a class with a single AND
+        classes = 0
+        if word in self.punct:
+            classes |= PUNCT_CLASS
+        if word in self.sent_punct:
+            classes |= SENT_PUNCT_CLASS
+        if word in self.boundary_words:
+            classes |= BOUNDARY_WORD_CLASS
+        if lower in self.negators:
+            classes |= NEGATOR_CLASS
+        if lower in self.irrealis:
+            classes |= IRREALIS_CLASS
+        if lower in self.highlighters:
+            classes |= HIGHLIGHTER_CLASS
+        return classes
+
+    def index_boundaries(self):
+    ### builds a set of the boundaries and, for every index in the text, the
+    ### number of the first boundary at or after it, so that the boundary and
+    ### sentence number lookups take constant time. The boundaries must be in
+    ### text order, as they are when read from the input
+        self.boundary_set = set(self.boundaries)
+        self.sentence_numbers = []
+        for (sentence_no, boundary) in enumerate(self.boundaries):
+            while len(self.sentence_numbers) <= boundary:
+                self.sentence_numbers.append(sentence_no)
+
+    def index_punctuation(self):
+    ### one backward and one forward pass over the text that record, for every
+    ### token, the punctuation that ends its sentence and whether it is within
+    ### quotation marks. Only words are used, and words never change while a
+    ### text is scored, so the tables stay valid for the whole calculation
+        length = len(self.text)
+        words = self.text.word_list()
+        is_quote = [word == '"' or word == "'" for word in words]
+        is_sent_punct = [classes & SENT_PUNCT_CLASS != 0 for classes in self.word_classes]
+        self.sent_puncts = [None] * length
+        quotes_right = [0] * (length + 1) # quotes from the token to the sentence end
+        right_end = [length] * (length + 1) # the index just past the sentence end
+        sent_punct = "EOF"
+        for i in range(length - 1, -1, -1):
+            if is_sent_punct[i]:
+                sent_punct = words[i]
+                right_end[i] = i + 1
             else:
-                temp = match_multiword_b(index - 1, words[:-1] + [[str(int(current[0]) - 1), current[1]]])
-            if temp[0] == -1:
-                return temp
+                quotes_right[i] = quotes_right[i + 1] + is_quote[i]
+                right_end[i] = right_end[i + 1]
+            self.sent_puncts[i] = sent_punct
+        self.in_quotes = [False] * length
+        quotes_left = 0 # quotes from the sentence start to the token
+        for i in range(length):
+            if is_sent_punct[i]:
+                quotes_left = 0
+                continue
+            quotes_left += is_quote[i]
+            if operator.mod(quotes_left,2) == 1:
+                quotes = quotes_right[i]
+                end = right_end[i]
+                if (quotes_left - quotes == 1) and end < length - 1 and words[end+1] == '"':
+                    quotes += 1
+                self.in_quotes[i] = operator.mod(quotes,2) == 1
+
+    def index_clauses(self):
+    ### one forward pass over the text that records, for every token, where the
+    ### backward searches of has_sent_irrealis, get_sent_highlighter and
+    ### is_in_imperative would stop, and what they would find on the way: the
+    ### last index at a boundary and the last sentence punctuation at or before
+    ### the token (-1 if there is none), whether there is an irrealis marker and
+    ### which highlighter is nearest after that boundary up to the token. As with
+    ### index_punctuation, only words are used, so the tables stay valid
+        length = len(self.text)
+        boundary_set = self.boundary_set
+        boundary_classes = self.boundary_classes
+        self.clause_starts = [-1] * length
+        self.sentence_starts = [-1] * length
+        self.clause_irrealis = [False] * length
+        self.clause_highlighters = [False] * length
+        clause_start = -1
+        sentence_start = -1
+        irrealis = False
+        highlighter = False
+        for i in range(length):
+            classes = self.word_classes[i]
+            if classes & SENT_PUNCT_CLASS:
+                sentence_start = i
+            if i + 1 in boundary_set or classes & boundary_classes: # at_boundary(i)
+                clause_start = i
+                irrealis = False
+                highlighter = False
             else:
-                return [temp[0] + 1, temp[1]]
-
-
-def find_multiword(index, dict_entry_list):
-### this function determines whether the words surrounding the key word at
-### index match one of the dictionary definitions in dict_entry_list. If so,
-### it returns a list containing the SO value, the number of words in the phrase,
-### that are to the left of index, the number of words to the right, and the
-### value of any intensifier. Any word specifically designated in the defintion
-### will have its tag changed to "MOD" so that it will not be counted twice
-    for dict_entry in dict_entry_list:
-        words = dict_entry[0]
-        SO = dict_entry[1]
-        start = words.index("#")
-        intensifier = 0
-        if start < len(words) - 1:
-            (countforward, int_temp) = match_multiword_f(index + 1, words[start +1:])
-            if int_temp != 0:
-                intensifier = int_temp
+                if classes & IRREALIS_CLASS:
+                    irrealis = True
+                if classes & HIGHLIGHTER_CLASS:
+                    highlighter = self.lower_words[i]
+            self.clause_starts[i] = clause_start
+            self.sentence_starts[i] = sentence_start
+            self.clause_irrealis[i] = irrealis
+            self.clause_highlighters[i] = highlighter
+
+    ### English steming functions ###
+
+    def stem_NN(self, NN):
+        if NN not in self.noun_dict and NN not in self.c_noun_dict and  len(NN) > 2 and NN[-1] == "s":   # boys -> boy
+            NN = NN[:-1]
+            if NN not in self.noun_dict and NN not in self.c_noun_dict and NN[-1] == "e": # watches -> watch
+                NN = NN[:-1]
+                if NN not in self.noun_dict and NN not in self.c_noun_dict and NN[-1] == "i": # flies -> fly
+                    NN = NN[:-1] + "y"
+        return NN
+
+    def stem_VB(self, VB, type):
+        if type == "" or type == "P" or len(VB) < 4 or VB in self.verb_dict or VB in self.c_verb_dict:
+            return VB
+        elif type == "D" or type == "N":
+            if VB[-1] == "d":
+                VB = VB[:-1]   #  loved -> love
+                if not VB in self.verb_dict and not VB in self.c_verb_dict:
+                    if VB[-1] == "e":
+                        VB = VB[:-1]   # enjoyed -> enjoy
+                    if not VB in self.verb_dict and not VB in self.c_verb_dict:
+                        if VB[-1] == "i":
+                            VB = VB[:-1] + "y" # tried -> try
+                        elif len(VB) > 1 and VB[-1] == VB[-2]:
+                            VB = VB[:-1]   # compelled -> compel
+            return VB
+        elif type == "G":
+            VB = VB[:-3] # obeying -> obey
+            if not VB in self.verb_dict and not VB in self.c_verb_dict:
+                if len(VB) > 1 and VB[-1] == VB[-2]:
+                    VB = VB[:-1] # stopping -> stop
+                else:
+                    VB = VB + "e" # amusing -> amuse
+            return VB
+        elif type == "Z" and len(VB) > 3:
+            if VB[-1] == "s":
+                VB = VB[:-1]  # likes -> like
+                if VB not in self.verb_dict and not VB in self.c_verb_dict and VB[-1] == "e":
+                    VB = VB[:-1]  # watches -> watch
+                    if VB not in self.verb_dict and not VB in self.c_verb_dict and VB[-1] == "i":
+                        VB = VB[:-1] + "y"  # flies -> fly
+            return VB
+
+    def stem_RB_to_JJ(self, RB):
+    ### used to find the adjective that is the stem of an adverb so that the adverb
+    ### can be added automatically to the dictionary
+        JJ = RB
+        if len(JJ) > 3 and JJ[-2:] == "ly":
+            JJ = JJ[:-2]  # sharply -> sharp
+            if not JJ in self.adj_dict:
+                if JJ + "l" in self.adj_dict:
+                    JJ += "l" # full -> fully
+                elif JJ + "le" in self.adj_dict:
+                    JJ += "le" # simply -> simple
+                elif JJ[-1] == "i" and JJ[:-1] + "y" in self.adj_dict:
+                    JJ = JJ[:-1] + "y" # merrily -> merry
+                elif len(JJ) > 5 and JJ[-2:] == "al" and JJ[:-2] in self.adj_dict:
+                    JJ = JJ[:-2] # angelic -> angelically
+        return JJ
+
+    def stem_ative_adj(self, JJ):
+    # this function does stemming for both comparative and superlative adjectives
+    # after the suffix "er" or "est" has been removed
+        if JJ not in self.adj_dict:
+            if JJ + "e" in self.adj_dict:
+                JJ += "e" # abler/ablest -> able
+            elif JJ[:-1] in self.adj_dict:
+                JJ = JJ[:-1] # bigger/biggest -> big
+            elif JJ[-1] == "i" and JJ[:-1] + "y" in self.adj_dict:
+                JJ = JJ[:-1] + "y" # easier/easiest -> easy
+        return JJ
+
+
+    def stem_comp_JJ(self, JJ):
+        if JJ[-2:] == "er":
+            JJ = self.stem_ative_adj(JJ[:-2]) # fairer -> fair
+        return JJ
+
+    def stem_super_JJ(self, JJ):
+        if JJ[-3:] == "est":
+            JJ = self.stem_ative_adj(JJ[:-3]) # fairest -> fair
+        return JJ
+
+    ### Spanish Stemming Fuctions
+
+    def stem_NC(self, NC):
+        if NC not in self.noun_dict and len(NC) > 2 and NC[-1] == "s":   # diplomas -> diploma
+            NC = NC[:-1]
+        if NC not in self.noun_dict and NC not in self.c_noun_dict and len(NC) > 1:
+            if NC[-1] == "a":
+                NC = NC[:-1] + "o" #hermanas -> hermano
+            elif NC[-1] == "e": # actor -> actores
+                NC = NC[:-1]
+        return NC
+
+    def stem_AQ(self, AQ):
+        if AQ not in self.adj_dict and len(AQ) > 2 and AQ[-1] == "s":   # buenos -> bueno
+            AQ = AQ[:-1]
+        if AQ not in self.adj_dict and AQ not in self.c_adj_dict and len(AQ) > 1:
+            if AQ[-1] == "a":    # buena -> bueno
+                AQ = AQ[:-1] +  "o"
+            elif AQ[-1] == "e": #  -> watch
+                AQ = AQ[:-1]
+        return AQ
+
+    def stem_RG_to_AQ(self, RG):
+    ### used to find the adjective that is the stem of an adverb so that the adverb
+    ### can be added automatically to the dictionary
+        AQ = RG
+        if len(AQ) > 6 and AQ[-5:] == "mente" :
+            AQ = AQ[:-5]  # felizmente -> feliz
+            if not AQ in self.adj_dict:
+                if AQ[-1] == "a":
+                    AQ = AQ[:-1] + "o" # nuevamente -> nuevo
+        return AQ
+
+
+    def stem_super_AQ(self, AQ):
+    # this function removes "isima" or "isimo" from the word
+        if AQ not in self.adj_dict:
+            if len(AQ) > 6 and AQ[-5:] in [chr(237) + "sima", chr(237) + "simo", "isima", "isimo"]:
+                AQ = AQ[:-5]
+                if AQ not in self.adj_dict:
+                    if AQ[-2:] == "qu":
+                        AQ = AQ[:-2] + "co"
+                    elif AQ[-2] == "gu":
+                        AQ = AQ[:-1] = "o"
+                    else:
+                        AQ += "o"
+        return AQ
+
+    ### Language general stemming functions ###
+
+    def lemmatize(self, word, tag):
+    ### returns a list containing the lemma of a (case normalized) word with the
+    ### given tag, i.e. the form that is looked up in the dictionaries, whether it
+    ### is in the simple dictionary and whether it is in the complex dictionary.
+    ### For adverbs, the lemma is the corresponding adjective. Stemming only
+    ### depends on the dictionaries, which do not change (the adverbs learned
+    ### from the adjectives aside, which are never stemmed), so the results are
+    ### kept in a bounded LRU memo which lasts across texts
+        key = (word, tag)
+        if key in self.lemma_memo:
+            self.lemma_memo.move_to_end(key)
+            return self.lemma_memo[key]
+        pos = tag[:2]
+        if pos == self.noun_tag:
+            lemma = self.stem_noun(word)
+            (s_dict, c_dict) = (self.noun_dict, self.c_noun_dict)
+        elif pos == self.verb_tag:
+            lemma = word
+            if self.language == "English":
+                lemma = self.stem_VB(word, tag[2:])
+            (s_dict, c_dict) = (self.verb_dict, self.c_verb_dict)
+        elif pos == self.adj_tag:
+            lemma = word
+            if self.language == "English":
+                if word not in self.adj_dict and word not in self.not_wanted_adj:
+                    if tag[2:] == "R":
+                        lemma = self.stem_comp_JJ(word)
+                    elif tag[2:] == "S":
+                        lemma = self.stem_super_adj(word)
+            elif self.language == "Spanish":
+                lemma = self.stem_AQ(word)
+            (s_dict, c_dict) = (self.adj_dict, self.c_adj_dict)
         else:
-            countforward = 0
-        if start > 0:
-            (countback, int_temp) = match_multiword_b(index - 1, words[:start])
-            if int_temp != 0:
-                intensifier = int_temp
+            lemma = self.stem_adv_to_adj(word)
+            (s_dict, c_dict) = (self.adj_dict, self.c_adj_dict)
+        result = [lemma, lemma in s_dict, lemma in c_dict]
+        self.lemma_memo[key] = result
+        if len(self.lemma_memo) > LEMMA_MEMO_SIZE:
+            self.lemma_memo.popitem(last = False) # forget the least recently used
+        return result
+
+    def stem_noun(self, noun):
+        if self.language == "English":
+            return self.stem_NN(noun)
+        elif self.language == "Spanish":
+            return self.stem_NC(noun)
+
+    def stem_adv_to_adj(self, adverb):
+        if self.language == "English":
+            return self.stem_RB_to_JJ(adverb)
+        elif self.language == "Spanish":
+            return self.stem_RG_to_AQ(adverb)
+
+    def stem_super_adj(self, adj):
+        if self.language == "English":
+            return self.stem_super_JJ(adj)
+        elif self.language == "Spanish":
+            return self.stem_super_AQ(adj)
+
+
+    def find_intensifier(self, index):
+    ### this function determines whether the given index is the last word (or,
+    ### trivially, the only word) in an intensifier. If so, it returns a list
+    ### containing, as its first element, the length of the intensifier and,
+    ### as its second element, the modifier from the relevant intensifier dictionary
+        if index < 0 or index >= len(self.text) or self.text.tag(index) == "MOD": # already modifying something
+            return False
+        word = self.lower_words[index]
+        if word in self.c_int_trie: # might be complex
+            node = self.c_int_trie[word]
+            intensifier = node.get(None)
+            i = index - 1
+            while i >= 0 and self.lower_words[i] in node: # the longest one wins
+                node = node[self.lower_words[i]]
+                if None in node:
+                    intensifier = node[None]
+                i -= 1
+            if intensifier:
+                return [intensifier[0], intensifier[1]]
+        if word in self.int_dict: # simple intensifier
+            modifier = self.int_dict[word]
+            if self.text.word(index).isupper() and self.use_cap_int: # if capitalized
+                 modifier *= self.capital_modifier   # increase intensification
+            return [1, modifier]
+        return False
+
+    def match_multiword(self, index, slots, forward):
+    ### this function matches the compiled slots of a (partial) multi-word
+    ### dictionary entry with the corresponding part of the text, starting from
+    ### index and moving forward (or backward). Partial matches are kept on a
+    ### stack and extended depth first, trying an optional slot without its word
+    ### first, then any intensifier, then the word itself; the first complete match
+    ### wins. The function returns a list containing the number of words matched
+    ### (or -1 if the match failed) and the value of any intensifier found
+        stack = [iter([(index, 0, None, 0, None)])]
+        while stack:
+            for state in stack[-1]:
+                if state[1] == len(slots):
+                    if state[4] is None:
+                        return [state[3], 0]
+                    return [state[3], state[4]]
+                stack.append(self.extend_multiword_match(state, slots, forward))
+                break
+            else:
+                stack.pop() # all the ways of extending this match failed
+        return [-1, 0]
+
+    def extend_multiword_match(self, state, slots, forward):
+    ### generates the partial matches which extend the match in state (the index
+    ### of the next word, the current slot, the times it still has to appear, the
+    ### number of words matched and the intensifier value) by one step. The first
+    ### intensifier found along the match is the one which is kept
+        (index, pos, count, matched, intensifier) = state
+        (slot_count, words, tags, has_int) = slots[pos]
+        if count is None:
+            count = slot_count
+        if count == 0:
+            yield (index, pos + 1, None, matched, intensifier) #this slot done
+            return
+        if count == "*" or count == "?": # word optional - try without it
+            yield (index, pos + 1, None, matched, intensifier)
+        if forward:
+            if index == len(self.text):
+                return # reached the end of the text
+            step = 1
         else:
-            countback = 0
-        if countforward != -1 and countback != -1:
-            for i in range(index - countback, index + countforward + 1):
-                if get_word(text[i]) in dict_entry[0]:
-                    text[i][1] = "MOD"
-            return [SO, countback, countforward, intensifier]
-    return False
-
-def words_within_num(index, words_tags, num):
-### check to see if something in words_tags is within num of index (including
-### index), returns true if so
-    while num > 0:
-        if get_word(text[index]) in words_tags or get_tag(text[index]) in words_tags:
-            return True
-        num -= 1
-        index -= 1
-    return False
-
-
-def get_sentence (index):
-### extracts the sentence (a string) that contains the given index, for searching
-    sent_start = index
-    sent_end = index + 1
-    while sent_start > 0 and sent_start not in boundaries:
-        sent_start -= 1
-    while sent_end < len(text) and sent_end not in boundaries:
-        sent_end += 1
-    return " ".join(map(get_word, text[sent_start : sent_end]))
-
-def get_sentence_no (index):
-### returns the sentence number, based on the orignal text newlines
-    while index not in boundaries:
-        index += 1
-    return boundaries.index(index)
-
-def get_sent_punct (index):
-### get the next sentence punctuation (e.g. ?, !, or .) after the given index
-    while text[index][0] not in sent_punct:
-        if index == len(text) - 1: #if the end of the text is reached
-            return "EOF"
-        index += 1
-    return get_word(text[index])
-
-def at_boundary (index):
-    if index +1 in boundaries:
-        return True
-    elif use_boundary_punct and get_word(text[index]) in punct:
-        return True
-    elif use_boundary_words and get_word(text[index]) in boundary_words:
-        return True
-    else:
+            if index == -1:
+                return
+            step = -1
+        if has_int: # if looking for a intensifiers
+            if forward:
+                i = 1
+                while index + i < len(self.text) and not self.word_classes[index + i] & SENT_PUNCT_CLASS:
+                    int_result = self.find_intensifier(index + i - 1)
+                    if int_result and int_result[0] == i:
+                        if intensifier is None:
+                            yield (index + i, pos + 1, None, matched + i, int_result[1])
+                        else:
+                            yield (index + i, pos + 1, None, matched + i, intensifier)
+                    i += 1
+            else:
+                int_result = self.find_intensifier(index)
+                if int_result:
+                    i = int_result[0]
+                    if intensifier is None:
+                        yield (index - i, pos + 1, None, matched + i, int_result[1])
+                    else:
+                        yield (index - i, pos + 1, None, matched + i, intensifier)
+        if self.lower_words[index] in words or self.text.tag(index) in tags:
+            if count == "*" or count == "+":
+                yield (index + step, pos, "*", matched + 1, intensifier)
+            elif count == "?":
+                yield (index + step, pos + 1, None, matched + 1, intensifier)
+            else:
+                yield (index + step, pos, count - 1, matched + 1, intensifier)
+
+    def find_multiword(self, index, dict_entry_list):
+    ### this function determines whether the words surrounding the key word at
+    ### index match one of the dictionary definitions in dict_entry_list. If so,
+    ### it returns a list containing the SO value, the number of words in the phrase,
+    ### that are to the left of index, the number of words to the right, and the
+    ### value of any intensifier. Any word specifically designated in the defintion
+    ### will have its tag changed to "MOD" so that it will not be counted twice
+        for dict_entry in dict_entry_list:
+            SO = dict_entry[1]
+            (backward_slots, forward_slots) = dict_entry[2:]
+            intensifier = 0
+            if forward_slots:
+                (countforward, int_temp) = self.match_multiword(index + 1, forward_slots, True)
+                if int_temp != 0:
+                    intensifier = int_temp
+            else:
+                countforward = 0
+            if backward_slots:
+                (countback, int_temp) = self.match_multiword(index - 1, backward_slots, False)
+                if int_temp != 0:
+                    intensifier = int_temp
+            else:
+                countback = 0
+            if countforward != -1 and countback != -1:
+                for i in range(index - countback, index + countforward + 1):
+                    if self.text.word(i) in dict_entry[0]:
+                        self.text.set_tag(i, "MOD")
+                return [SO, countback, countforward, intensifier]
         return False
 
+    def words_within_num(self, index, words_tags, num):
+    ### check to see if something in words_tags is within num of index (including
+    ### index), returns true if so
+        while num > 0:
+            if self.text.word(index) in words_tags or self.text.tag(index) in words_tags:
+                return True
+            num -= 1
+            index -= 1
+        return False
+
+
+    def get_sentence (self, index):
+    ### extracts the sentence (a string) that contains the given index, for searching
+        sent_start = index
+        sent_end = index + 1
+        while sent_start > 0 and sent_start not in self.boundary_set:
+            sent_start -= 1
+        while sent_end < len(self.text) and sent_end not in self.boundary_set:
+            sent_end += 1
+        return " ".join(self.text.words(sent_start, sent_end))
+
+    def get_sentence_no (self, index):
+    ### returns the sentence number, based on the orignal text newlines
+        return self.sentence_numbers[index]
+
+    def get_sent_punct (self, index):
+    ### get the next sentence punctuation (e.g. ?, !, or .) after the given index
+        if index >= 0:
+            return self.sent_puncts[index]
+        while not self.word_classes[index] & SENT_PUNCT_CLASS:
+            if index == len(self.text) - 1: #if the end of the text is reached
+                return "EOF"
+            index += 1
+        return self.text.word(index)
+
+    def at_boundary (self, index):
+        if index +1 in self.boundary_set:
+            return True
+        return (self.word_classes[index] & self.boundary_classes) != 0
+
 
-def has_sent_irrealis(index):
-### Returns true if there is a irrealis marker in the sentence and no
-### punctuation or boundary word intervenes between the marker and the index
-    if not (use_definite_assertion and words_within_num(index, definites, 1)):
-        while index != -1 and not at_boundary(index):
-            if get_word(text[index]).lower() in irrealis:
+    def has_sent_irrealis(self, index):
+    ### Returns true if there is a irrealis marker in the sentence and no
+    ### punctuation or boundary word intervenes between the marker and the index.
+    ### Irrealis words are looked up in the table of index_clauses; Spanish verb
+    ### moods are found by their tags, which can change during the calculation,
+    ### so they are still searched for, back to the start of the clause
+        if not (self.use_definite_assertion and self.words_within_num(index, self.definites, 1)):
+            if index < 0:
+                return False
+            if self.clause_irrealis[index]:
                 return True
-            if language == "Spanish":
-                tag = get_tag(text[index])
-                if len(tag) == 4 and tag[0] == "V" and ((tag[2] == "M" and use_imperative) or (tag[2] == "S" and use_subjunctive) or (tag[3] == "C" and use_conditional)):
+            if self.language == "Spanish":
+                for i in range(index, self.clause_starts[index], -1):
+                    tag = self.text.tag(i)
+                    if len(tag) == 4 and tag[0] == "V" and ((tag[2] == "M" and self.use_imperative) or (tag[2] == "S" and self.use_subjunctive) or (tag[3] == "C" and self.use_conditional)):
+                        return True
+        return False
+
+    def get_sent_highlighter(self, index):
+    ### If there is a word in the sentence prior to the index but before a boundary
+    ### marker (including a boundary marker) in the highlighter list, return it
+    ### (see index_clauses)
+        if index < 0:
+            return False
+        return self.clause_highlighters[index]
+
+
+    def find_negation(self, index, word_type):
+    ### looks backwards for a negator and returns its index if one is found and
+    ### there is no intervening puctuation or boundary word. If restricted negation
+    ### is used (for the given word type), the search will only continue if each
+    ### word or its tag is in the skipped list for its type
+        search = True
+        found = -1
+        while search and not self.at_boundary(index) and index != -1:
+            current = self.lower_words[index]
+            if self.word_classes[index] & NEGATOR_CLASS:
+                search = False
+                found = index
+            if self.restricted_neg[word_type] and current not in self.skipped[word_type] and self.text.tag(index) not in self.skipped[word_type]:
+                search = False
+            index -= 1
+        return found
+
+    def is_blocker(self, SO, index):
+        if index > -1 and index < len(self.text):
+            (modifier, tag) = self.text.pair(index)
+            if tag == self.adv_tag and modifier in self.adv_dict and abs(self.adv_dict[modifier]) >= self.blocker_cutoff:
+                if abs(SO + self.adv_dict[modifier]) < abs(SO) + abs(self.adv_dict[modifier]):
+                    return True
+            elif tag == self.adj_tag and modifier in self.adj_dict and abs(self.adj_dict[modifier]) >= self.blocker_cutoff:
+                if abs(SO + self.adj_dict[modifier]) < abs(SO) + abs(self.adj_dict[modifier]):
                     return True
+            elif tag[:2] == self.verb_tag and modifier in self.verb_dict and abs(self.verb_dict[modifier]) >= self.blocker_cutoff:
+                if abs(SO + self.verb_dict[modifier]) < abs(SO) + abs(self.verb_dict[modifier]):
+                    return True
+
+
+    def find_blocker(self, SO, index, POS):
+    ### this function tests if the item at index is of the correct type, orientation
+    ### and strength (as determined by blocker_cutoff) to nullify a word having the
+    ### given SO value
+        stop = False
+        while index > 0 and not stop and not self.at_boundary(index):
+            (modifier, tag) = self.text.pair(index-1)
+            if self.is_blocker(SO, index-1):
+                return True
+            if not modifier in self.skipped[POS] and not tag[:2] in self.skipped[POS]:
+                stop = True
             index -= 1
-    return False
-
-def get_sent_highlighter(index):
-### If there is a word in the sentence prior to the index but before a boundary
-### marker (including a boundary marker) in the highlighter list, return it
-    while index != -1 and not at_boundary(index):
-        if get_word(text[index]).lower() in highlighters:
-            return get_word(text[index]).lower()
-        else:
+        return False
+
+
+    def find_VP_boundary (self, index):
+    ### forward search for the index immediately preceding punctuation or a boundary
+    ### word or punctuation. Used to find intensifiers remote from the verb
+        while not self.at_boundary(index) and index < len(self.text) - 1:
+            index += 1
+        return index
+
+    def is_in_predicate (self, index):
+    ### backwards search for a verb of any kind. Used to determine if a comparative
+    ### or superlative adjective is in the predicate
+        while not self.at_boundary(index) and index > 0:
             index -= 1
-    return False
-
-
-def find_negation(index, word_type):
-### looks backwards for a negator and returns its index if one is found and
-### there is no intervening puctuation or boundary word. If restricted negation
-### is used (for the given word type), the search will only continue if each
-### word or its tag is in the skipped list for its type
-    search = True
-    found = -1
-    while search and not at_boundary(index) and index != -1:
-        current = get_word(text[index]).lower()
-        if current in negators:
-            search = False
-            found = index
-        if restricted_neg[word_type] and current not in skipped[word_type] and get_tag(text[index]) not in skipped[word_type]:
-            search = False
-        index -= 1
-    return found
-
-def is_blocker(SO, index):
-    if index > -1 and index < len(text) and len(text[index]) == 2:
-        (modifier, tag) = text[index]
-        if tag == adv_tag and modifier in adv_dict and abs(adv_dict[modifier]) >= blocker_cutoff:
-            if abs(SO + adv_dict[modifier]) < abs(SO) + abs(adv_dict[modifier]):
+            tag = self.text.tag(index)
+            if (self.language == "English" and tag[:2] == "VB" or tag in ["AUX", "AUXG"]) or (self.language == "Spanish" and tag[0] == "V"):
                 return True
-        elif tag == adj_tag and modifier in adj_dict and abs(adj_dict[modifier]) >= blocker_cutoff:
-            if abs(SO + adj_dict[modifier]) < abs(SO) + abs(adj_dict[modifier]):
-                return True
-        elif tag[:2] == verb_tag and modifier in verb_dict and abs(verb_dict[modifier]) >= blocker_cutoff:
-            if abs(SO + verb_dict[modifier]) < abs(SO) + abs(verb_dict[modifier]):
-                return True
-
+        return False
 
-def find_blocker(SO, index, POS):
-### this function tests if the item at index is of the correct type, orientation
-### and strength (as determined by blocker_cutoff) to nullify a word having the
-### given SO value
-    stop = False
-    while index > 0 and not stop and not at_boundary(index):
-        if len (text[index-1]) == 2:
-            (modifier, tag) = text[index-1]
-            if is_blocker(SO, index-1):
+    def is_in_imperative (self, index):
+    ### Tries to determine if the word at index is in an imperative based on whether
+    ### first word in the clause is a VBP (and not a question or within the
+    ### scope of a definite determiner)
+        if self.get_sent_punct(index) != "?" and not (self.words_within_num(index, self.definites, 1)):
+            i = index
+            if i > -1:
+                if not self.word_classes[i] & SENT_PUNCT_CLASS and self.at_boundary(index):
+                    return False
+                i = self.sentence_starts[i] # see index_clauses
+            (word, tag) = self.text.pair(i+1)
+            if (tag == "VBP" or tag == "VB") and word.lower() not in ["were", "was", "am"]:
                 return True
-            if not modifier in skipped[POS] and not tag[:2] in skipped[POS]:
-                stop = True
-        index -= 1
-    return False
-
-
-def find_VP_boundary (index):
-### forward search for the index immediately preceding punctuation or a boundary
-### word or punctuation. Used to find intensifiers remote from the verb
-    while not at_boundary(index) and index < len(text) - 1:
-        index += 1
-    return index
-
-def is_in_predicate (index):
-### backwards search for a verb of any kind. Used to determine if a comparative
-### or superlative adjective is in the predicate
-    while not at_boundary(index) and index > 0:
-        index -= 1
-        tag = get_tag(text[index])
-        if (language == "English" and tag[:2] == "VB" or tag in ["AUX", "AUXG"]) or (language == "Spanish" and tag[0] == "V"):
-            return True
-    return False
-
-def is_in_imperative (index):
-### Tries to determine if the word at index is in an imperative based on whether
-### first word in the clause is a VBP (and not a question or within the
-### scope of a definite determiner)
-    if get_sent_punct(index) != "?" and not (words_within_num(index, definites, 1)):
-        i = index
-        while i > -1 and get_word(text[i]) not in sent_punct:
-            if at_boundary(index):
-                return False
-            i -=1
-        (word, tag) = text[i+1]
-        if (tag == "VBP" or tag == "VB") and word.lower() not in ["were", "was", "am"]:
-            return True
-    return False
-
-def is_in_quotes (index):
-### check to see if a particular word is contained within quotation marks.
-### looks to a sentence boundary on the left, and one past the sentence
-### boundary on the right; an item in quotes should have an odd number of
-### quotation marks in the sentence on either sides
-    quotes_left = 0
-    quotes_right = 0
-    found = False
-    current = ""
-    i = index
-    while current not in sent_punct and i > -1:
-        current = get_word(text[i])
-        if current == '"' or current == "'":
-            quotes_left += 1
-        i -= 1
-    if operator.mod(quotes_left,2) == 1:
-        current = ""
-        i = index
-        while not found and current not in sent_punct and i < len(text):
-            current = get_word(text[i])
-            if current == '"' or current == "'":
-                quotes_right += 1
-            i += 1
-        if  (quotes_left - quotes_right == 1) and i < len(text) - 1 and get_word(text[i+1]) == '"':
-            quotes_right += 1
-        if operator.mod(quotes_right,2) == 1:
-            found = True
-    return found
-
-
-
-def apply_other_modifiers (SO, index, leftedge):
-### several modifiers that apply equally to all parts of speech based on
-### their context. Words in all caps, in a sentences ending with an
-### exclamation mark, or with some other highlighter are intensified,
-### while words appearing in a question or quotes or with some other
-### irrealis marker are nullified
-        output = []
-        if  use_cap_int and get_word(text[index]).isupper():
-            output.append("X " + str(capital_modifier) +  " (CAPITALIZED)")
-            SO *= capital_modifier
-        if  use_exclam_int and get_sent_punct(index) == "!":
-            output.append("X " + str(exclam_modifier) + " (EXCLAMATION)")
-            SO *= exclam_modifier
-        if  use_highlighters:
-            highlighter = get_sent_highlighter(leftedge)
-            if highlighter:
-                output.append("X " + str(highlighters[highlighter]) + " (HIGHLIGHTED)")
-                SO *= highlighters[highlighter]
-        if use_quest_mod and get_sent_punct(index) == "?" and not (use_definite_assertion and words_within_num(leftedge, definites, 1)):
-            output.append("X 0 (QUESTION)")
-            SO = 0
-        if language == "English" and use_imperative and is_in_imperative(leftedge):
-            output.append("X 0 (IMPERATIVE)")
-            SO = 0
-        if use_quote_mod and is_in_quotes(index):
-            output.append("X 0 (QUOTES)")
-            SO = 0
-        if  use_irrealis and has_sent_irrealis(leftedge):
-            output.append ("X 0 (IRREALIS)")
-            SO = 0
-        return [SO, output]
-
-def fix_all_caps_English():
-### tagger tags most all uppercase words as NNP, this function tries to see if
-### they belong in another dictionary (if so, it changes the tag)
-    for i in range(0, len(text)):
-        if len(text[i]) == 2:
-            (word, tag) = text[i]
+        return False
+
+    def is_in_quotes (self, index):
+    ### check to see if a particular word is contained within quotation marks.
+    ### looks to a sentence boundary on the left, and one past the sentence
+    ### boundary on the right; an item in quotes should have an odd number of
+    ### quotation marks in the sentence on either sides (see index_punctuation)
+        return self.in_quotes[index]
+
+
+
+    def apply_other_modifiers (self, SO, index, leftedge):
+    ### several modifiers that apply equally to all parts of speech based on
+    ### their context. Words in all caps, in a sentences ending with an
+    ### exclamation mark, or with some other highlighter are intensified,
+    ### while words appearing in a question or quotes or with some other
+    ### irrealis marker are nullified
+            output = []
+            if  self.use_cap_int and self.text.word(index).isupper():
+                output.append("X " + str(self.capital_modifier) +  " (CAPITALIZED)")
+                SO *= self.capital_modifier
+            if  self.use_exclam_int and self.get_sent_punct(index) == "!":
+                output.append("X " + str(self.exclam_modifier) + " (EXCLAMATION)")
+                SO *= self.exclam_modifier
+            if  self.use_highlighters:
+                highlighter = self.get_sent_highlighter(leftedge)
+                if highlighter:
+                    output.append("X " + str(self.highlighters[highlighter]) + " (HIGHLIGHTED)")
+                    SO *= self.highlighters[highlighter]
+            if self.use_quest_mod and self.get_sent_punct(index) == "?" and not (self.use_definite_assertion and self.words_within_num(leftedge, self.definites, 1)):
+                output.append("X 0 (QUESTION)")
+                SO = 0
+            if self.language == "English" and self.use_imperative and self.is_in_imperative(leftedge):
+                output.append("X 0 (IMPERATIVE)")
+                SO = 0
+            if self.use_quote_mod and self.is_in_quotes(index):
+                output.append("X 0 (QUOTES)")
+                SO = 0
+            if  self.use_irrealis and self.has_sent_irrealis(leftedge):
+                output.append ("X 0 (IRREALIS)")
+                SO = 0
+            return [SO, output]
+
+    def fix_all_caps_English(self):
+    ### tagger tags most all uppercase words as NNP, this function tries to see if
+    ### they belong in another dictionary (if so, it changes the tag)
+        for i in range(0, len(self.text)):
+            (word, tag) = self.text.pair(i)
             if len(word) > 2 and word.isupper() and tag == "NNP":
                 word = word.lower()
-                if word in adj_dict or word in c_adj_dict:
-                    text[i][1] = "JJ"
-                elif word in adv_dict or word in c_adv_dict:
-                    text[i][1] == "RB"
+                if word in self.adj_dict or word in self.c_adj_dict:
+                    self.text.set_tag(i, "JJ")
+                elif word in self.adv_dict or word in self.c_adv_dict:
+                    self.text.tag(i) == "RB"
 
                 else:
                     ex_tag = "" # verbs need to be stemmed
                     if word[-1] == "s":
-                        word = stem_VB(word, "Z")
+                        word = self.stem_VB(word, "Z")
                         ex_tag = "Z"
                     elif word[-3:] == "ing":
-                        word = stem_VB(word, "G")
+                        word = self.stem_VB(word, "G")
                         ex_tag = "G"
                     elif word[-2:] == "ed":
-                        word = stem_VB(word, "D")
+                        word = self.stem_VB(word, "D")
                         ex_tag = "D"
-                    if word in verb_dict or word in c_verb_dict:
-                        text[i][1] = "VB" + ex_tag
-
-def fix_all_caps_Spanish():
-### tagger tags most all uppercase words as NP, this function tries to see if
-### they belong in another dictionary (if so, it changes the tag)
-    for i in range(0, len(text)):
-        if len(text[i]) == 2:
-            (word, tag) = text[i]
+                    if word in self.verb_dict or word in self.c_verb_dict:
+                        self.text.set_tag(i, "VB" + ex_tag)
+
+    def fix_all_caps_Spanish(self):
+    ### tagger tags most all uppercase words as NP, this function tries to see if
+    ### they belong in another dictionary (if so, it changes the tag)
+        for i in range(0, len(self.text)):
+            (word, tag) = self.text.pair(i)
             if len(word) > 2 and word.isupper() and tag == "NP":
                 word = word.lower()
-                alt_word = stem_AQ(word)
-                if alt_word in adj_dict or word in c_adj_dict:
-                    text[i][1] = "AQ"
+                alt_word = self.stem_AQ(word)
+                if alt_word in self.adj_dict or word in self.c_adj_dict:
+                    self.text.set_tag(i, "AQ")
                 else:
-                    alt_word = stem_adv_to_adj(word)
-                    if alt_word in adj_dict:
-                        text[i][1] == "RG"
-
-def fix_all_caps():
-    if language == "English":
-        fix_all_caps_English()
-    elif language == "Spanish":
-        fix_all_caps_Spanish()
-
-
-def apply_weights (word_SO, index):
-### this is the last step in the calculation, external weights and negation
-### weights are applied
-    if use_heavy_negation and word_SO < 0: # weighing of negative SO
-        word_SO *= neg_multiplier          # items
-        if output_calculations:
-            richout.write(" X " + str(neg_multiplier) + " (NEGATIVE)")
-    word_SO *= weights[index] # apply weights
-    if weights[index] != 1:
-        if output_calculations:
-            richout.write (" X " + str(weights[index]) + " (WEIGHTED)")
-    if output_calculations:
-        richout.write (" = " + str(word_SO) + "\n")
-    return word_SO
-
-def apply_weights_adv (word_SO, index, output):
-### this is the last step in the calculation, external weights and negation
-### weights are applied
-    if use_heavy_negation and word_SO < 0: # weighing of negative SO
-        word_SO *= neg_multiplier          # items
-        if output_calculations:
-            output += " X " + str(neg_multiplier) + " (NEGATIVE)"
-    word_SO *= weights[index] # apply weights
-    if weights[index] != 1:
-        if output_calculations:
-            output += " X " + str(weights[index]) + " (WEIGHTED)"
-    if output_calculations:
-        output += (" = " + str(word_SO) + "\n")
-    return [word_SO, output]
-
-
-### SO calculators by part of speech
-### All of these sub-calculators do more or less the same thing:
-### Stem the word (if necessary)
-### look for intensifiers
-### look for negation
-### look for negation external intensifiers (e.g. I really didn't like it)
-### apply intensification and negation, if necessary
-### apply other types of modifiers, including those relevant to capitalization,
-### punctuation, blocking, repitition, etc.
-### print the output
-###
-### differences that are particular to certain parts of speech are noted below
-
-def get_noun_SO(index):
-    NN = get_word(text[index])
-    original_NN = NN
-    if NN.isupper():
-        NN = NN.lower() # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        NN = NN.lower() # change the word to lower case if sentence initial
-    ntype = get_tag(text[index])[2:]
-    NN = stem_noun(NN)
-    if NN in c_noun_dict:
-        multiword_result = find_multiword(index, c_noun_dict[NN])
-    else:
-        multiword_result = False
-    if NN not in noun_dict and not multiword_result:
-        return 0
-    else:
-        if multiword_result:
-            (noun_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
+                    alt_word = self.stem_adv_to_adj(word)
+                    if alt_word in self.adj_dict:
+                        self.text.tag(i) == "RG"
+
+    def fix_all_caps(self):
+        if self.language == "English":
+            self.fix_all_caps_English()
+        elif self.language == "Spanish":
+            self.fix_all_caps_Spanish()
+
+
+    def apply_weights (self, word_SO, index):
+    ### this is the last step in the calculation, external weights and negation
+    ### weights are applied
+        if self.use_heavy_negation and word_SO < 0: # weighing of negative SO
+            word_SO *= self.neg_multiplier          # items
+            if self.write_calculations:
+                self.rich_records.append(" X " + str(self.neg_multiplier) + " (NEGATIVE)")
+            if self.token_record:
+                self.token_record[6].append("X " + str(self.neg_multiplier) + " (NEGATIVE)")
+        word_SO *= float(self.weights[index]) # apply weights
+        if self.weights[index] != 1:
+            if self.write_calculations:
+                self.rich_records.append(" X " + self.weight_string(index) + " (WEIGHTED)")
+            if self.token_record:
+                self.token_record[6].append("X " + self.weight_string(index) + " (WEIGHTED)")
+        if self.write_calculations:
+            self.rich_records.append(" = " + str(word_SO) + "\n")
+        return word_SO
+
+    def apply_weights_adv (self, word_SO, index, output):
+    ### this is the last step in the calculation, external weights and negation
+    ### weights are applied
+        if self.use_heavy_negation and word_SO < 0: # weighing of negative SO
+            word_SO *= self.neg_multiplier          # items
+            if self.write_calculations:
+                output += " X " + str(self.neg_multiplier) + " (NEGATIVE)"
+            if self.token_record:
+                self.token_record[6].append("X " + str(self.neg_multiplier) + " (NEGATIVE)")
+        word_SO *= float(self.weights[index]) # apply weights
+        if self.weights[index] != 1:
+            if self.write_calculations:
+                output += " X " + self.weight_string(index) + " (WEIGHTED)"
+            if self.token_record:
+                self.token_record[6].append("X " + self.weight_string(index) + " (WEIGHTED)")
+        if self.write_calculations:
+            output += (" = " + str(word_SO) + "\n")
+        return [word_SO, output]
+
+
+    def keep_token_record(self, lemma, output, base, base_SO, int_modifier, int_modifier_negex, negated):
+    ### keeps the calculation of the word being scored for the JSON output and
+    ### the scored word rows: its
+    ### lemma, the words of the phrase (as in the rich output), the SO from the
+    ### dictionary, the intensifier, whether it was negated, the intensifier of
+    ### the negation (only applied to a negated word) and the modifiers that were
+    ### applied. The record is completed by write_token_record
+        if not negated:
+            int_modifier_negex = 0
+        self.token_record = [lemma, output[:base - 1], base_SO, int_modifier, negated, int_modifier_negex, output[base:]]
+
+    def write_token_record(self, name, index, tag, word_SO):
+    ### adds the JSON record of the word that was just scored to the JSON output
+    ### and/or its row, [index, sentence number, POS, lemma, dictionary SO,
+    ### final SO, weight], to the scored word rows
+        (lemma, words, base_SO, int_modifier, negated, int_modifier_negex, modifiers) = self.token_record
+        self.token_record = None
+        if self.write_json:
+            self.jsonout.write(json.dumps({"record": "token", "file": name, "index": index,
+                                           "sentence": self.get_sentence_no(index), "POS": tag,
+                                           "lemma": lemma, "words": words, "base_SO": base_SO,
+                                           "intensifier": int_modifier, "negated": negated,
+                                           "negation_intensifier": int_modifier_negex,
+                                           "modifiers": modifiers, "final_SO": word_SO}) + "\n")
+        if self.tokenout is not None:
+            self.tokenout.append([index, self.get_sentence_no(index), tag, lemma, base_SO, word_SO, float(self.weights[index])])
+
+    ### SO calculators by part of speech
+    ### All of these sub-calculators do more or less the same thing:
+    ### Stem the word (if necessary)
+    ### look for intensifiers
+    ### look for negation
+    ### look for negation external intensifiers (e.g. I really didn't like it)
+    ### apply intensification and negation, if necessary
+    ### apply other types of modifiers, including those relevant to capitalization,
+    ### punctuation, blocking, repitition, etc.
+    ### print the output
+    ###
+    ### differences that are particular to certain parts of speech are noted below
+
+    def get_noun_SO(self, index):
+        NN = self.text.word(index)
+        original_NN = NN
+        if NN.isupper():
+            NN = NN.lower() # if all upper case, change to lower case
+        if self.word_classes[index - 1] & SENT_PUNCT_CLASS:
+            NN = NN.lower() # change the word to lower case if sentence initial
+        ntype = self.text.tag(index)[2:]
+        (NN, in_dict, in_c_dict) = self.lemmatize(NN, self.text.tag(index))
+        if in_c_dict:
+            multiword_result = self.find_multiword(index, self.c_noun_dict[NN])
         else:
-            int_modifier = 0
-            output = [original_NN]
-            noun_SO = noun_dict[NN]
-            i = index - 1
-        if use_intensifiers:
-            if language == "Spanish": # look for post-nominal adj
-                intensifier = find_intensifier(index +1) # look for post-nominal adj
-                if intensifier:
-                    int_modifier += intensifier[1]
-                    text[index + 1][1] = "MOD"
-                    output += [get_word(text[index+1])]
-            intensifier = find_intensifier(i)
-            if intensifier:
-                int_modifier = intensifier[1]
-                for j in range (0, intensifier[0]):
-                    text[i][1] = "MOD" # block modifier being used twice
-                    i -= 1
-                output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        negation = find_negation(i, noun_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped[adj_tag]:
-                        i -= 1
-                intensifier = find_intensifier(i)
-                if intensifier:
-                    int_modifier_negex = intensifier[1]
-                    for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
-                        i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(noun_SO))
-        if int_modifier != 0:
-            noun_SO = noun_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-        elif use_blocking and find_blocker(noun_SO, index, noun_tag):
-            output.append("X 0 (BLOCKED)")
-            noun_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and noun_SO < 0:
-                neg_shift = abs(noun_SO)
-            elif polarity_switch_neg or (limit_shift and abs(noun_SO) * 2 < noun_neg_shift):
-                neg_shift = abs(noun_SO) * 2
-            else:
-                neg_shift = noun_neg_shift
-            if noun_SO > 0:
-                noun_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif noun_SO < 0:
-                noun_SO += neg_shift
-                output.append ("+ "+ str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                noun_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (noun_SO, new_out) = apply_other_modifiers(noun_SO, index, i)
-        output += new_out
-        if noun_SO != 0:
-            if int_modifier != 0 and int_multiplier != 1:
-                noun_SO *= int_multiplier
-                output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-            if NN not in word_counts[0]:
-                word_counts[0][NN] = 1
-            else:
-                word_counts[0][NN] += 1
-                if negation == -1:
-                    if use_word_counts_lower:
-                        noun_SO /= word_counts[0][NN]
-                        output.append("X 1/" + str(word_counts[0][NN]) + " (REPEATED)")
-                    if use_word_counts_block:
-                        noun_SO = 0
-                        output.append("X 0 (REPEATED)")
-        if noun_multiplier != 1:
-            noun_SO *= noun_multiplier
-            output.append("X " + str(noun_multiplier) + " (NOUN)")
-        if output_calculations:
-            for word in output:
-                richout.write(word + " ")
-        if output_calculations and noun_SO == 0:
-            richout.write("= 0\n")
-        return noun_SO
-
-def get_verb_SO(index):
-### Verbs are special because their adverbal modifiers are not necessarily
-### adjecent to the verb; a special search is done for clause
-### final modifiers
-    VB = get_word(text[index])
-    original_VB = VB
-    if VB.isupper():
-        VB = VB.lower()   # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        VB = VB.lower()  # change the word to lower case if sentence initial
-    if language == "English":
-        vtype = get_tag(text[index])[2:]
-        VB = stem_VB(VB, vtype)
-    if VB in c_verb_dict:
-        multiword_result = find_multiword(index, c_verb_dict[VB])
-    else:
-        multiword_result = False
-    if VB in not_wanted_verb:
-        return 0
-    elif VB not in verb_dict and not multiword_result:
-        return 0
-    else:
-        if multiword_result:
-            (verb_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
+            multiword_result = False
+        if not in_dict and not multiword_result:
+            return 0
         else:
-            int_modifier = 0
-            output = [original_VB]
-            verb_SO = verb_dict[VB]
-            i = index - 1
-        if use_intensifiers:
-            intensifier = find_intensifier(i)
-            if intensifier:
-                int_modifier += intensifier[1]
-                for j in range (0, intensifier[0]):
-                    text[i][1] = "MOD" # block modifier being used twice
-                    i -= 1
-                output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-            if use_clause_final_int: # look for clause-final modifier
-                edge = find_VP_boundary(index)
-                intensifier = find_intensifier(edge - 1)
+            if multiword_result:
+                (noun_SO, backcount, forwardcount, int_modifier) = multiword_result
+                output = self.text.words(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                int_modifier = 0
+                output = [original_NN]
+                noun_SO = self.noun_dict[NN]
+                i = index - 1
+            if self.use_intensifiers:
+                if self.language == "Spanish": # look for post-nominal adj
+                    intensifier = self.find_intensifier(index +1) # look for post-nominal adj
+                    if intensifier:
+                        int_modifier += intensifier[1]
+                        self.text.set_tag(index + 1, "MOD")
+                        output += [self.text.word(index+1)]
+                intensifier = self.find_intensifier(i)
                 if intensifier:
                     int_modifier = intensifier[1]
                     for j in range (0, intensifier[0]):
-                        text[edge - 1 - j][1] = "MOD"
-                    output = output + list(map(get_word, text[index + 1: edge]))
-        negation = find_negation(i, verb_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped["JJ"]:
-                        i -= 1
-                intensifier = find_intensifier(i)
-                if intensifier:
-                    int_modifier_negex = intensifier[1]
-                    for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
+                        self.text.set_tag(i, "MOD") # block modifier being used twice
                         i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(verb_SO))
-        if int_modifier != 0:
-            verb_SO = verb_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-        elif use_blocking and find_blocker(verb_SO, index, verb_tag):
-            output.append("X 0 (BLOCKED)")
-            verb_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and verb_SO < 0:
-                neg_shift = abs(verb_SO)
-            elif polarity_switch_neg or (limit_shift and abs(verb_SO) * 2 < verb_neg_shift):
-                neg_shift = abs(verb_SO) * 2
-            else:
-                neg_shift = verb_neg_shift
-            if verb_SO > 0:
-                verb_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif verb_SO < 0:
-                verb_SO += neg_shift
-                output.append("+ " + str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                verb_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (verb_SO, new_out) = apply_other_modifiers(verb_SO, index, i)
-        output += new_out
-        if verb_SO != 0:
-            if int_modifier != 0 and int_multiplier != 1:
-                verb_SO *= int_multiplier
-                output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-            if VB not in word_counts[1]:
-                word_counts[1][VB] = 1
-            else:
-                word_counts[1][VB] += 1
-                if negation == -1:
-                    if use_word_counts_lower:
-                        verb_SO /= word_counts[1][VB]
-                        output.append("X 1/" + str(word_counts[1][VB]) + " (REPEATED)")
-                    if use_word_counts_block:
-                        verb_SO = 0
-                        output.append("X 0 (REPEATED)")
-        if verb_multiplier != 1:
-            verb_SO *= verb_multiplier
-            output.append("X " + str(verb_multiplier) + " (VERB)")
-        if output_calculations:
-            for word in output:
-                richout.write(word + " ")
-        if output_calculations and verb_SO == 0:
-            richout.write("= 0\n") # calculation is over
-        return verb_SO
-
-def get_adj_SO(index):
-### Comparative and superlative adjectives require special stemming, and are
-### treated as if they have been intensified with "more" or "most". Non-
-### predicative uses of this kind of adjective are often not intended to
-### express sentiment, and are therefore ignored. Adjectives often have
-### more than one intensifier (e.g. really very good) so the search for
-### intensifiers is iterative.
-    JJ = get_word(text[index])
-    original_JJ = JJ
-    int_modifier = 0
-    if JJ.isupper():
-        JJ = JJ.lower()      # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        JJ = JJ.lower()    # change the word to lower case if sentence initial
-    if language == "English":
-        adjtype = get_tag(text[index])[2:]
-        if not use_comparatives and (adjtype == "R" or get_word(text[index -1]) in comparatives):
-            return 0
-        if not use_superlatives and (adjtype == "S" or get_word(text[index-1]) in superlatives or JJ in ["best","worst"]):
-            return 0
-        if adjtype == "R" and JJ not in adj_dict and JJ not in not_wanted_adj:
-            JJ = stem_comp_JJ(JJ)
-            if use_intensifiers:
-                int_modifier += int_dict["more"]
-        elif adjtype == "S" and JJ not in adj_dict and JJ not in not_wanted_adj:
-            JJ = stem_super_adj(JJ)
-            if use_intensifiers:
-                int_modifier += 1
-    elif language == "Spanish":
-        JJ = stem_AQ(JJ)
-        if not use_comparatives and (get_word(text[index -1]) in comparatives):
+                    output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            int_modifier_negex = 0 # an intensifier outside the negation
+            negation = self.find_negation(i, self.noun_tag)
+            if negation != -1:
+                output = self.text.words(negation, i+1) + output
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.text.word(i) in self.skipped[self.adj_tag]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.text.set_tag(i, "MOD") # block modifier being used twice
+                            i -= 1
+                        output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            output.append(str(noun_SO))
+            (base, base_SO) = (len(output), noun_SO) # the modifiers follow
+            if int_modifier != 0:
+                noun_SO = noun_SO *(1+int_modifier)
+                output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
+            elif self.use_blocking and self.find_blocker(noun_SO, index, self.noun_tag):
+                output.append("X 0 (BLOCKED)")
+                noun_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and noun_SO < 0:
+                    neg_shift = abs(noun_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(noun_SO) * 2 < self.noun_neg_shift):
+                    neg_shift = abs(noun_SO) * 2
+                else:
+                    neg_shift = self.noun_neg_shift
+                if noun_SO > 0:
+                    noun_SO -= neg_shift
+                    output.append ("- "+ str(neg_shift))
+                elif noun_SO < 0:
+                    noun_SO += neg_shift
+                    output.append ("+ "+ str(neg_shift))
+                output.append("(NEGATED)")
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    noun_SO *=(1+int_modifier_negex)
+                    output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
+            (noun_SO, new_out) = self.apply_other_modifiers(noun_SO, index, i)
+            output += new_out
+            if noun_SO != 0:
+                if int_modifier != 0 and self.int_multiplier != 1:
+                    noun_SO *= self.int_multiplier
+                    output.append("X " + str(self.int_multiplier) + " (INT_WEIGHT)")
+                if NN not in self.word_counts[0]:
+                    self.word_counts[0][NN] = 1
+                else:
+                    self.word_counts[0][NN] += 1
+                    if negation == -1:
+                        if self.use_word_counts_lower:
+                            noun_SO /= self.word_counts[0][NN]
+                            output.append("X 1/" + str(self.word_counts[0][NN]) + " (REPEATED)")
+                        if self.use_word_counts_block:
+                            noun_SO = 0
+                            output.append("X 0 (REPEATED)")
+            if self.noun_multiplier != 1:
+                noun_SO *= self.noun_multiplier
+                output.append("X " + str(self.noun_multiplier) + " (NOUN)")
+            if self.record_tokens:
+                self.keep_token_record(NN, output, base, base_SO, int_modifier, int_modifier_negex, self.use_negation and negation != -1)
+            if self.write_calculations:
+                self.rich_records.append(" ".join(output) + " ")
+            if self.write_calculations and noun_SO == 0:
+                self.rich_records.append("= 0\n")
+            return noun_SO
+
+    def get_verb_SO(self, index):
+    ### Verbs are special because their adverbal modifiers are not necessarily
+    ### adjecent to the verb; a special search is done for clause
+    ### final modifiers
+        VB = self.text.word(index)
+        original_VB = VB
+        if VB.isupper():
+            VB = VB.lower()   # if all upper case, change to lower case
+        if self.word_classes[index - 1] & SENT_PUNCT_CLASS:
+            VB = VB.lower()  # change the word to lower case if sentence initial
+        (VB, in_dict, in_c_dict) = self.lemmatize(VB, self.text.tag(index))
+        if in_c_dict:
+            multiword_result = self.find_multiword(index, self.c_verb_dict[VB])
+        else:
+            multiword_result = False
+        if VB in self.not_wanted_verb:
             return 0
-        if not use_superlatives and ((get_word(text[index-1]) in comparatives and get_tag(text[index-2]) == "DA")or (AQ in ["mejor","p"+chr(233) + "simo"] and get_tag(text[index-2]) == "DA")):
+        elif not in_dict and not multiword_result:
             return 0
-        if JJ not in adj_dict and JJ not in not_wanted_adj:
-            new_JJ = stem_super_adj(JJ)
-            if use_intensifiers and use_superlatives and new_JJ != JJ:
-                JJ = new_JJ
-                int_modifier += 1
-    if JJ in c_adj_dict:
-        multiword_result = find_multiword(index, c_adj_dict[JJ])
-    else:
-        multiword_result = False
-    if JJ in not_wanted_adj:
-        return 0
-    elif language == "English" and ((adjtype == "S" or get_word(text[index-1]) in superlatives) and (not words_within_num(index, definites, 2) or not is_in_predicate(index)) or ((adjtype == "R" or get_word(text[index -1]) in comparatives) and not is_in_predicate(index))):
-        return 0        # superlatives must be preceded by a definite and be in the predicate         # comparatives must be in the predicate
-    elif JJ not in adj_dict and not multiword_result:
-        return 0
-    else:
-        if multiword_result:
-            (adj_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
         else:
-            output = [original_JJ]
-            adj_SO = adj_dict[JJ]
-            i = index - 1
-        if (language == "English" and get_tag(text[i]) == "DET" or get_word(text[i]) == "as") or (language == "Spanish" and get_tag(text[i]) == "DA" or get_tag(text[i]) == "DI" or get_word(text[i]) == "tan"): # look past determiners and "as" for intensification
-            i -= 1
-        if use_intensifiers:
-            intensifier = 1
-            while intensifier: # keep looking for instensifiers until no more
-                intensifier = find_intensifier(i)           # are found
+            if multiword_result:
+                (verb_SO, backcount, forwardcount, int_modifier) = multiword_result
+                output = self.text.words(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                int_modifier = 0
+                output = [original_VB]
+                verb_SO = self.verb_dict[VB]
+                i = index - 1
+            if self.use_intensifiers:
+                intensifier = self.find_intensifier(i)
                 if intensifier:
                     int_modifier += intensifier[1]
                     for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
-                        i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        negation = find_negation(i, adj_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped["JJ"]:
-                        i -= 1
-                intensifier = find_intensifier(i)
-                if intensifier:
-                    int_modifier_negex = intensifier[1]
-                    for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
+                        self.text.set_tag(i, "MOD") # block modifier being used twice
                         i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(adj_SO))
-        if int_modifier != 0:
-            adj_SO = adj_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-            if ((language == "English" and adjtype == "R") or get_word(text[index -1]) in comparatives):
-                output.append("(COMPARATIVE)")
-            if (language == "English" and (adjtype == "S" or get_word(text[index-1]) in superlatives)):
-                output.append("(SUPERLATIVE)")
-            elif (language == "Spanish" and (get_word(text[index-1]) in comparatives and get_tag(text[index-2]) == "DA")or (JJ in ["mejor","p"+chr(233) + "simo"] and get_tag(text[index-2]) == "DA")):
-                output.append("(SUPERLATIVE)")
-        elif use_blocking and find_blocker(adj_SO, index, adj_tag):
-            output.append("X 0 (BLOCKED)")
-            adj_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and adj_SO < 0:
-                neg_shift = abs(adj_SO)
-            elif polarity_switch_neg or (limit_shift and abs(adj_SO) * 2 < adj_neg_shift):
-                neg_shift = abs(adj_SO) * 2
+                    output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+                if self.use_clause_final_int: # look for clause-final modifier
+                    edge = self.find_VP_boundary(index)
+                    intensifier = self.find_intensifier(edge - 1)
+                    if intensifier:
+                        int_modifier = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.text.set_tag(edge - 1 - j, "MOD")
+                        output = output + self.text.words(index + 1, edge)
+            int_modifier_negex = 0 # an intensifier outside the negation
+            negation = self.find_negation(i, self.verb_tag)
+            if negation != -1:
+                output = self.text.words(negation, i+1) + output
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.text.word(i) in self.skipped["JJ"]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.text.set_tag(i, "MOD") # block modifier being used twice
+                            i -= 1
+                        output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            output.append(str(verb_SO))
+            (base, base_SO) = (len(output), verb_SO) # the modifiers follow
+            if int_modifier != 0:
+                verb_SO = verb_SO *(1+int_modifier)
+                output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
+            elif self.use_blocking and self.find_blocker(verb_SO, index, self.verb_tag):
+                output.append("X 0 (BLOCKED)")
+                verb_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and verb_SO < 0:
+                    neg_shift = abs(verb_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(verb_SO) * 2 < self.verb_neg_shift):
+                    neg_shift = abs(verb_SO) * 2
+                else:
+                    neg_shift = self.verb_neg_shift
+                if verb_SO > 0:
+                    verb_SO -= neg_shift
+                    output.append ("- "+ str(neg_shift))
+                elif verb_SO < 0:
+                    verb_SO += neg_shift
+                    output.append("+ " + str(neg_shift))
+                output.append("(NEGATED)")
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    verb_SO *=(1+int_modifier_negex)
+                    output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
+            (verb_SO, new_out) = self.apply_other_modifiers(verb_SO, index, i)
+            output += new_out
+            if verb_SO != 0:
+                if int_modifier != 0 and self.int_multiplier != 1:
+                    verb_SO *= self.int_multiplier
+                    output.append("X " + str(self.int_multiplier) + " (INT_WEIGHT)")
+                if VB not in self.word_counts[1]:
+                    self.word_counts[1][VB] = 1
+                else:
+                    self.word_counts[1][VB] += 1
+                    if negation == -1:
+                        if self.use_word_counts_lower:
+                            verb_SO /= self.word_counts[1][VB]
+                            output.append("X 1/" + str(self.word_counts[1][VB]) + " (REPEATED)")
+                        if self.use_word_counts_block:
+                            verb_SO = 0
+                            output.append("X 0 (REPEATED)")
+            if self.verb_multiplier != 1:
+                verb_SO *= self.verb_multiplier
+                output.append("X " + str(self.verb_multiplier) + " (VERB)")
+            if self.record_tokens:
+                self.keep_token_record(VB, output, base, base_SO, int_modifier, int_modifier_negex, self.use_negation and negation != -1)
+            if self.write_calculations:
+                self.rich_records.append(" ".join(output) + " ")
+            if self.write_calculations and verb_SO == 0:
+                self.rich_records.append("= 0\n") # calculation is over
+            return verb_SO
+
+    def get_adj_SO(self, index):
+    ### Comparative and superlative adjectives require special stemming, and are
+    ### treated as if they have been intensified with "more" or "most". Non-
+    ### predicative uses of this kind of adjective are often not intended to
+    ### express sentiment, and are therefore ignored. Adjectives often have
+    ### more than one intensifier (e.g. really very good) so the search for
+    ### intensifiers is iterative.
+        JJ = self.text.word(index)
+        original_JJ = JJ
+        int_modifier = 0
+        if JJ.isupper():
+            JJ = JJ.lower()      # if all upper case, change to lower case
+        if self.word_classes[index - 1] & SENT_PUNCT_CLASS:
+            JJ = JJ.lower()    # change the word to lower case if sentence initial
+        if self.language == "English":
+            adjtype = self.text.tag(index)[2:]
+            if not self.use_comparatives and (adjtype == "R" or self.text.word(index -1) in self.comparatives):
+                return 0
+            if not self.use_superlatives and (adjtype == "S" or self.text.word(index-1) in self.superlatives or JJ in ["best","worst"]):
+                return 0
+            if adjtype == "R" and JJ not in self.adj_dict and JJ not in self.not_wanted_adj:
+                if self.use_intensifiers: # stemmed by lemmatize
+                    int_modifier += self.int_dict["more"]
+            elif adjtype == "S" and JJ not in self.adj_dict and JJ not in self.not_wanted_adj:
+                if self.use_intensifiers:
+                    int_modifier += 1
+            (JJ, in_dict, in_c_dict) = self.lemmatize(JJ, self.text.tag(index))
+        elif self.language == "Spanish":
+            (JJ, in_dict, in_c_dict) = self.lemmatize(JJ, self.text.tag(index))
+            if not self.use_comparatives and (self.text.word(index -1) in self.comparatives):
+                return 0
+            if not self.use_superlatives and ((self.text.word(index-1) in self.comparatives and self.text.tag(index-2) == "DA")or (AQ in ["mejor","p"+chr(233) + "simo"] and self.text.tag(index-2) == "DA")):
+                return 0
+            if JJ not in self.adj_dict and JJ not in self.not_wanted_adj:
+                new_JJ = self.stem_super_adj(JJ)
+                if self.use_intensifiers and self.use_superlatives and new_JJ != JJ:
+                    JJ = new_JJ
+                    int_modifier += 1
+                    (in_dict, in_c_dict) = (JJ in self.adj_dict, JJ in self.c_adj_dict)
+        if in_c_dict:
+            multiword_result = self.find_multiword(index, self.c_adj_dict[JJ])
+        else:
+            multiword_result = False
+        if JJ in self.not_wanted_adj:
+            return 0
+        elif self.language == "English" and ((adjtype == "S" or self.text.word(index-1) in self.superlatives) and (not self.words_within_num(index, self.definites, 2) or not self.is_in_predicate(index)) or ((adjtype == "R" or self.text.word(index -1) in self.comparatives) and not self.is_in_predicate(index))):
+            return 0        # superlatives must be preceded by a definite and be in the predicate         # comparatives must be in the predicate
+        elif not in_dict and not multiword_result:
+            return 0
+        else:
+            if multiword_result:
+                (adj_SO, backcount, forwardcount, int_modifier) = multiword_result
+                output = self.text.words(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                output = [original_JJ]
+                adj_SO = self.adj_dict[JJ]
+                i = index - 1
+            if (self.language == "English" and self.text.tag(i) == "DET" or self.text.word(i) == "as") or (self.language == "Spanish" and self.text.tag(i) == "DA" or self.text.tag(i) == "DI" or self.text.word(i) == "tan"): # look past determiners and "as" for intensification
+                i -= 1
+            if self.use_intensifiers:
+                intensifier = 1
+                while intensifier: # keep looking for instensifiers until no more
+                    intensifier = self.find_intensifier(i)           # are found
+                    if intensifier:
+                        int_modifier += intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.text.set_tag(i, "MOD") # block modifier being used twice
+                            i -= 1
+                        output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            int_modifier_negex = 0 # an intensifier outside the negation
+            negation = self.find_negation(i, self.adj_tag)
+            if negation != -1:
+                output = self.text.words(negation, i+1) + output
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.text.word(i) in self.skipped["JJ"]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.text.set_tag(i, "MOD") # block modifier being used twice
+                            i -= 1
+                        output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            output.append(str(adj_SO))
+            (base, base_SO) = (len(output), adj_SO) # the modifiers follow
+            if int_modifier != 0:
+                adj_SO = adj_SO *(1+int_modifier)
+                output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
+                if ((self.language == "English" and adjtype == "R") or self.text.word(index -1) in self.comparatives):
+                    output.append("(COMPARATIVE)")
+                if (self.language == "English" and (adjtype == "S" or self.text.word(index-1) in self.superlatives)):
+                    output.append("(SUPERLATIVE)")
+                elif (self.language == "Spanish" and (self.text.word(index-1) in self.comparatives and self.text.tag(index-2) == "DA")or (JJ in ["mejor","p"+chr(233) + "simo"] and self.text.tag(index-2) == "DA")):
+                    output.append("(SUPERLATIVE)")
+            elif self.use_blocking and self.find_blocker(adj_SO, index, self.adj_tag):
+                output.append("X 0 (BLOCKED)")
+                adj_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and adj_SO < 0:
+                    neg_shift = abs(adj_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(adj_SO) * 2 < self.adj_neg_shift):
+                    neg_shift = abs(adj_SO) * 2
+                else:
+                    neg_shift = self.adj_neg_shift
+                if adj_SO > 0:
+                    adj_SO -= neg_shift
+                    output.append ("- "+ str(neg_shift))
+                elif adj_SO < 0:
+                    adj_SO += neg_shift
+                    output.append ("+ "+ str(neg_shift))
+                output.append("(NEGATED)")
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    adj_SO *=(1+int_modifier_negex)
+                    output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
+            (adj_SO, new_out) = self.apply_other_modifiers(adj_SO, index, i)
+            output += new_out
+            if int_modifier != 0 and self.int_multiplier != 1:
+                adj_SO *= self.int_multiplier
+                output.append("X " + str(self.int_multiplier) + " (INT_WEIGHT)")
+            if JJ not in self.word_counts[2]:
+                self.word_counts[2][JJ] = 1
             else:
-                neg_shift = adj_neg_shift
-            if adj_SO > 0:
-                adj_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif adj_SO < 0:
-                adj_SO += neg_shift
-                output.append ("+ "+ str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                adj_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (adj_SO, new_out) = apply_other_modifiers(adj_SO, index, i)
-        output += new_out
-        if int_modifier != 0 and int_multiplier != 1:
-            adj_SO *= int_multiplier
-            output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-        if JJ not in word_counts[2]:
-            word_counts[2][JJ] = 1
+                self.word_counts[2][JJ] += 1
+                if negation == -1:
+                    if self.use_word_counts_lower:
+                        adj_SO /= self.word_counts[2][JJ]
+                        output.append("X 1/" + str(self.word_counts[2][JJ]) + " (REPEATED)")
+                    if self.use_word_counts_block:
+                        adj_SO = 0
+                        output.append("X 0 (REPEATED)")
+            if self.adj_multiplier != 1:
+                adj_SO *= self.adj_multiplier
+                output.append("X " + str(self.adj_multiplier) + " (ADJECTIVE)")
+            if self.record_tokens:
+                self.keep_token_record(JJ, output, base, base_SO, int_modifier, int_modifier_negex, self.use_negation and negation != -1)
+            if self.write_calculations:
+                self.rich_records.append(" ".join(output) + " ")
+            if self.write_calculations and adj_SO == 0:
+                self.rich_records.append("= 0\n") # calculation is over
+            return adj_SO
+
+    def get_adv_SO(self, index):
+    ### There are two special things to note about dealing with adverbs: one is that
+    ### their SO value can be derived automatically from the lemma in the
+    ### adjective dictionary. The other is the special handling of "too", which
+    ### is counted only when it does not appear next to punctuation (which rules out
+    ### most cases of "too" in the sense of "also")
+        RB = self.text.word(index)
+        original_RB = RB
+        if RB.isupper():
+            RB = RB.lower()   # if all upper case, change to lower case
+        if self.word_classes[index - 1] & SENT_PUNCT_CLASS:
+            RB = RB.lower() # change the word to lower case if sentence initial
+        if self.adv_learning and RB not in self.adv_dict and RB not in self.not_wanted_adv:
+            (JJ, in_adj_dict, in_c_adj_dict) = self.lemmatize(RB, self.text.tag(index)) # stem the adverb to its corresponding adj
+            if in_adj_dict:
+                self.adv_dict[RB] = self.adj_dict[JJ] # take its SO value
+                self.new_adv_dict[RB] = self.adj_dict[JJ]
+        if RB in self.c_adv_dict:
+            multiword_result = self.find_multiword(index, self.c_adv_dict[RB])
         else:
-            word_counts[2][JJ] += 1
-            if negation == -1:
-                if use_word_counts_lower:
-                    adj_SO /= word_counts[2][JJ]
-                    output.append("X 1/" + str(word_counts[2][JJ]) + " (REPEATED)")
-                if use_word_counts_block:
-                    adj_SO = 0
-                    output.append("X 0 (REPEATED)")
-        if adj_multiplier != 1:
-            adj_SO *= adj_multiplier
-            output.append("X " + str(adj_multiplier) + " (ADJECTIVE)")
-        if output_calculations:
-            for word in output:
-                richout.write(word + " ")
-        if output_calculations and adj_SO == 0:
-            richout.write("= 0\n") # calculation is over
-        return adj_SO
-
-def get_adv_SO(index):
-### There are two special things to note about dealing with adverbs: one is that
-### their SO value can be derived automatically from the lemma in the
-### adjective dictionary. The other is the special handling of "too", which
-### is counted only when it does not appear next to punctuation (which rules out
-### most cases of "too" in the sense of "also")
-    RB = get_word(text[index])
-    original_RB = RB
-    if RB.isupper():
-        RB = RB.lower()   # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        RB = RB.lower() # change the word to lower case if sentence initial
-    if adv_learning and RB not in adv_dict and RB not in not_wanted_adv:
-        JJ = stem_adv_to_adj(RB) # stem the adverb to its corresponding adj
-        if JJ in adj_dict:
-            adv_dict[RB] = adj_dict[JJ] # take its SO value
-            new_adv_dict[RB] = adj_dict[JJ]
-    if RB in c_adv_dict:
-        multiword_result = find_multiword(index, c_adv_dict[RB])
-    else:
-        multiword_result = False
-    if RB in not_wanted_adv or (language == "English" and (RB == "too" and index < len(text) - 1 and get_word(text[index + 1]) in punct) or (RB == "well" and index < len(text) - 1 and get_word(text[index + 1]) == ",")):
-        return [0,""]                    # do not count too next to punctuation
-    elif RB not in adv_dict and not multiword_result:
-        return [0,""]
-    else:
-        if multiword_result:
-            (adv_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
+            multiword_result = False
+        if RB in self.not_wanted_adv or (self.language == "English" and (RB == "too" and index < len(self.text) - 1 and self.text.word(index + 1) in self.punct) or (RB == "well" and index < len(self.text) - 1 and self.text.word(index + 1) == ",")):
+            return [0,""]                    # do not count too next to punctuation
+        elif RB not in self.adv_dict and not multiword_result:
+            return [0,""]
         else:
-            int_modifier = 0
-            output = [original_RB]
-            adv_SO = adv_dict[RB]
-            i = index - 1
-        if (language == "English" and get_word(text[i]) == "as") or (language == "Spanish" and get_word(text[i]) == "tan"): # look past "as" for intensification
-            i -= 1
-        if use_intensifiers:
-            intensifier = find_intensifier(i)
-            if intensifier:
-                int_modifier += intensifier[1]
-                for j in range (0, intensifier[0]):
-                    text[i][1] = "MOD" # block modifier being used twice
-                    i -= 1
-                output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        negation = find_negation(i, adv_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped["JJ"]:
-                        i -= 1
-                intensifier = find_intensifier(i)
+            if multiword_result:
+                (adv_SO, backcount, forwardcount, int_modifier) = multiword_result
+                output = self.text.words(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                int_modifier = 0
+                output = [original_RB]
+                adv_SO = self.adv_dict[RB]
+                i = index - 1
+            if (self.language == "English" and self.text.word(i) == "as") or (self.language == "Spanish" and self.text.word(i) == "tan"): # look past "as" for intensification
+                i -= 1
+            if self.use_intensifiers:
+                intensifier = self.find_intensifier(i)
                 if intensifier:
-                    int_modifier_negex = intensifier[1]
+                    int_modifier += intensifier[1]
                     for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
+                        self.text.set_tag(i, "MOD") # block modifier being used twice
                         i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(adv_SO))
-        if int_modifier != 0:
-            adv_SO = adv_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-        elif use_blocking and find_blocker(adv_SO, index, adv_tag):
-            output.append("X 0 (BLOCKED)")
-            adv_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and adv_SO < 0:
-                neg_shift = abs(adv_SO)
-            elif polarity_switch_neg or (limit_shift and abs(adv_SO) * 2 < adv_neg_shift):
-                neg_shift = abs(adv_SO) * 2
+                    output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            int_modifier_negex = 0 # an intensifier outside the negation
+            negation = self.find_negation(i, self.adv_tag)
+            if negation != -1:
+                output = self.text.words(negation, i+1) + output
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.text.word(i) in self.skipped["JJ"]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.text.set_tag(i, "MOD") # block modifier being used twice
+                            i -= 1
+                        output = self.text.words(i + 1, i + intensifier[0] + 1) + output
+            output.append(str(adv_SO))
+            (base, base_SO) = (len(output), adv_SO) # the modifiers follow
+            if int_modifier != 0:
+                adv_SO = adv_SO *(1+int_modifier)
+                output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
+            elif self.use_blocking and self.find_blocker(adv_SO, index, self.adv_tag):
+                output.append("X 0 (BLOCKED)")
+                adv_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and adv_SO < 0:
+                    neg_shift = abs(adv_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(adv_SO) * 2 < self.adv_neg_shift):
+                    neg_shift = abs(adv_SO) * 2
+                else:
+                    neg_shift = self.adv_neg_shift
+                if adv_SO > 0:
+                    adv_SO -= neg_shift
+                    output.append ("- "+ str(neg_shift))
+                elif adv_SO < 0:
+                    adv_SO += neg_shift
+                    output.append ("+ "+ str(neg_shift))
+                output.append("(NEGATED)")
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    adv_SO *=(1+int_modifier_negex)
+                    output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
+            (adv_SO, new_out) = self.apply_other_modifiers(adv_SO, index, i)
+            output += new_out
+            if adv_SO != 0:
+                if int_modifier != 0 and self.int_multiplier != 1:
+                    adv_SO *= self.int_multiplier
+                    output.append("X " + str(self.int_multiplier) + " (INT_WEIGHT)")
+                if RB not in self.word_counts[3]:
+                    self.word_counts[3][RB] = 1
+                else:
+                    self.word_counts[3][RB] += 1
+                    if negation == -1:
+                        if self.use_word_counts_lower:
+                            adv_SO /= self.word_counts[3][RB]
+                            output.append("X 1/" + str(self.word_counts[3][RB]) + " (REPEATED)")
+                        if self.use_word_counts_block:
+                            adv_SO = 0
+                            output.append("X 0 (REPEATED)")
+            if self.adv_multiplier != 1:
+                adv_SO *= self.adv_multiplier
+                output.append("X " + str(self.adv_multiplier) + " (ADVERB)")
+            if self.record_tokens:
+                self.keep_token_record(RB, output, base, base_SO, int_modifier, int_modifier_negex, self.use_negation and negation != -1)
+            full_output = ""
+            if self.write_calculations:
+                full_output = " ".join(output) + " "
+            if self.write_calculations and adv_SO == 0:
+                full_output += ("= 0\n") # calucation is over
+            return [adv_SO, full_output]
+
+    def index_parts_of_speech(self):
+    ### one pass over the text collecting the positions of the nouns, verbs,
+    ### adjectives and adverbs, so that each sub-calculator only visits its
+    ### own words. Tags can still change to "MOD" after this, so the passes
+    ### below check the tag again before scoring a word
+        positions = {self.noun_tag: [], self.verb_tag: [], self.adj_tag: [], self.adv_tag: []}
+        for index in range(len(self.text)):
+            tag = self.text.tag(index)[:2]
+            if tag in positions:
+                positions[tag].append(index)
+        return positions
+
+    def calculate_text_SO(self, name):
+    ### Note that there are 4 passes, one for each part of speech, over the
+    ### positions collected by index_parts_of_speech. The
+    ### rationale for interating seperately for each part of speech (and the
+    ### ordering of those iterations) is that adverbs and adjectives which are used
+    ### as intensifiers of nouns, verbs, or adjectives need to be marked so they
+    ### are not counted twice.
+        text_SO = 0 # a sum of the SO value of all the words in the text
+        SO_counter = 0 # a count of the number of SO carrying terms
+
+        by_sentence = self.write_sentences or self.write_json
+        if by_sentence:
+            sentence_SO = {}
+
+        adv_count = len(self.adv_dict) # for determining if there are new adverbs
+
+        if self.write_calculations:
+            self.rich_records.append("######\n---------\n" + name + "\n---------\nText Length: " + str(len(self.text)) + "\n---------\n")
+
+        if self.fix_cap_tags:
+            self.fix_all_caps()
+
+        positions = self.index_parts_of_speech()
+
+        if self.use_nouns:
+            nouns_SO = 0
+            if self.write_calculations:
+                self.rich_records.append("Nouns:\n-----\n")
+            for index in positions[self.noun_tag]:
+                tag = self.text.tag(index)
+                if tag[:2] == self.noun_tag: # unless used as a modifier since
+                    word_SO = self.get_noun_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        nouns_SO += word_SO
+                    if self.token_record:
+                        self.write_token_record(name, index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            noun_count = sum_word_counts(self.word_counts[0])
+            if noun_count > 0:
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: " + str(nouns_SO/noun_count) + "\n-----\n")
+                text_SO += nouns_SO
+                SO_counter += noun_count
             else:
-                neg_shift = adv_neg_shift
-            if adv_SO > 0:
-                adv_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif adv_SO < 0:
-                adv_SO += neg_shift
-                output.append ("+ "+ str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                adv_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (adv_SO, new_out) = apply_other_modifiers(adv_SO, index, i)
-        output += new_out
-        if adv_SO != 0:
-            if int_modifier != 0 and int_multiplier != 1:
-                adv_SO *= int_multiplier
-                output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-            if RB not in word_counts[3]:
-                word_counts[3][RB] = 1
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: 0\n-----\n")
+
+
+        if self.use_verbs:
+            if self.write_calculations:
+                self.rich_records.append("Verbs:\n-----\n")
+            verbs_SO = 0
+            for index in positions[self.verb_tag]:
+                tag = self.text.tag(index)
+                if tag[:2] == self.verb_tag: # unless used as a modifier since
+                    word_SO = self.get_verb_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        verbs_SO += word_SO
+                    if self.token_record:
+                        self.write_token_record(name, index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            verb_count = sum_word_counts(self.word_counts[1])
+            if verb_count > 0:
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: " + str(verbs_SO/verb_count) + "\n-----\n")
+                text_SO += verbs_SO
+                SO_counter += verb_count
             else:
-                word_counts[3][RB] += 1
-                if negation == -1:
-                    if use_word_counts_lower:
-                        adv_SO /= word_counts[3][RB]
-                        output.append("X 1/" + str(word_counts[3][RB]) + " (REPEATED)")
-                    if use_word_counts_block:
-                        adv_SO = 0
-                        output.append("X 0 (REPEATED)")
-        if adv_multiplier != 1:
-            adv_SO *= adv_multiplier
-            output.append("X " + str(adv_multiplier) + " (ADVERB)")
-        full_output = ""
-        if output_calculations:
-            for word in output:
-                full_output += word + " "
-        if output_calculations and adv_SO == 0:
-            full_output += ("= 0\n") # calucation is over
-        return [adv_SO, full_output]
-
-
- ### Main script ###
-
-### Note that there are 4 (or even 5) iterations through the text. The
-### rationale for interating seperately for each part of speech (and the
-### ordering of those iterations) is that adverbs and adjectives which are used
-### as intensifiers of nouns, verbs, or adjectives need to be marked so they
-### are not counted twice.
-
-
-load_dictionaries()
-fill_text_and_weights(infile)
-
-
-if output_sentences:
-    sentence_SO = {}
-
-adv_count = len(adv_dict) # for determining if there are new adverbs
-
-if output_calculations:
-    richout.write("######\n---------\n" + os.path.basename(args.input) + "\n---------\nText Length: " + str(len(text)) + "\n---------\n")
-
-if fix_cap_tags:
-    fix_all_caps()
-
-if use_nouns:
-    nouns_SO = 0
-    if output_calculations:
-        richout.write("Nouns:\n-----\n")
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == noun_tag:
-                word_SO = get_noun_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    nouns_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    noun_count = sum_word_counts(word_counts[0])
-    if noun_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(nouns_SO/noun_count) + "\n-----\n")
-        text_SO += nouns_SO
-        SO_counter += noun_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-
-if use_verbs:
-    if output_calculations:
-        richout.write("Verbs:\n-----\n")
-    verbs_SO = 0
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == verb_tag:
-                word_SO = get_verb_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    verbs_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    verb_count = sum_word_counts(word_counts[1])
-    if verb_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(verbs_SO/verb_count) + "\n-----\n")
-        text_SO += verbs_SO
-        SO_counter += verb_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-if use_adjectives:
-    adjs_SO = 0
-    if output_calculations:
-        richout.write("Adjectives:\n-----\n")
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == adj_tag:
-                word_SO = get_adj_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    adjs_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    adj_count = sum_word_counts(word_counts[2])
-    if adj_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(adjs_SO/adj_count) + "\n-----\n")
-        text_SO += adjs_SO
-        SO_counter += adj_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-adv_outputs = []
-if use_adverbs:
-    advs_SO = 0
-    if output_calculations:
-        richout.write("Adverbs:\n-----\n")
-    for index in range(len(text) - 1, -1, -1): # backwards iteration, since
-        if len(text[index]) == 2:
-            (word, tag) = text[index]             # adverbs modify adverbs
-            if tag[:2] == adv_tag:
-                (word_SO,output) = get_adv_SO(index)
-                if word_SO != 0:
-                    (word_SO,output) = apply_weights_adv(word_SO, index, output)
-                    advs_SO += word_SO
-                    adv_outputs.insert(0,output)
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-        adv_count = sum_word_counts(word_counts[3])
-    for output in adv_outputs:
-        richout.write(output)
-    if adv_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(advs_SO/adv_count) + "\n-----\n")
-        text_SO += advs_SO
-        SO_counter += adv_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: 0\n-----\n")
+
+        if self.use_adjectives:
+            adjs_SO = 0
+            if self.write_calculations:
+                self.rich_records.append("Adjectives:\n-----\n")
+            for index in positions[self.adj_tag]:
+                tag = self.text.tag(index)
+                if tag[:2] == self.adj_tag: # unless used as a modifier since
+                    word_SO = self.get_adj_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        adjs_SO += word_SO
+                    if self.token_record:
+                        self.write_token_record(name, index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            adj_count = sum_word_counts(self.word_counts[2])
+            if adj_count > 0:
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: " + str(adjs_SO/adj_count) + "\n-----\n")
+                text_SO += adjs_SO
+                SO_counter += adj_count
+            else:
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: 0\n-----\n")
+
+        adv_outputs = []
+        if self.use_adverbs:
+            advs_SO = 0
+            if self.write_calculations:
+                self.rich_records.append("Adverbs:\n-----\n")
+            for index in reversed(positions[self.adv_tag]): # backwards iteration, since
+                tag = self.text.tag(index)                  # adverbs modify adverbs
+                if tag[:2] == self.adv_tag: # unless used as a modifier since
+                    (word_SO,output) = self.get_adv_SO(index)
+                    if word_SO != 0:
+                        (word_SO,output) = self.apply_weights_adv(word_SO, index, output)
+                        advs_SO += word_SO
+                        if self.write_calculations:
+                            adv_outputs.append(output)
+                    if self.token_record:
+                        self.write_token_record(name, index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            if self.text:
+                adv_count = sum_word_counts(self.word_counts[3])
+            self.rich_records.extend(reversed(adv_outputs)) # in text order
+            if adv_count > 0:
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: " + str(advs_SO/adv_count) + "\n-----\n")
+                text_SO += advs_SO
+                SO_counter += adv_count
+            else:
+                if self.write_calculations:
+                    self.rich_records.append("-----\nAverage SO: 0\n-----\n")
 
 
-if SO_counter > 0:
-    text_SO = text_SO / SO_counter #calculate the final SO for the text
+        if SO_counter > 0:
+            text_SO = text_SO / SO_counter #calculate the final SO for the text
 
-basicout.write(os.path.basename(args.input) + "\t" + str(text_SO) + "\n")
-if output_sentences:
-    richout.write("-----\nSO by Sentence\n-----\n")
-    for i in range(len(boundaries)):
-        richout.write(get_sentence(boundaries[i] -1) + " ")
-        if i in sentence_SO:
-            richout.write(str(sentence_SO[i]) + "\n")
-        else:
-            richout.write("0\n")
-if output_calculations:
-    richout.write("---------\nTotal SO: " + str(text_SO) + "\n---------\n")
-
-if adv_learning and new_adv_dict: # output the new adverb
-    f = open(adv_dict_path, "a")  # dictionary
-    for adverb in new_adv_dict:
-        f.write(adverb + "\t" + str(int(adv_dict[adverb])) + "\n")
-    f.close()
-
-basicout.close()
-richout.close()
\ No newline at end of file
+        if self.write_sentences:
+            self.rich_records.append("-----\nSO by Sentence\n-----\n")
+            for i in range(len(self.boundaries)):
+                self.rich_records.append(self.get_sentence(self.boundaries[i] -1) + " ")
+                if i in sentence_SO:
+                    self.rich_records.append(str(sentence_SO[i]) + "\n")
+                else:
+                    self.rich_records.append("0\n")
+        if self.write_calculations:
+            self.rich_records.append("---------\nTotal SO: " + str(text_SO) + "\n---------\n")
+        if self.write_json: # the SO of a sentence is only known once every part of speech is scored
+            for i in range(len(self.boundaries)):
+                self.jsonout.write(json.dumps({"record": "sentence", "file": name, "sentence": i,
+                                               "text": self.get_sentence(self.boundaries[i] -1),
+                                               "SO": sentence_SO.get(i, 0)}) + "\n")
+            self.jsonout.write(json.dumps({"record": "text", "file": name, "length": len(self.text),
+                                           "SO": text_SO}) + "\n")
+        if self.rich_records: # one buffered write for the whole text
+            self.richout.write("".join(self.rich_records))
+            self.rich_records = []
+        return text_SO
+
+
+### Scoring many files ###
+
+worker_calculator = None # the calculator inherited by forked worker processes
+worker_corpus = None # the packed corpus inherited by forked worker processes
+
+def score_file_to_outputs(calculator, path, richout, jsonout, token_output, corpus=None):
+### scores one file, or one document of a packed corpus, writing its rich and
+### JSON lines output to richout and jsonout (None to skip them) as it is
+### produced; returns its SO with its scored word rows (None if not wanted)
+    tokenout = [] if token_output else None
+    if corpus is None:
+        text_SO = calculator.score_file(path, richout, jsonout, tokenout)
+    else:
+        text_SO = calculator.score_stream(corpus.open(path), path, richout, jsonout, tokenout)
+    return [text_SO, tokenout]
+
+def score_file_in_worker(task):
+### scores one file in a pool worker with the calculator inherited from the
+### parent, returning its output as strings, since only the parent writes any
+### output
+    (path, rich_output, json_output, token_output) = task
+    richout = io.StringIO() if rich_output else None
+    jsonout = io.StringIO() if json_output else None
+    (text_SO, rows) = score_file_to_outputs(worker_calculator, path, richout, jsonout, token_output, worker_corpus)
+    return [text_SO, richout.getvalue() if rich_output else "", jsonout.getvalue() if json_output else "", rows]
+
+def score_files(calculator, paths, workers=1, richout=None, jsonout=None, token_output=False, corpus=None):
+    '''
+    Score files in order. With more than one worker the files are spread over
+    a pool of forked processes that share the calculator's dictionaries
+    copy-on-write; the results still come back in the order of paths. With
+    one worker the rich and JSON lines output go to their streams as they are
+    produced, with several each file's output is written once it is scored.
+    When adv_learning is on, the files are always scored one after the other
+    in this process: an adverb learned from one file changes the scores of the
+    files after it, which a worker cannot see.
+    :param calculator: a SOCalculator with the dictionaries already loaded
+    :param paths: the preprocessed files to score, or the names of the
+    documents to score when reading from a packed corpus
+    :param workers: the number of processes to use
+    :param richout: the stream for the rich output, None to skip building it
+    :param jsonout: the stream for the JSON lines output, None to skip building it
+    :param token_output: whether to collect the scored word rows of each file
+    :param corpus: the PackedCorpus holding the documents, None to read files
+    :return: a generator of [path, text SO, scored word rows] lists
+    '''
+    global worker_calculator, worker_corpus
+    if workers <= 1 or calculator.adv_learning:
+        for path in paths:
+            yield [path] + score_file_to_outputs(calculator, path, richout, jsonout, token_output, corpus)
+        return
+    worker_calculator = calculator
+    worker_corpus = corpus
+    pool = multiprocessing.get_context("fork").Pool(workers)
+    try:
+        tasks = [(path, richout is not None, jsonout is not None, token_output) for path in paths]
+        for (path, (text_SO, rich, json_lines, rows)) in zip(paths, pool.imap(score_file_in_worker, tasks)):
+            if richout is not None:
+                richout.write(rich)
+            if jsonout is not None:
+                jsonout.write(json_lines)
+            yield [path, text_SO, rows]
+    finally:
+        pool.terminate()
+        pool.join()
+        worker_calculator = None
+        worker_corpus = None
+
+
+### Packed corpus ###
+
+### a packed corpus is the bytes of every preprocessed file, unchanged, one
+### after the other, followed by the index of the documents (their count, then
+### offset, length and UTF-8 name of each) and a trailer with the offset of the
+### index. The file starts and ends with PACKED_CORPUS_MAGIC
+PACKED_CORPUS_MAGIC = b"SOCALPK1"
+PACKED_CORPUS_ENCODING = "ISO-8859-1" # the encoding of the preprocessed files
+
+def pack_corpus(paths, corpus_path):
+    '''
+    Pack preprocessed files into one corpus file that can be read with
+    PackedCorpus. The documents are named after the files.
+    :param paths: the preprocessed files to pack
+    :param corpus_path: the corpus file to write
+    :return: None
+    '''
+    documents = []
+    names = set()
+    with open(corpus_path, "wb") as corpus:
+        corpus.write(PACKED_CORPUS_MAGIC)
+        for path in paths:
+            name = os.path.basename(path)
+            if name in names:
+                raise ValueError("more than one file is named " + name)
+            names.add(name)
+            offset = corpus.tell()
+            with open(path, "rb") as infile:
+                shutil.copyfileobj(infile, corpus)
+            documents.append((name.encode("utf-8"), offset, corpus.tell() - offset))
+        index_offset = corpus.tell()
+        corpus.write(struct.pack("<Q", len(documents)))
+        for (name, offset, length) in documents:
+            corpus.write(struct.pack("<QQI", offset, length, len(name)))
+            corpus.write(name)
+        corpus.write(struct.pack("<Q", index_offset))
+        corpus.write(PACKED_CORPUS_MAGIC)
+
+def is_packed_corpus(path):
+### whether path is a file written by pack_corpus
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as infile:
+        return infile.read(len(PACKED_CORPUS_MAGIC)) == PACKED_CORPUS_MAGIC
+
+class PackedCorpus():
+    '''
+    A corpus written by pack_corpus, accessed through a read-only memory map.
+    Only the index is read when the corpus is opened; the bytes of a document
+    are taken from the map when it is opened, so scoring can start with the
+    first document without reading or decoding the others.
+    '''
+    def __init__(self, path):
+        '''
+        :param path: the corpus file
+        '''
+        self.path = path
+        with open(path, "rb") as corpus:
+            self.map = mmap.mmap(corpus.fileno(), 0, access = mmap.ACCESS_READ)
+        magic_length = len(PACKED_CORPUS_MAGIC)
+        if len(self.map) < 2 * magic_length + 16 or self.map[:magic_length] != PACKED_CORPUS_MAGIC \
+                or self.map[-magic_length:] != PACKED_CORPUS_MAGIC:
+            self.map.close()
+            raise ValueError(path + " is not a packed corpus")
+        (index_offset,) = struct.unpack_from("<Q", self.map, len(self.map) - magic_length - 8)
+        (count,) = struct.unpack_from("<Q", self.map, index_offset)
+        position = index_offset + 8
+        self.names = [] # the document names, in corpus order
+        self.numbers = {} # the position of each document in the corpus
+        self.offsets = array.array("q")
+        self.lengths = array.array("q")
+        for number in range(count):
+            (offset, length, name_length) = struct.unpack_from("<QQI", self.map, position)
+            position += 20
+            name = self.map[position:position + name_length].decode("utf-8")
+            position += name_length
+            self.names.append(name)
+            self.numbers[name] = number
+            self.offsets.append(offset)
+            self.lengths.append(length)
+
+    def __len__(self):
+        return len(self.names)
+
+    def open(self, name, encoding=PACKED_CORPUS_ENCODING):
+        '''
+        Open a document of the corpus, like open() would open the file it was
+        packed from.
+        :param name: the name of the document
+        :param encoding: the encoding the document is read with
+        :return: a text stream of the document
+        '''
+        number = self.numbers[name]
+        offset = self.offsets[number]
+        data = self.map[offset:offset + self.lengths[number]]
+        return io.TextIOWrapper(io.BytesIO(data), encoding = encoding)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+### Columnar export ###
+
+class TokenColumns():
+    '''
+    Collects the scored words of many files in columns and saves them as a
+    NumPy .npz archive, which loads without any parsing. The file names, POS
+    tags and lemmas are dictionary encoded: the "file_id", "POS_id" and
+    "lemma_id" columns hold indexes into the "files", "POS_tags" and "lemmas"
+    arrays.
+    '''
+    def __init__(self):
+        self.vocabularies = collections.OrderedDict() # name -> (strings, string ids)
+        for vocabulary in ["files", "POS_tags", "lemmas"]:
+            self.vocabularies[vocabulary] = ([], {})
+        self.columns = collections.OrderedDict((column, []) for column in
+            ["file_id", "index", "sentence", "POS_id", "lemma_id", "raw_SO", "final_SO", "weight"])
+
+    def encode(self, vocabulary, string):
+        '''
+        Get the id of a string, adding it to the vocabulary if it is new.
+        :param vocabulary: "files", "POS_tags" or "lemmas"
+        :param string: the string to encode
+        :return: the id of the string
+        '''
+        (strings, ids) = self.vocabularies[vocabulary]
+        if string not in ids:
+            ids[string] = len(strings)
+            strings.append(string)
+        return ids[string]
+
+    def add_file(self, name, rows):
+        '''
+        Add the scored words of one file.
+        :param name: the name of the file
+        :param rows: the rows collected by SOCalculator.score_file(tokenout=...)
+        :return: None
+        '''
+        file_id = self.encode("files", name)
+        columns = self.columns
+        for (index, sentence_no, tag, lemma, raw_SO, final_SO, weight) in rows:
+            columns["file_id"].append(file_id)
+            columns["index"].append(index)
+            columns["sentence"].append(sentence_no)
+            columns["POS_id"].append(self.encode("POS_tags", tag))
+            columns["lemma_id"].append(self.encode("lemmas", lemma))
+            columns["raw_SO"].append(raw_SO)
+            columns["final_SO"].append(final_SO)
+            columns["weight"].append(weight)
+
+    def save(self, path):
+        '''
+        Save the columns and the vocabularies as an uncompressed .npz archive.
+        :param path: the archive to write
+        :return: None
+        '''
+        if numpy is None:
+            raise ImportError("the columnar export needs numpy")
+        arrays = {}
+        for column in ["file_id", "index", "sentence", "POS_id", "lemma_id"]:
+            arrays[column] = numpy.array(self.columns[column], dtype=numpy.int32)
+        for column in ["raw_SO", "final_SO", "weight"]:
+            arrays[column] = numpy.array(self.columns[column], dtype=numpy.float64)
+        for vocabulary in self.vocabularies:
+            arrays[vocabulary] = numpy.array(self.vocabularies[vocabulary][0], dtype=str)
+        with open(path, "wb") as outfile:
+            numpy.savez(outfile, **arrays)
+
+
+def main():
+    args = get_command_arguments()
+    calculator = SOCalculator(args.config)
+    basicout = open(args.basicout_path, "a")
+    richout = open(args.richout_path, "a")
+    jsonout = open(args.jsonout_path, "a", encoding = "utf-8") if args.jsonout_path else None
+    text_SO = calculator.score_file(args.input, richout, jsonout)
+    basicout.write(os.path.basename(args.input) + "\t" + str(text_SO) + "\n")
+    calculator.write_learned_adverbs()
+    basicout.close()
+    richout.close()
+    if jsonout:
+        jsonout.close()
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import csv
 from collections import OrderedDict
 import json
 
+from SO_Calc import SOCalculator, TokenColumns, PackedCorpus, is_packed_corpus, pack_corpus, score_files
+
 def get_command_arguments():
     parser = argparse.ArgumentParser(description='SFU Sentiment Calculator')
     parser.add_argument('--input', '-i', type=str, dest='input', action='store',
@@ -21,6 +23,19 @@ def get_command_arguments():
     parser.add_argument('--cutoff', '-cf', type=float, dest='cutoff', action='store',
                         default=0.0,
                         help="The threshold for sentiment distinction")
+    parser.add_argument('--batch', '-b', dest='batch', action='store_true',
+                        help="Load the dictionaries once and score every file in this process")
+    parser.add_argument('--workers', '-w', type=int, dest='workers', action='store',
+                        default=1,
+                        help="The number of processes used to score the files in batch mode "
+                             "(one when adv_learning is on)")
+    parser.add_argument('--columns', '-col', type=str, dest='columns', action='store',
+                        default='',
+                        help="Save the scored words of every file to this NumPy .npz archive (batch mode, needs numpy)")
+    parser.add_argument('--pack', '-pk', type=str, dest='pack', action='store',
+                        default='',
+                        help="Pack the input files into this corpus file and score them from it (batch mode); "
+                             "a packed corpus can be given as the input of later runs")
     args = parser.parse_args()
     return args
 
@@ -29,7 +44,7 @@ def generate_file_sentiment(basicout_path, cutoff, file_sentiment_path):
 
     with open(basicout_path) as basic_output:
         for r in basic_output:
-            file_score = r.strip().split()
+            file_score = r.rstrip("\n").split("\t") # file names may contain spaces
             file = file_score[0]
             score = float(file_score[1])
             if score < cutoff:
@@ -47,6 +62,35 @@ def generate_file_sentiment(basicout_path, cutoff, file_sentiment_path):
         for dct in dct_lst:
             writer.writerow(dct)
 
+def run_batch(file_paths, config_file, dic_folder, basicout_path, workers, columns_path="", corpus=None):
+    '''
+    Score all the files with one SOCalculator instead of starting a new
+    process (and reloading every dictionary) for each file. With several
+    workers the files are scored in parallel, but only this process writes
+    to the basic output, in the order of file_paths.
+    :param file_paths: the preprocessed files to score
+    :param config_file: the configuration file for SO-CAL
+    :param dic_folder: the folder containing all dictionary files
+    :param basicout_path: the basic output, one line per file
+    :param workers: the number of processes used for scoring
+    :param columns_path: the .npz archive for the scored words, "" for none
+    :param corpus: the PackedCorpus holding the files, None to read them from disk
+    :return: None
+    '''
+    calculator = SOCalculator(config_file, dic_folder)
+    columns = TokenColumns() if columns_path else None
+    with open(basicout_path, "a") as basicout:
+        for (file_path, text_SO, rows) in score_files(calculator, file_paths, workers, token_output=bool(columns_path),
+                                                      corpus=corpus):
+            f_name = os.path.basename(file_path)
+            print(f"Processed {f_name}")
+            basicout.write(f_name + "\t" + str(text_SO) + "\n")
+            if columns:
+                columns.add_file(f_name, rows)
+    calculator.write_learned_adverbs()
+    if columns:
+        columns.save(columns_path)
+
 def main():
     args = get_command_arguments()
     input_path = args.input
@@ -68,7 +112,24 @@ def main():
 
     script_path = "/Users/denggeyileao/Library/CloudStorage/OneDrive-UniversitätZürichUZH/SO-CAL/sentiment_calculator.py"
     
-    if os.path.isfile(input_path):
+    if args.batch or args.workers > 1 or args.pack or is_packed_corpus(input_path):
+        corpus = None
+        if is_packed_corpus(input_path):
+            corpus = PackedCorpus(input_path)
+        elif os.path.isfile(input_path):
+            file_paths = [input_path]
+        else:
+            file_paths = [os.path.join(input_path, f_name) for f_name in sorted(os.listdir(input_path))]
+            file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+        if args.pack and corpus is None:
+            pack_corpus(file_paths, args.pack)
+            corpus = PackedCorpus(args.pack)
+        if corpus is not None:
+            file_paths = corpus.names
+        run_batch(file_paths, config_file, dic_folder, basicout_path, args.workers, args.columns, corpus)
+        if corpus is not None:
+            corpus.close()
+    elif os.path.isfile(input_path):
         print(f"Processing {os.path.basename(input_path)}...")
         cmd = f"python3 {script_path} --input \"{input_path}\" --output \"{output_folder}\" --bo \"{basicout_path}\" --c \"{config_file}\" --d \"{dic_folder}\""
         print(f"Running command: {cmd}")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+######## SO-CAL benchmarks #######
+# Times the SO-CAL calculator end to end on the sample BOOKS data, and stage
+# by stage on synthetic documents of growing length, built by repeating the
+# lines of the sample data:
+#
+# dictionaries   loading the dictionaries, from the text files and from the cache
+# read           fill_text_and_weights, i.e. reading, storing and indexing a text
+# nouns, verbs,  calculate_text_SO with only that part of speech enabled, on a
+# adjectives,    freshly read text
+# adverbs
+# output         the extra time taken by a full calculation when the rich and
+#                JSON lines output are written
+# total          score_file with every part of speech, without output
+#
+# Each size is measured in a forked process, so that its peak RSS is its own.
+# The scaling exponent is the slope of log(time) over log(tokens): about 1 for
+# a stage that is linear in the length of the text, 2 for a quadratic one.
+# Results can be saved as JSON and compared with a saved run, so that a slower
+# stage shows up as a number instead of an impression.
+
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+# the engine lives in SO_Calc.py one folder up
+SO_CAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SO_CAL_DIR)
+from SO_Calc import SOCalculator, score_files
+
+PASSES = [("nouns", "use_nouns"), ("verbs", "use_verbs"), ("adjectives", "use_adjectives"), ("adverbs", "use_adverbs")]
+STAGES = ["read"] + [name for (name, _) in PASSES] + ["output", "total"]
+
+def get_command_arguments():
+    '''
+    Read command line input and set values to arguments.
+    :return: a list of arguments
+    '''
+    parser = argparse.ArgumentParser(description='SO-CAL benchmarks')
+    parser.add_argument('--input', '-i', type=str, dest='input', action='store',
+                        default=os.path.join(SO_CAL_DIR, 'Sample/output/Preprocessed_Output/BOOKS'),
+                        help="The folder of SO_CAL preprocessed files scored end to end and used to build the synthetic documents")
+    parser.add_argument('--config', '-c', type=str, dest='config', action='store',
+                        default=os.path.join(SO_CAL_DIR, 'Resources/config_files/en_SO_Calc.ini'),
+                        help="The configuration file for SO-CAL")
+    parser.add_argument('--dic_folder', '-d', type=str, dest='dic_folder', action='store',
+                        default=os.path.join(SO_CAL_DIR, 'Resources/dictionaries/English'),
+                        help="The folder containing all dictionary files")
+    parser.add_argument('--sizes', '-s', type=str, dest='sizes', action='store',
+                        default='1000,10000,100000,1000000',
+                        help="The lengths of the synthetic documents, in tokens, separated by commas")
+    parser.add_argument('--repeat', '-r', type=int, dest='repeat', action='store',
+                        default=3,
+                        help="The number of times each measurement is repeated; the fastest one is kept")
+    parser.add_argument('--save', type=str, dest='save', action='store',
+                        default='',
+                        help="Save the results to this JSON file")
+    parser.add_argument('--compare', type=str, dest='compare', action='store',
+                        default='',
+                        help="Compare the throughput with the results saved in this JSON file")
+    parser.add_argument('--tolerance', type=float, dest='tolerance', action='store',
+                        default=0.2,
+                        help="The fraction of throughput a stage can lose before it counts as a regression")
+    args = parser.parse_args()
+    return args
+
+### Measurements ###
+
+def peak_RSS():
+### the peak resident set size of this process in MB (ru_maxrss is in KB on
+### Linux and in bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def best_time(function, repeat):
+### the fastest of repeat runs of function, which returns its own timing so
+### that any setup it needs is not counted
+    return min(function() for _ in range(repeat))
+
+def read_text(calculator, path):
+    calculator.start_document(None)
+    with open(path, encoding = "ISO-8859-1") as infile:
+        calculator.fill_text_and_weights(infile)
+
+def time_read(calculator, path):
+    start = time.perf_counter()
+    read_text(calculator, path)
+    return time.perf_counter() - start
+
+def time_pass(calculator, path, flag):
+### times the calculation with only the part of speech of flag enabled
+    read_text(calculator, path)
+    enabled = [(other, getattr(calculator, other)) for (_, other) in PASSES]
+    for (_, other) in PASSES:
+        setattr(calculator, other, other == flag)
+    try:
+        start = time.perf_counter()
+        calculator.calculate_text_SO(os.path.basename(path))
+        return time.perf_counter() - start
+    finally:
+        for (other, value) in enabled:
+            setattr(calculator, other, value)
+
+def time_score(calculator, path, output):
+    richout = io.StringIO() if output else None
+    jsonout = io.StringIO() if output else None
+    start = time.perf_counter()
+    calculator.score_file(path, richout, jsonout)
+    return time.perf_counter() - start
+
+def measure_document(calculator, path, repeat):
+    '''
+    Time every stage of scoring one document.
+    :param calculator: a SOCalculator with the dictionaries already loaded
+    :param path: the preprocessed document
+    :param repeat: the number of runs of each stage
+    :return: a dictionary of the time of each stage in seconds, with the number
+    of tokens of the document and the peak RSS of the process in MB
+    '''
+    read_text(calculator, path)
+    result = {"tokens": len(calculator.text)}
+    result["read"] = best_time(lambda: time_read(calculator, path), repeat)
+    for (name, flag) in PASSES:
+        result[name] = best_time(lambda: time_pass(calculator, path, flag), repeat)
+    result["total"] = best_time(lambda: time_score(calculator, path, False), repeat)
+    with_output = best_time(lambda: time_score(calculator, path, True), repeat)
+    result["output"] = max(with_output - result["total"], 0.0)
+    result["peak_RSS"] = peak_RSS()
+    return result
+
+def measure_in_child(task):
+    (path, repeat) = task
+    return measure_document(child_calculator, path, repeat)
+
+child_calculator = None # the calculator inherited by the forked processes
+
+def measure_sizes(calculator, paths, repeat):
+### measures each document in its own forked process, one at a time
+    global child_calculator
+    child_calculator = calculator
+    results = []
+    context = multiprocessing.get_context("fork")
+    for path in paths:
+        pool = context.Pool(1)
+        try:
+            results.append(pool.apply(measure_in_child, ((path, repeat),)))
+        finally:
+            pool.terminate()
+            pool.join()
+    child_calculator = None
+    return results
+
+def time_dictionaries(config, dic_folder, repeat):
+### the time to load the dictionaries from the text files and from the cache;
+### loading with the cache also writes it if it is missing or out of date
+    SOCalculator(config, dic_folder)
+    def load(dictionary_cache):
+        start = time.perf_counter()
+        SOCalculator(config, dic_folder, dictionary_cache)
+        return time.perf_counter() - start
+    return {"parse": best_time(lambda: load(False), repeat), "cache": best_time(lambda: load(True), repeat)}
+
+def time_sample(calculator, paths):
+### scores every sample file once, end to end, with the rich output
+    start = time.perf_counter()
+    tokens = 0
+    for (path, _, _) in score_files(calculator, paths, richout = io.StringIO()):
+        tokens += len(calculator.text)
+    return {"files": len(paths), "tokens": tokens, "seconds": time.perf_counter() - start}
+
+### Synthetic documents ###
+
+def read_lines(paths):
+    lines = []
+    for path in paths:
+        with open(path, encoding = "ISO-8859-1") as infile:
+            lines.extend(line for line in infile if line.strip())
+    return lines
+
+def write_document(lines, tokens, path):
+    '''
+    Write a synthetic document by repeating lines of preprocessed text until
+    it has at least the given number of tokens.
+    :param lines: the lines to repeat
+    :param tokens: the length of the document, in tokens
+    :param path: the file to write
+    :return: None
+    '''
+    if not lines:
+        raise ValueError("there is no text to build the documents from")
+    written = 0
+    with open(path, "w", encoding = "ISO-8859-1") as outfile:
+        while written < tokens:
+            for line in lines:
+                outfile.write(line)
+                written += len(line.split())
+                if written >= tokens:
+                    break
+
+### Report ###
+
+def scaling_exponent(results, stage):
+### least squares slope of log(time) over log(tokens)
+    points = [(math.log(result["tokens"]), math.log(result[stage])) for result in results if result[stage] > 0]
+    if len(points) < 2:
+        return float("nan")
+    mean_x = sum(x for (x, _) in points) / len(points)
+    mean_y = sum(y for (_, y) in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for (x, _) in points)
+    if variance == 0:
+        return float("nan")
+    return sum((x - mean_x) * (y - mean_y) for (x, y) in points) / variance
+
+def throughput(tokens, seconds):
+    if seconds <= 0:
+        return float("inf")
+    return tokens / seconds
+
+def print_report(report):
+    dictionaries = report["dictionaries"]
+    print("Dictionaries: %.3fs from the text files, %.3fs from the cache" % (dictionaries["parse"], dictionaries["cache"]))
+    sample = report["sample"]
+    print("Sample: %d files, %d tokens in %.3fs, %.0f tokens/s" % (sample["files"], sample["tokens"], sample["seconds"],
+                                                                 throughput(sample["tokens"], sample["seconds"])))
+    print("")
+    print("Synthetic documents (tokens/s; peak RSS in MB):")
+    print("%10s" % "size" + "%10s" % "tokens" + "".join("%12s" % stage for stage in STAGES) + "%10s" % "peak RSS")
+    for result in report["sizes"]:
+        row = "%10d" % result["size"] + "%10d" % result["tokens"]
+        for stage in STAGES:
+            row += "%12.0f" % throughput(result["tokens"], result[stage])
+        print(row + "%10.1f" % result["peak_RSS"])
+    print("%20s" % "exponent" + "".join("%12.2f" % report["scaling"][stage] for stage in STAGES))
+
+def compare(report, baseline, tolerance):
+    '''
+    Compare the throughput of every stage with a saved run.
+    :param report: the results of this run
+    :param baseline: the results of the saved run
+    :param tolerance: the fraction of throughput a stage can lose
+    :return: the number of regressions
+    '''
+    regressions = 0
+    baseline_sizes = {result.get("size", result["tokens"]): result for result in baseline["sizes"]}
+    print("")
+    print("Compared with the saved run (this run / saved run throughput):")
+    for result in report["sizes"]:
+        saved = baseline_sizes.get(result["size"])
+        if saved is None:
+            continue
+        row = "%10d" % result["size"]
+        for stage in STAGES:
+            ratio = throughput(result["tokens"], result[stage]) / throughput(saved["tokens"], saved[stage])
+            row += "%11.2f" % ratio + ("!" if ratio < 1 - tolerance else " ")
+            if ratio < 1 - tolerance:
+                regressions += 1
+        print(row)
+    if regressions:
+        print("%d stage(s) lost more than %d%% of their throughput (marked with !)" % (regressions, round(100 * tolerance)))
+    return regressions
+
+def main():
+    args = get_command_arguments()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    sample_paths = [os.path.join(args.input, f_name) for f_name in sorted(os.listdir(args.input))]
+    sample_paths = [path for path in sample_paths if os.path.isfile(path)]
+
+    report = {"dictionaries": time_dictionaries(args.config, args.dic_folder, args.repeat)}
+    calculator = SOCalculator(args.config, args.dic_folder)
+    report["sample"] = time_sample(calculator, sample_paths)
+
+    lines = read_lines(sample_paths)
+    folder = tempfile.mkdtemp(prefix = "so_cal_bench_")
+    try:
+        paths = []
+        for size in sizes:
+            path = os.path.join(folder, "synthetic_%d.txt" % size)
+            write_document(lines, size, path)
+            paths.append(path)
+        report["sizes"] = measure_sizes(calculator, paths, args.repeat)
+        for (size, result) in zip(sizes, report["sizes"]):
+            result["size"] = size # the runs are compared by the size asked for
+    finally:
+        shutil.rmtree(folder)
+    report["scaling"] = {stage: scaling_exponent(report["sizes"], stage) for stage in STAGES}
+
+    print_report(report)
+    if args.save:
+        with open(args.save, "w") as outfile:
+            json.dump(report, outfile, indent = 1)
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,116 @@
 import os
 import argparse
-from pycorenlp import StanfordCoreNLP
+import codecs
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import operator
+import re
+import threading
+import time
 import unidecode
+import requests
 import json
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+class AnnotationReader:
+    """
+    Read a json annotation from the chunks of bytes of a streamed Standford CoreNLP
+    response as they arrive. Values are decoded 1 at a time, and the text that has
+    been read is dropped, so the whole response is never held in memory.
+    """
+    def __init__(self, chunks):
+        """
+        :param chunks: an iterator of the chunks of bytes of the response
+        :return: None
+        """
+        self.chunks = iter(chunks)
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0 # the start of the text not read yet
+
+    def read_more(self):
+        """
+        Add the next chunks of the response to the text not read yet, at least as much
+        text as there is already, so that a value spanning many chunks is decoded again
+        only a few times.
+        :return: False when the response has ended
+        """
+        parts = [self.buffer[self.position:]]
+        wanted = max(len(parts[0]), 1)
+        received = 0
+        for chunk in self.chunks:
+            parts.append(self.text_decoder.decode(chunk))
+            received += len(parts[-1])
+            if received >= wanted:
+                break
+        else:
+            parts.append(self.text_decoder.decode(b'', final=True))
+            received += len(parts[-1])
+        self.buffer = "".join(parts)
+        self.position = 0
+        return received > 0
+
+    def next_char(self):
+        """
+        Skip whitespace and look at the next character, without reading it.
+        :return: the character, "" at the end of the response
+        """
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ""
+
+    def expect(self, chars):
+        """
+        Read the next character, which has to be one of chars.
+        :param chars: the characters allowed
+        :return: the character
+        """
+        char = self.next_char()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of " + chars + " in the JSON response")
+        self.position += 1
+        return char
+
+    def value(self):
+        """
+        Read and decode the next json value.
+        :return: the decoded value
+        """
+        self.next_char()
+        while True:
+            try:
+                (value, end) = self.json_decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if self.read_more(): # the value goes on in the next chunks
+                    continue
+                raise
+            if end == len(self.buffer) and self.read_more(): # a number may go on
+                continue
+            self.position = end
+            return value
+
+    def elements(self, close):
+        """
+        Go through the elements of the object or array that has just been opened.
+        :param close: the character closing it, "}" or "]"
+        :return: a generator that stops after the closing character, each element has
+        to be read before the next one
+        """
+        if self.next_char() == close:
+            self.position += 1
+            return
+        while True:
+            yield
+            if self.expect("," + close) == close:
+                return
+
 class Preprocess:
     def __init__(self, args):
         """
@@ -13,8 +120,9 @@ class Preprocess:
         :param args: Input the defined command line parameters
         :return: None
         """
-        # Start Stanford CoreNLP Server
-        self.nlp = StanfordCoreNLP('http://localhost:9000')
+        # Connect to the Stanford CoreNLP Server, with an HTTP session for each thread
+        self.server_url = args.server_url
+        self.local = threading.local()
 
         # Initialize input, output_folder, standford_annotators, log_path (optional)
         self.input = os.path.expanduser(args.input_path)
@@ -24,6 +132,17 @@ class Preprocess:
             os.makedirs(self.output_folder)
         self.log_path = os.path.expanduser(args.log_path) if args.log_path else None
         self.standford_annotators = args.annotators
+        if 'pos' not in [annotator.strip() for annotator in self.standford_annotators.split(',')]:
+            raise ValueError("The Stanford annotators must include pos, the output is tagged with POS tags")
+        self.chunk_size = args.chunk_size
+        self.threads = args.threads
+        self.in_flight = 2 * args.threads # keeps every thread busy while results are written
+        self.timeout = args.timeout
+        self.retries = args.retries
+        # the annotation cache, None when it is not used
+        self.cache_dir = None if args.no_cache else os.path.expanduser(args.cache_dir)
+        self.cache_size = args.cache_size * 1024 * 1024
+        self.corenlp_version = args.corenlp_version
         
         # Debugging: Print the input path
         print(f"Debug: Checking input path: {self.input}")
@@ -39,44 +158,238 @@ class Preprocess:
         print("Your Output Folder: " + self.output_folder)
         print("Your Stanford annotators: " + self.standford_annotators)
 
+    def session(self):
+        """
+        Get the HTTP session of the current thread, which keeps its connection to the
+        Standford CoreNLP server open between requests. requests does not promise that
+        a session is safe to share between threads, so each thread has its own.
+        :return: a requests.Session
+        """
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
     def str_process(self, row_string):
         """
-        This Standford CoreNLP package requires the text input as 1 single string.
-        The input annotators are in your command line input.
+        Send 1 string to the Standford CoreNLP server. The input annotators are in
+        your command line input. A request that fails with a connection error, a
+        timeout or a server error is sent again, up to retries times. The compact json
+        response is read as it arrives, 1 sentence at a time (see read_sentences).
         :param row_string: The string format input for Standford CoreNLP
-        :return: Json format output
+        :return: a list of "word/TAG word/TAG ..." strings, 1 for each sentence, or None
+        when the text could not be annotated
         """
-        response = self.nlp.annotate(row_string, properties={
-                       'annotators': self.standford_annotators,
-                       'outputFormat': 'json'
-                   })
         try:
-            processed_json = json.loads(response)
-        except json.JSONDecodeError:
+            properties = json.dumps({'annotators': self.standford_annotators, 'outputFormat': 'json',
+                                     'output.prettyPrint': 'false'})
+            for attempt in range(self.retries + 1):
+                try:
+                    response = self.session().post(self.server_url, params={'properties': properties},
+                                                   data=row_string.encode('utf-8'), timeout=self.timeout, stream=True)
+                    if response.status_code < 500:
+                        break
+                    response.close()
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+                if attempt < self.retries:
+                    time.sleep(2 ** attempt) # give a busy server some time
+            response.raise_for_status()
+            with response:
+                rows = self.read_sentences(response.iter_content(chunk_size=65536))
+        except requests.RequestException as error:
+            print("Error annotating text: " + str(error))
+            rows = None
+        except (ValueError, KeyError, TypeError):
             print("Error decoding JSON response")
-            processed_json = None
-        return processed_json
+            rows = None
+        return rows
+
+    def read_sentences(self, chunks):
+        """
+        Read the sentences of a Standford CoreNLP json annotation. Only 1 sentence is
+        decoded at a time, and it is reduced to the "word/TAG" strings of its tokens
+        straight away, so neither the whole response nor the offsets, indexes and
+        whitespace of its tokens are ever kept in memory.
+        :param chunks: an iterator of the chunks of bytes of the response
+        :return: a list of "word/TAG word/TAG ..." strings, 1 for each sentence
+        """
+        reader = AnnotationReader(chunks)
+        rows = []
+        reader.expect("{")
+        for _ in reader.elements("}"):
+            key = reader.value()
+            reader.expect(":")
+            if key == 'sentences':
+                reader.expect("[")
+                for _ in reader.elements("]"):
+                    sentence = reader.value()
+                    rows.append(" ".join([token['originalText'] + "/" + token['pos'] for token in sentence['tokens']]))
+            else:
+                reader.value()
+        return rows
 
-    def output_preprocessed_data(self, json_input, file_name):
+    def output_preprocessed_data(self, tagged_chunks, file_name):
         """
-        Output preprocessed data into a file.
-        :param json_input: json formatted data generated from function str_process
+        Output preprocessed data into a file. The sentences of each chunk are
+        written as soon as it has been annotated, in the order of the chunks.
+        :param tagged_chunks: the tagged sentences of each chunk of the file, generated from function tag_chunk
         :param file_name: output file name
         :return: None
         """
-        if json_input is None:
-            print("No valid JSON input to process")
-            return
-        rows = []
-        for sent in json_input['sentences']:
-            parsed_sent = " ".join([t['originalText'] + "/" + t['pos'] for t in sent['tokens']])
-            rows.append(parsed_sent)
         output_file_path = os.path.join(self.output_folder, file_name)
         if os.path.exists(output_file_path):
             open(output_file_path, 'w').close()
         with open(output_file_path, 'a', encoding='utf-8') as preprocessed_out:
-            for r in rows:
-                preprocessed_out.write(unidecode.unidecode(r) + "\n")
+            for rows in tagged_chunks:
+                if rows is None:
+                    print("No valid JSON input to process")
+                    continue
+                for r in rows:
+                    preprocessed_out.write(unidecode.unidecode(r) + "\n")
+
+    def cache_path(self, chunk):
+        """
+        Find the file of a chunk in the annotation cache. Its name is a hash of the
+        chunk, the annotators and the Standford CoreNLP version, so a changed chunk or
+        setting never reuses an old result.
+        :param chunk: the chunk of text
+        :return: the path of its cache file
+        """
+        key = json.dumps([chunk, self.standford_annotators, self.corenlp_version])
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".txt")
+
+    def tag_chunk(self, chunk):
+        """
+        POS tag 1 chunk of text. Only the tagged sentences are kept, and they are
+        looked up in the annotation cache before the chunk is sent to Standford CoreNLP.
+        :param chunk: the chunk of text
+        :return: a list of "word/TAG word/TAG ..." strings, 1 for each sentence, or None
+        when the chunk could not be annotated
+        """
+        cache_path = self.cache_path(chunk) if self.cache_dir else None
+        if cache_path:
+            try:
+                with open(cache_path, encoding='utf-8') as cached:
+                    rows = cached.read().split("\n")[:-1]
+            except OSError:
+                rows = None # not cached yet
+            if rows is not None:
+                try:
+                    os.utime(cache_path) # recently used files are evicted last
+                except OSError:
+                    pass
+                return rows
+        rows = self.str_process(chunk)
+        if rows is None:
+            return None
+        if cache_path:
+            temp_path = cache_path + "." + str(os.getpid()) + "." + str(threading.get_ident())
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                with open(temp_path, 'w', encoding='utf-8') as cached:
+                    cached.write("".join([r + "\n" for r in rows]))
+                os.replace(temp_path, cache_path) # never leave a half written file
+            except OSError:
+                pass # the cache folder is not writable, work without a cache
+        return rows
+
+    def evict_cache(self):
+        """
+        Delete the least recently used files of the annotation cache until it is no
+        larger than cache_size.
+        :return: None
+        """
+        files = []
+        total = 0
+        for (folder, _, file_names) in os.walk(self.cache_dir):
+            for file_name in file_names:
+                path = os.path.join(folder, file_name)
+                try:
+                    status = os.stat(path)
+                except OSError:
+                    continue
+                files.append((status.st_mtime, status.st_size, path))
+                total += status.st_size
+        files.sort()
+        for (_, size, path) in files:
+            if total <= self.cache_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def read_chunks(self, file_path):
+        """
+        Read a raw text file as strings for Standford CoreNLP of at most chunk_size
+        characters, so that no request or response holds the whole file. Within a
+        chunk the stripped lines are joined with spaces. A chunk ends at the last
+        paragraph boundary (a blank line) that fits, or, within a long paragraph,
+        after the last line ending a sentence, so that sentences are not cut in
+        two; only a long run of lines without either is cut between lines, and
+        only a line longer than chunk_size is cut inside, at a space if it can be.
+        Joined together, the chunks are the joined lines of the file.
+        :param file_path: the raw text file
+        :return: a generator of the text strings, in order
+        """
+        lines = [] # the lines of the current chunk, each with a leading space
+        length = 0 # the length of the current chunk, never more than chunk_size
+        chunk_sent = False # whether a chunk has been sent, an empty file is sent as ""
+        paragraph_end = 0 # the number of lines up to the last paragraph boundary
+        sentence_end = 0 # the number of lines up to the last line ending a sentence
+        with open(file_path, 'rb') as file_input:
+            for r in file_input:
+                line = r.strip().decode('utf-8', 'backslashreplace')
+                piece = " " + line
+                # the current chunk is sent before it grows past chunk_size, so every
+                # cut point is the end of a prefix that fits
+                while lines and length + len(piece) > self.chunk_size:
+                    cut = paragraph_end or sentence_end or len(lines)
+                    yield "".join(lines[:cut])
+                    chunk_sent = True
+                    lines = lines[cut:]
+                    length = sum(len(l) for l in lines)
+                    paragraph_end = max(paragraph_end - cut, 0)
+                    sentence_end = max(sentence_end - cut, 0)
+                # a line longer than a chunk is cut at its last space that fits, or anywhere
+                while len(piece) > self.chunk_size:
+                    cut = piece.rfind(" ", 1, self.chunk_size + 1)
+                    if cut <= 0:
+                        cut = self.chunk_size
+                    yield piece[:cut]
+                    chunk_sent = True
+                    piece = piece[cut:]
+                lines.append(piece)
+                length += len(piece)
+                if not line:
+                    paragraph_end = len(lines)
+                elif line.rstrip('"\')]\u201d\u2019').endswith(('.', '!', '?')):
+                    sentence_end = len(lines)
+        if lines or not chunk_sent:
+            yield "".join(lines)
+
+    def annotate_in_order(self, tasks):
+        """
+        Tag chunks of text on a pool of threads, with at most in_flight chunks
+        sent or waiting to be written at a time, and return the results in the
+        order of the tasks.
+        :param tasks: (file path, chunk) pairs
+        :return: a generator of (file path, tagged sentences) pairs
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+            pending = collections.deque()
+            for (file_path, chunk) in tasks:
+                pending.append((file_path, executor.submit(self.tag_chunk, chunk)))
+                if len(pending) >= self.in_flight:
+                    (done_path, future) = pending.popleft()
+                    yield (done_path, future.result())
+            while pending:
+                (done_path, future) = pending.popleft()
+                yield (done_path, future.result())
 
     def pos_tagging(self):
         """
@@ -85,25 +398,18 @@ class Preprocess:
         :return: None
         """
         if self.input_type == "file":
-            file_name = os.path.basename(self.input)
-            text_string = ""
-            with open(self.input, 'rb') as file_input:
-                for r in file_input:
-                    text_string = " ".join([text_string, r.strip().decode('utf-8', 'backslashreplace')])
-            print(self.input + " Done!")
-            parsed_json = self.str_process(text_string)
-            self.output_preprocessed_data(parsed_json, file_name)
+            file_paths = [self.input]
         elif self.input_type == "dir":
-            for file_name in os.listdir(self.input):
-                input_file_path = os.path.join(self.input, file_name)
-                if os.path.isfile(input_file_path):
-                    text_string = ""
-                    with open(input_file_path, 'rb') as file_input:
-                        for r in file_input:
-                            text_string = " ".join([text_string, r.strip().decode('utf-8', 'backslashreplace')])
-                    print(f"Processing file: {input_file_path}")
-                    parsed_json = self.str_process(text_string)
-                    self.output_preprocessed_data(parsed_json, file_name)
+            file_paths = [os.path.join(self.input, file_name) for file_name in os.listdir(self.input)]
+            file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+        # the chunks of all the files are annotated in parallel, and each file is
+        # written in order as soon as its chunks are done
+        tasks = ((file_path, chunk) for file_path in file_paths for chunk in self.read_chunks(file_path))
+        for (file_path, results) in itertools.groupby(self.annotate_in_order(tasks), key=operator.itemgetter(0)):
+            self.output_preprocessed_data((rows for (_, rows) in results), os.path.basename(file_path))
+            print(file_path + " Done!")
+        if self.cache_dir:
+            self.evict_cache()
 
 def main():
     # Define command line parameters
@@ -126,6 +432,32 @@ def main():
                                  type stanford annotators you want to use,
                                  find annotators here: http://stanfordnlp.github.io/CoreNLP/annotators.html
                                  """)
+    parser.add_argument('--chunk_size', '-cs', type=int, dest='chunk_size', action='store',
+                            default=50000,
+                            help="type the largest number of characters sent to Stanford CoreNLP in 1 request")
+    parser.add_argument('--server', '-s', type=str, dest='server_url', action='store',
+                            default='http://localhost:9000',
+                            help="type the url of your Stanford CoreNLP server")
+    parser.add_argument('--threads', '-t', type=int, dest='threads', action='store',
+                            default=4,
+                            help="type the number of requests sent to Stanford CoreNLP at the same time")
+    parser.add_argument('--timeout', type=float, dest='timeout', action='store',
+                            default=300,
+                            help="type the number of seconds to wait for Stanford CoreNLP to annotate 1 chunk")
+    parser.add_argument('--retries', type=int, dest='retries', action='store',
+                            default=3,
+                            help="type the number of times a failed request is sent again")
+    parser.add_argument('--cache_dir', type=str, dest='cache_dir', action='store',
+                            default='~/.cache/so_cal/corenlp',
+                            help="type the folder of the annotation cache, which keeps the POS tags of every chunk already annotated")
+    parser.add_argument('--cache_size', type=int, dest='cache_size', action='store',
+                            default=1024,
+                            help="type the largest size of the annotation cache in MB, the least recently used chunks are deleted first")
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true',
+                            help="annotate every chunk again, without reading or writing the annotation cache")
+    parser.add_argument('--corenlp_version', type=str, dest='corenlp_version', action='store',
+                            default='',
+                            help="type the version of your Stanford CoreNLP server, chunks annotated by another version are not reused")
     args = parser.parse_args()
 
     p = Preprocess(args)
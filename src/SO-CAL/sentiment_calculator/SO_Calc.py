@@ -1,6 +1,7 @@
 # coding: utf-8
 import operator
 import argparse
+import json
 import os
 
 def get_command_arguments():
@@ -21,6 +22,10 @@ def get_command_arguments():
                         default='',
                         help="The rich output")
 
+    parser.add_argument('--jsonout_path', '-jo', type=str, dest='jsonout_path', action='store',
+                        default='',
+                        help="The JSON lines output, one record per scored word, sentence and text")
+
     parser.add_argument('--config', '-c', type=str, dest='config', action='store',
                         default='../Resources/config_files/en_SO_Calc.ini',
                         help="The configuration file for SO-CAL")
@@ -28,12 +33,16 @@ def get_command_arguments():
     args = parser.parse_args()
     return args
 
-args = get_command_arguments()
-infile = open(args.input, "r", encoding='utf-8')
-configfile = open(args.config, "r", encoding='utf-8')
+### When this script is loaded as a module to score many files in one process
+### (see load_calculator in SO_Run.py), the loader sets args, which then only
+### holds the configuration file, and the outputs basicout, richout and jsonout
 
-basicout = open(args.basicout_path, "a", encoding='utf-8')
-richout = open(args.richout_path, "a", encoding='utf-8')
+if __name__ == "__main__":
+    args = get_command_arguments()
+    basicout = open(args.basicout_path, "a", encoding='utf-8')
+    richout = open(args.richout_path, "a", encoding='utf-8')
+    jsonout = open(args.jsonout_path, "a", encoding='utf-8') if args.jsonout_path else None
+configfile = open(args.config, "r", encoding='utf-8')
 
 config = {}
 
@@ -158,6 +167,8 @@ word_counts = [{}, {}, {}, {}]  # keeps track of number of times each word lemma
 text_SO = 0  # a sum of the SO value of all the words in the text
 SO_counter = 0  # a count of the number of SO carrying terms
 boundaries = []  # the location of newline boundaries from the input
+token_record = []  # the calculation of the word being scored, for the JSON output and tokenout
+tokenout = None  # a list that receives a row for each scored word, set by SO_Run.py for its columns
 
 # Internal Word lists
 if language == "English":
@@ -983,6 +994,32 @@ def apply_weights_adv(word_SO, index, output):
         output += (" = " + str(word_SO) + "\n")
     return [word_SO, output]
 
+def keep_token_record(lemma, output, base, base_SO, int_modifier, int_modifier_negex, negated):
+    ### keeps the calculation of the word being scored for the JSON output: its
+    ### lemma, the words of the phrase (as in the rich output), the SO from the
+    ### dictionary, the intensifier, whether it was negated, the intensifier of
+    ### the negation (only applied to a negated word) and the modifiers that were
+    ### applied. The record is completed by write_token_record
+    if not negated:
+        int_modifier_negex = 0
+    token_record[:] = [lemma, output[:base - 1], base_SO, int_modifier, negated, int_modifier_negex, output[base:]]
+
+def write_token_record(name, index, tag, word_SO):
+    ### adds the JSON record of the word that was just scored to the JSON output
+    ### and/or its row, [index, sentence number, POS, lemma, dictionary SO,
+    ### final SO, weight], to tokenout
+    (lemma, words, base_SO, int_modifier, negated, int_modifier_negex, modifiers) = token_record
+    del token_record[:]
+    if jsonout is not None:
+        jsonout.write(json.dumps({"record": "token", "file": name, "index": index,
+                                  "sentence": get_sentence_no(index), "POS": tag,
+                                  "lemma": lemma, "words": words, "base_SO": base_SO,
+                                  "intensifier": int_modifier, "negated": negated,
+                                  "negation_intensifier": int_modifier_negex,
+                                  "modifiers": modifiers, "final_SO": word_SO}) + "\n")
+    if tokenout is not None:
+        tokenout.append([index, get_sentence_no(index), tag, lemma, base_SO, word_SO, float(weights[index])])
+
 ### SO calculators by part of speech
 ### All of these sub-calculators do more or less the same thing:
 ### Stem the word (if necessary)
@@ -1034,6 +1071,7 @@ def get_noun_SO(index):
                     text[i][1] = "MOD"  # block modifier being used twice
                     i -= 1
                 output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
+        int_modifier_negex = 0  # an intensifier outside the negation
         negation = find_negation(i, noun_tag)
         if negation != -1:
             output = list(map(get_word, text[negation:i + 1])) + output
@@ -1051,6 +1089,7 @@ def get_noun_SO(index):
                         i -= 1
                     output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
         output.append(str(noun_SO))
+        (base, base_SO) = (len(output), noun_SO)  # the modifiers follow
         if int_modifier != 0:
             noun_SO = noun_SO * (1 + int_modifier)
             output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
@@ -1094,6 +1133,8 @@ def get_noun_SO(index):
         if noun_multiplier != 1:
             noun_SO *= noun_multiplier
             output.append("X " + str(noun_multiplier) + " (NOUN)")
+        if jsonout is not None or tokenout is not None:
+            keep_token_record(NN, output, base, base_SO, int_modifier, int_modifier_negex, use_negation and negation != -1)
         if output_calculations:
             for word in output:
                 richout.write(word + " ")
@@ -1145,6 +1186,7 @@ def get_verb_SO(index):
                     for j in range(0, intensifier[0]):
                         text[edge - 1 - j][1] = "MOD"
                     output = output + list(map(get_word, text[index + 1: edge]))
+        int_modifier_negex = 0  # an intensifier outside the negation
         negation = find_negation(i, verb_tag)
         if negation != -1:
             output = list(map(get_word, text[negation:i + 1])) + output
@@ -1162,6 +1204,7 @@ def get_verb_SO(index):
                         i -= 1
                     output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
         output.append(str(verb_SO))
+        (base, base_SO) = (len(output), verb_SO)  # the modifiers follow
         if int_modifier != 0:
             verb_SO = verb_SO * (1 + int_modifier)
             output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
@@ -1205,6 +1248,8 @@ def get_verb_SO(index):
         if verb_multiplier != 1:
             verb_SO *= verb_multiplier
             output.append("X " + str(verb_multiplier) + " (VERB)")
+        if jsonout is not None or tokenout is not None:
+            keep_token_record(VB, output, base, base_SO, int_modifier, int_modifier_negex, use_negation and negation != -1)
         if output_calculations:
             for word in output:
                 richout.write(word + " ")
@@ -1276,6 +1321,7 @@ def get_adj_SO(index):
                         text[i][1] = "MOD"  # block modifier being used twice
                         i -= 1
                     output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
+        int_modifier_negex = 0  # an intensifier outside the negation
         negation = find_negation(i, adj_tag)
         if negation != -1:
             output = list(map(get_word, text[negation:i + 1])) + output
@@ -1293,6 +1339,7 @@ def get_adj_SO(index):
                         i -= 1
                     output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
         output.append(str(adj_SO))
+        (base, base_SO) = (len(output), adj_SO)  # the modifiers follow
         if int_modifier != 0:
             adj_SO = adj_SO * (1 + int_modifier)
             output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
@@ -1341,6 +1388,8 @@ def get_adj_SO(index):
         if adj_multiplier != 1:
             adj_SO *= adj_multiplier
             output.append("X " + str(adj_multiplier) + " (ADJECTIVE)")
+        if jsonout is not None or tokenout is not None:
+            keep_token_record(JJ, output, base, base_SO, int_modifier, int_modifier_negex, use_negation and negation != -1)
         if output_calculations:
             for word in output:
                 richout.write(word + " ")
@@ -1388,6 +1437,7 @@ def get_adv_SO(index):
                     text[i][1] = "MOD"  # block modifier being used twice
                     i -= 1
                 output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
+        int_modifier_negex = 0  # an intensifier outside the negation
         negation = find_negation(i, adv_tag)
         if negation != -1:
             output = list(map(get_word, text[negation:i + 1])) + output
@@ -1405,6 +1455,7 @@ def get_adv_SO(index):
                         i -= 1
                     output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
         output.append(str(adv_SO))
+        (base, base_SO) = (len(output), adv_SO)  # the modifiers follow
         if int_modifier != 0:
             adv_SO = adv_SO * (1 + int_modifier)
             output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
@@ -1448,6 +1499,8 @@ def get_adv_SO(index):
         if adv_multiplier != 1:
             adv_SO *= adv_multiplier
             output.append("X " + str(adv_multiplier) + " (ADVERB)")
+        if jsonout is not None or tokenout is not None:
+            keep_token_record(RB, output, base, base_SO, int_modifier, int_modifier_negex, use_negation and negation != -1)
         full_output = ""
         if output_calculations:
             for word in output:
@@ -1464,156 +1517,217 @@ def get_adv_SO(index):
 ### as intensifiers of nouns, verbs, or adjectives need to be marked so they
 ### are not counted twice.
 
-load_dictionaries()
-fill_text_and_weights(infile)
-
-if output_sentences:
-    sentence_SO = {}
-
-adv_count = len(adv_dict)  # for determining if there are new adverbs
+def score_file(input_path, infile=None):
+    '''
+    Score one preprocessed file, writing its SO to basicout and its
+    calculations to richout and jsonout, and the rows of its scored words to
+    tokenout (when it is a list). The adverbs learned from it are left
+    in new_adv_dict (see write_learned_adverbs and learn_adverbs).
+    :param input_path: the preprocessed file, or its name when infile is given
+    :param infile: the text of the file, when it is not read from input_path
+    :return: None
+    '''
+    del text[:]  # the text and its counts are kept from the last file
+    del weights[:]
+    del boundaries[:]
+    for counts in word_counts:
+        counts.clear()
+    text_SO = 0
+    SO_counter = 0
+    if infile is None:
+        infile = open(input_path, "r", encoding='utf-8')
+    fill_text_and_weights(infile)
+
+    by_sentence = output_sentences or jsonout is not None
+    if by_sentence:
+        sentence_SO = {}
+
+    adv_count = len(adv_dict)  # for determining if there are new adverbs
 
-if output_calculations:
-    richout.write("######\n---------\n" + os.path.basename(args.input) + "\n---------\nText Length: " + str(len(text)) + "\n---------\n")
+    if output_calculations:
+        richout.write("######\n---------\n" + os.path.basename(input_path) + "\n---------\nText Length: " + str(len(text)) + "\n---------\n")
 
-if fix_cap_tags:
-    fix_all_caps()
+    if fix_cap_tags:
+        fix_all_caps()
 
-if use_nouns:
-    nouns_SO = 0
-    if output_calculations:
-        richout.write("Nouns:\n-----\n")
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == noun_tag:
-                word_SO = get_noun_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    nouns_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    noun_count = sum_word_counts(word_counts[0])
-    if noun_count > 0:
+    if use_nouns:
+        nouns_SO = 0
         if output_calculations:
-            richout.write("-----\nAverage SO: " + str(nouns_SO / noun_count) + "\n-----\n")
-        text_SO += nouns_SO
-        SO_counter += noun_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
+            richout.write("Nouns:\n-----\n")
+        for index in range(0, len(text)):
+            if len(text[index]) == 2:
+                (word, tag) = text[index]
+                if tag[:2] == noun_tag:
+                    word_SO = get_noun_SO(index)
+                    if word_SO != 0:
+                        word_SO = apply_weights(word_SO, index)
+                        nouns_SO += word_SO
+                    if token_record:
+                        write_token_record(os.path.basename(input_path), index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+        noun_count = sum_word_counts(word_counts[0])
+        if noun_count > 0:
+            if output_calculations:
+                richout.write("-----\nAverage SO: " + str(nouns_SO / noun_count) + "\n-----\n")
+            text_SO += nouns_SO
+            SO_counter += noun_count
+        else:
+            if output_calculations:
+                richout.write("-----\nAverage SO: 0\n-----\n")
 
-if use_verbs:
-    if output_calculations:
-        richout.write("Verbs:\n-----\n")
-    verbs_SO = 0
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == verb_tag:
-                word_SO = get_verb_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    verbs_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    verb_count = sum_word_counts(word_counts[1])
-    if verb_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(verbs_SO / verb_count) + "\n-----\n")
-        text_SO += verbs_SO
-        SO_counter += verb_count
-    else:
+    if use_verbs:
         if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
+            richout.write("Verbs:\n-----\n")
+        verbs_SO = 0
+        for index in range(0, len(text)):
+            if len(text[index]) == 2:
+                (word, tag) = text[index]
+                if tag[:2] == verb_tag:
+                    word_SO = get_verb_SO(index)
+                    if word_SO != 0:
+                        word_SO = apply_weights(word_SO, index)
+                        verbs_SO += word_SO
+                    if token_record:
+                        write_token_record(os.path.basename(input_path), index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+        verb_count = sum_word_counts(word_counts[1])
+        if verb_count > 0:
+            if output_calculations:
+                richout.write("-----\nAverage SO: " + str(verbs_SO / verb_count) + "\n-----\n")
+            text_SO += verbs_SO
+            SO_counter += verb_count
+        else:
+            if output_calculations:
+                richout.write("-----\nAverage SO: 0\n-----\n")
 
-if use_adjectives:
-    adjs_SO = 0
-    if output_calculations:
-        richout.write("Adjectives:\n-----\n")
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == adj_tag:
-                word_SO = get_adj_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    adjs_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    adj_count = sum_word_counts(word_counts[2])
-    if adj_count > 0:
+    if use_adjectives:
+        adjs_SO = 0
         if output_calculations:
-            richout.write("-----\nAverage SO: " + str(adjs_SO / adj_count) + "\n-----\n")
-        text_SO += adjs_SO
-        SO_counter += adj_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
+            richout.write("Adjectives:\n-----\n")
+        for index in range(0, len(text)):
+            if len(text[index]) == 2:
+                (word, tag) = text[index]
+                if tag[:2] == adj_tag:
+                    word_SO = get_adj_SO(index)
+                    if word_SO != 0:
+                        word_SO = apply_weights(word_SO, index)
+                        adjs_SO += word_SO
+                    if token_record:
+                        write_token_record(os.path.basename(input_path), index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+        adj_count = sum_word_counts(word_counts[2])
+        if adj_count > 0:
+            if output_calculations:
+                richout.write("-----\nAverage SO: " + str(adjs_SO / adj_count) + "\n-----\n")
+            text_SO += adjs_SO
+            SO_counter += adj_count
+        else:
+            if output_calculations:
+                richout.write("-----\nAverage SO: 0\n-----\n")
 
-adv_outputs = []
-if use_adverbs:
-    advs_SO = 0
-    if output_calculations:
-        richout.write("Adverbs:\n-----\n")
-    for index in range(len(text) - 1, -1, -1):  # backwards iteration, since
-        if len(text[index]) == 2:
-            (word, tag) = text[index]  # adverbs modify adverbs
-            if tag[:2] == adv_tag:
-                (word_SO, output) = get_adv_SO(index)
-                if word_SO != 0:
-                    (word_SO, output) = apply_weights_adv(word_SO, index, output)
-                    advs_SO += word_SO
-                    adv_outputs.insert(0, output)
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-        adv_count = sum_word_counts(word_counts[3])
-    for output in adv_outputs:
-        richout.write(output)
-    if adv_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(advs_SO / adv_count) + "\n-----\n")
-        text_SO += advs_SO
-        SO_counter += adv_count
-    else:
+    adv_outputs = []
+    if use_adverbs:
+        advs_SO = 0
         if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-if SO_counter > 0:
-    text_SO = text_SO / SO_counter  # calculate the final SO for the text
-
-basicout.write(os.path.basename(args.input) + "\t" + str(text_SO) + "\n")
-if output_sentences:
-    richout.write("-----\nSO by Sentence\n-----\n")
-    for i in range(len(boundaries)):
-        richout.write(get_sentence(boundaries[i] - 1) + " ")
-        if i in sentence_SO:
-            richout.write(str(sentence_SO[i]) + "\n")
+            richout.write("Adverbs:\n-----\n")
+        for index in range(len(text) - 1, -1, -1):  # backwards iteration, since
+            if len(text[index]) == 2:
+                (word, tag) = text[index]  # adverbs modify adverbs
+                if tag[:2] == adv_tag:
+                    (word_SO, output) = get_adv_SO(index)
+                    if word_SO != 0:
+                        (word_SO, output) = apply_weights_adv(word_SO, index, output)
+                        advs_SO += word_SO
+                        adv_outputs.insert(0, output)
+                    if token_record:
+                        write_token_record(os.path.basename(input_path), index, tag, word_SO)
+                    if by_sentence:
+                        sentence_no = get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            adv_count = sum_word_counts(word_counts[3])
+        for output in adv_outputs:
+            richout.write(output)
+        if adv_count > 0:
+            if output_calculations:
+                richout.write("-----\nAverage SO: " + str(advs_SO / adv_count) + "\n-----\n")
+            text_SO += advs_SO
+            SO_counter += adv_count
         else:
-            richout.write("0\n")
-if output_calculations:
-    richout.write("---------\nTotal SO: " + str(text_SO) + "\n---------\n")
-
-if adv_learning and new_adv_dict:  # output the new adverb
-    f = open(adv_dict_path, "a")  # dictionary
+            if output_calculations:
+                richout.write("-----\nAverage SO: 0\n-----\n")
+
+    if SO_counter > 0:
+        text_SO = text_SO / SO_counter  # calculate the final SO for the text
+
+    basicout.write(os.path.basename(input_path) + "\t" + str(text_SO) + "\n")
+    if output_sentences:
+        richout.write("-----\nSO by Sentence\n-----\n")
+        for i in range(len(boundaries)):
+            richout.write(get_sentence(boundaries[i] - 1) + " ")
+            if i in sentence_SO:
+                richout.write(str(sentence_SO[i]) + "\n")
+            else:
+                richout.write("0\n")
+    if output_calculations:
+        richout.write("---------\nTotal SO: " + str(text_SO) + "\n---------\n")
+    if jsonout is not None:  # the SO of a sentence is only known once every part of speech is scored
+        for i in range(len(boundaries)):
+            jsonout.write(json.dumps({"record": "sentence", "file": os.path.basename(input_path), "sentence": i,
+                                      "text": get_sentence(boundaries[i] - 1), "SO": sentence_SO.get(i, 0)}) + "\n")
+        jsonout.write(json.dumps({"record": "text", "file": os.path.basename(input_path), "length": len(text),
+                                  "SO": text_SO}) + "\n")
+
+def write_learned_adverbs():
+    if adv_learning and new_adv_dict:  # output the new adverb
+        f = open(adv_dict_path, "a")  # dictionary
+        for adverb in new_adv_dict:
+            f.write(adverb + "\t" + str(int(adv_dict[adverb])) + "\n")
+        f.close()
+
+def forget_learned_adverbs():
+    # drop the adverbs learned from the last file, as a run that failed does
     for adverb in new_adv_dict:
-        f.write(adverb + "\t" + str(int(adv_dict[adverb])) + "\n")
-    f.close()
+        del adv_dict[adverb]
+    new_adv_dict.clear()
 
-basicout.close()
-richout.close()
+def learn_adverbs():
+    '''
+    Write the adverbs learned from the last file to the adverb dictionary and
+    load the dictionaries again, so that the next file is scored with the
+    dictionaries a new run of this script would read.
+    :return: None
+    '''
+    if adv_learning and new_adv_dict:
+        write_learned_adverbs()
+        new_adv_dict.clear()
+        for s_dict in [adj_dict, adv_dict, noun_dict, verb_dict, int_dict,
+                       c_adj_dict, c_adv_dict, c_noun_dict, c_verb_dict, c_int_dict]:
+            s_dict.clear()
+        load_dictionaries()
+
+if __name__ == "__main__":
+    load_dictionaries()
+    score_file(args.input)
+    write_learned_adverbs()
+    basicout.close()
+    richout.close()
+    if jsonout is not None:
+        jsonout.close()
@@ -2,10 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
+import io
 import json
 import csv
 from collections import OrderedDict
 import argparse
+import importlib.util
+import multiprocessing
+import traceback
+# the token columns and the packed corpora are those of the SO_Calc.py one folder up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from SO_Calc import TokenColumns, PackedCorpus, is_packed_corpus, pack_corpus
 
 def get_command_arguments():
     '''
@@ -33,6 +41,25 @@ def get_command_arguments():
                         default='',
                         help="The gold file for comparison")
 
+    parser.add_argument('--batch', '-b', dest='batch', action='store_true',
+                        help="Load SO_Calc.py and the dictionaries once and score every file in this process, "
+                             "instead of running SO_Calc.py once per file")
+
+    parser.add_argument('--workers', '-w', type=int, dest='workers', action='store',
+                        default=1,
+                        help="The number of processes used to score the files in batch mode "
+                             "(one when adv_learning is on)")
+
+    parser.add_argument('--columns', '-col', type=str, dest='columns', action='store',
+                        default='',
+                        help="Save the scored words of every file to this NumPy .npz archive (needs numpy); "
+                             "the files are scored in batch mode")
+
+    parser.add_argument('--pack', '-pk', type=str, dest='pack', action='store',
+                        default='',
+                        help="Pack the input files into this corpus file and score them from it in batch mode; "
+                             "a packed corpus can be given as the input of later runs")
+
     args = parser.parse_args()
     return args
 
@@ -66,9 +93,118 @@ def generate_file_sentiment(basicout_path, cutoff, file_sentiment_path):
             writer.writerow({'File_Name': filename, 'Sentiment_Score': score, 'Sentiment': sentiment})
             print(f"Wrote sentiment for {filename}: score={score}, sentiment={sentiment}")
 
-def generate_richoutJSON(richout_path, richout_json):
-    # Implement the function to generate rich output JSON
-    pass
+def load_calculator(config_file, basicout, richout, jsonout):
+    '''
+    Load SO_Calc.py of this folder once as a module, with its configuration
+    and dictionaries, to score many files in this process.
+    :param config_file: the configuration file for SO-CAL
+    :param basicout: the basic output
+    :param richout: the rich output
+    :param jsonout: the JSON lines output
+    :return: the loaded module
+    '''
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SO_Calc.py")
+    spec = importlib.util.spec_from_file_location("SO_Calc", script_path)
+    calculator = importlib.util.module_from_spec(spec)
+    calculator.args = argparse.Namespace(config=config_file)
+    calculator.basicout = basicout
+    calculator.richout = richout
+    calculator.jsonout = jsonout
+    spec.loader.exec_module(calculator)
+    calculator.load_dictionaries()
+    return calculator
+
+worker_calculator = None  # the loaded SO_Calc.py, inherited by the forked workers
+worker_corpus = None  # the packed corpus the files are read from, if any, inherited by the forked workers
+
+def open_document(file_path, corpus):
+    '''
+    Open a file to score, from the packed corpus when there is one.
+    :param file_path: the preprocessed file, or its name in the corpus
+    :param corpus: the PackedCorpus of the files, or None
+    :return: the text of the file, or None for SO_Calc.py to open file_path
+    '''
+    if corpus is None:
+        return None
+    return corpus.open(file_path, encoding='utf-8')  # as SO_Calc.py reads its input
+
+def score_in_worker(file_path):
+    '''
+    Score one file in a worker process, with the outputs kept in strings for
+    the parent to write.
+    :param file_path: the preprocessed file to score, or its name in worker_corpus
+    :return: the basic, rich and JSON lines output, the rows of the scored words
+    (None when the columns are not saved) and the traceback of a failure ("" for none)
+    '''
+    calculator = worker_calculator
+    (calculator.basicout, calculator.richout, calculator.jsonout) = (io.StringIO(), io.StringIO(), io.StringIO())
+    if calculator.tokenout is not None:
+        calculator.tokenout = []
+    error = ""
+    try:
+        calculator.score_file(file_path, open_document(file_path, worker_corpus))
+    except Exception:
+        error = traceback.format_exc()
+    return [calculator.basicout.getvalue(), calculator.richout.getvalue(), calculator.jsonout.getvalue(),
+            calculator.tokenout, error]
+
+def run_batch(file_paths, config_file, basicout_path, richout_path, richout_json, workers=1, columns_path="",
+              corpus=None):
+    '''
+    Score all the files with SO_Calc.py loaded once, instead of running it (and
+    reloading every dictionary) for each file. The output is the same as with a
+    run per file: a file that fails is skipped after printing its traceback,
+    and the adverbs learned from a file are added to the dictionary before the
+    next one is scored. With several workers and no adverb learning, the files
+    are scored by forked processes that share the loaded dictionaries, and only
+    this process writes the outputs, in the order of file_paths. The scored
+    words of the files that did not fail are saved to columns_path.
+    :param file_paths: the preprocessed files to score, in order, or their names in corpus
+    :param config_file: the configuration file for SO-CAL
+    :param basicout_path: the basic output, one line per file
+    :param richout_path: the rich output
+    :param richout_json: the JSON lines rich output
+    :param workers: the number of processes used for scoring
+    :param columns_path: the .npz archive for the scored words, "" for none
+    :param corpus: the PackedCorpus the files are read from, None to read the files
+    :return: None
+    '''
+    global worker_calculator, worker_corpus
+    columns = TokenColumns() if columns_path else None
+    with open(basicout_path, "a", encoding='utf-8') as basicout, open(richout_path, "a", encoding='utf-8') as richout, \
+            open(richout_json, "a", encoding='utf-8') as jsonout:
+        calculator = load_calculator(config_file, basicout, richout, jsonout)
+        if columns is not None:
+            calculator.tokenout = []
+        if workers <= 1 or calculator.adv_learning:  # a learned adverb changes the scores of the files after it
+            for file_path in file_paths:
+                print("Processing " + os.path.basename(file_path) + "...")
+                if columns is not None:
+                    calculator.tokenout = []
+                try:
+                    calculator.score_file(file_path, open_document(file_path, corpus))
+                except Exception:
+                    traceback.print_exc()
+                    calculator.forget_learned_adverbs()
+                else:
+                    calculator.learn_adverbs()
+                    if columns is not None:
+                        columns.add_file(os.path.basename(file_path), calculator.tokenout)
+        else:
+            (worker_calculator, worker_corpus) = (calculator, corpus)
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                for (file_path, outputs) in zip(file_paths, pool.imap(score_in_worker, file_paths)):
+                    print("Processing " + os.path.basename(file_path) + "...")
+                    (basic, rich, json_lines, rows, error) = outputs
+                    basicout.write(basic)
+                    richout.write(rich)
+                    jsonout.write(json_lines)
+                    if error:
+                        sys.stderr.write(error)
+                    elif columns is not None:
+                        columns.add_file(os.path.basename(file_path), rows)
+    if columns is not None:
+        columns.save(columns_path)
 
 def main():
     pos_mark = "positive"
@@ -89,28 +225,49 @@ def main():
     richout_path = os.path.abspath(output_folder) + "/richout.txt"
     file_sentiment_path = os.path.abspath(output_folder) + "/file_sentiment.csv"
     prediction_accuracy_path =  os.path.abspath(output_folder) + "/prediction_accuracy.txt"
-    richout_json = os.path.abspath(output_folder) + "/rich_output.json"
+    richout_json = os.path.abspath(output_folder) + "/rich_output.jsonl"
 
     open(basicout_path, "w").close()
     open(richout_path, "w").close()
+    open(richout_json, "w").close()
     open(file_sentiment_path, 'w').close()
     open(prediction_accuracy_path, 'w').close()
 
-    if os.path.isfile(input_path):  # 1 single file
+    if args.batch or args.workers > 1 or args.columns or args.pack or is_packed_corpus(input_path):
+        # SO_Calc.py is loaded once and scores the files in this process
+        corpus = None
+        if is_packed_corpus(input_path):
+            corpus = PackedCorpus(input_path)
+        elif os.path.isfile(input_path):
+            file_paths = [input_path]
+        elif os.path.isdir(input_path):
+            file_paths = [os.path.abspath(input_path) + "/" + f_name for f_name in os.listdir(input_path)]
+            file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+        else:
+            file_paths = []
+        if args.pack and corpus is None:
+            pack_corpus(file_paths, args.pack)
+            corpus = PackedCorpus(args.pack)
+        if corpus is not None:
+            file_paths = corpus.names
+        run_batch(file_paths, config_file, basicout_path, richout_path, richout_json, args.workers, args.columns,
+                  corpus)
+        if corpus is not None:
+            corpus.close()
+    elif os.path.isfile(input_path):  # 1 single file
         print("Processing " + "...")
-        cmd = f"python3 sentiment_calculator/SO_Calc.py -i \"{input_path}\" -bo \"{basicout_path}\" -ro \"{richout_path}\" -c \"{config_file}\""
+        cmd = f"python3 sentiment_calculator/SO_Calc.py -i \"{input_path}\" -bo \"{basicout_path}\" -ro \"{richout_path}\" -jo \"{richout_json}\" -c \"{config_file}\""
         os.system(cmd)
     elif os.path.isdir(input_path):   # an input folder, only reads files
         for f_name in os.listdir(input_path):
             print("Processing " + f_name + "...")
             file_path = os.path.abspath(input_path) + "/" + f_name
             if not os.path.isfile(file_path): continue
-            cmd = f"python3 sentiment_calculator/SO_Calc.py -i \"{file_path}\" -bo \"{basicout_path}\" -ro \"{richout_path}\" -c \"{config_file}\""
+            cmd = f"python3 sentiment_calculator/SO_Calc.py -i \"{file_path}\" -bo \"{basicout_path}\" -ro \"{richout_path}\" -jo \"{richout_json}\" -c \"{config_file}\""
 
             os.system(cmd)
 
     generate_file_sentiment(basicout_path, cutoff, file_sentiment_path)
-    generate_richoutJSON(richout_path, richout_json)
 
     if gold_file == "":
         print("""
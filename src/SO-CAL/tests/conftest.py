@@ -0,0 +1,150 @@
+import argparse
+import http.server
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+
+# the modules under test are scripts in the SO-CAL folder, not an installed package
+SO_CAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SO_CAL_DIR)
+
+PREPROCESSORS = {"preprocess1": os.path.join(SO_CAL_DIR, "preprocess1.py"),
+                 "text_preprocessing": os.path.join(SO_CAL_DIR, "Source_Code", "text_preprocessing", "preprocess.py")}
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(params = sorted(PREPROCESSORS))
+def preprocess_module(request):
+    '''
+    Each of the two copies of the preprocessor, so that both are held to the same behaviour.
+    '''
+    pytest.importorskip("requests")
+    pytest.importorskip("unidecode")
+    return load_module("preprocess_" + request.param, PREPROCESSORS[request.param])
+
+@pytest.fixture
+def make_preprocess(preprocess_module, tmp_path):
+    '''
+    A factory of Preprocess objects reading from and writing to tmp_path; the
+    keyword arguments override the command line defaults.
+    '''
+    (tmp_path / "input").mkdir()
+    def make(**overrides):
+        args = dict(input_path = str(tmp_path / "input"), output_path = str(tmp_path / "output"),
+                    log_path = "", annotators = "tokenize,ssplit,pos", chunk_size = 50000,
+                    server_url = "http://localhost:9", threads = 2, timeout = 1.0, retries = 0,
+                    cache_dir = str(tmp_path / "cache"), cache_size = 1, no_cache = False,
+                    corenlp_version = "")
+        args.update(overrides)
+        return preprocess_module.Preprocess(argparse.Namespace(**args))
+    return make
+
+class CoreNLPHandler(http.server.BaseHTTPRequestHandler):
+### a stand-in for the Stanford CoreNLP server: every word is tagged NN, a
+### word ending with . ! or ? ends a sentence, and a text with the word FAIL
+### gets a server error
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        text = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        self.server.texts.append(text)
+        if "FAIL" in text.split():
+            self.reply(500, b"CoreNLP request failed")
+            return
+        sentences = [[]]
+        for word in text.split():
+            sentences[-1].append({"index": len(sentences[-1]) + 1, "word": word, "originalText": word,
+                                  "characterOffsetBegin": 0, "characterOffsetEnd": 0, "pos": "NN",
+                                  "before": " ", "after": " "})
+            if word.endswith((".", "!", "?")):
+                sentences.append([])
+        sentences = [tokens for tokens in sentences if tokens]
+        body = {"sentences": [{"index": i, "tokens": tokens} for (i, tokens) in enumerate(sentences)]}
+        self.reply(200, json.dumps(body).encode("utf-8"))
+
+    def reply(self, code, body):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def corenlp_server():
+    '''
+    The url of a local stand-in for the Stanford CoreNLP server; its texts
+    attribute lists the texts it has been sent.
+    '''
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CoreNLPHandler)
+    server.texts = []
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+SAMPLE_DIR = os.path.join(SO_CAL_DIR, "Sample", "output", "Preprocessed_Output", "BOOKS")
+DICTIONARY_DIR = os.path.join(SO_CAL_DIR, "Resources", "dictionaries", "English") + os.sep
+
+@pytest.fixture(scope = "session")
+def config_path(tmp_path_factory):
+    '''
+    The English configuration, with dic_dir set to the dictionaries of this
+    checkout instead of the absolute path in the sample file.
+    '''
+    path = tmp_path_factory.mktemp("config") / "en_SO_Calc.ini"
+    with open(os.path.join(SO_CAL_DIR, "Resources", "config_files", "en_SO_Calc.ini"), encoding = "utf-8") as f:
+        lines = ["dic_dir = " + DICTIONARY_DIR + "\n" if line.startswith("dic_dir") else line for line in f]
+    path.write_text("".join(lines), encoding = "utf-8")
+    return str(path)
+
+@pytest.fixture
+def make_scratch_config(tmp_path):
+    '''
+    A factory of English configurations, each with its own copy of the
+    dictionaries in tmp_path/name, for the runs of sentiment_calculator/SO_Calc.py,
+    which adds the adverbs it learns to them. The keyword arguments override
+    settings of the file.
+    '''
+    def make(name, **settings):
+        shutil.copytree(DICTIONARY_DIR, tmp_path / name / "dictionaries")
+        path = tmp_path / name / "en_SO_Calc.ini"
+        settings["dic_dir"] = str(tmp_path / name / "dictionaries") + os.sep
+        with open(os.path.join(SO_CAL_DIR, "Resources", "config_files", "en_SO_Calc.ini"), encoding = "utf-8") as f:
+            lines = [line.split("=")[0] + "= " + str(settings[line.split("=")[0].strip()]) + "\n"
+                     if line.split("=")[0].strip() in settings else line for line in f]
+        path.write_text("".join(lines), encoding = "utf-8")
+        return str(path)
+    return make
+
+@pytest.fixture(scope = "session")
+def calculator(config_path):
+    from SO_Calc import SOCalculator
+    return SOCalculator(config_path, dictionary_cache = False)
+
+@pytest.fixture(scope = "session")
+def unlearning_calculator(config_path):
+    '''
+    A calculator that does not learn adverbs, so that score_files really uses
+    a pool of workers.
+    '''
+    from SO_Calc import SOCalculator, read_settings
+    return SOCalculator(read_settings(config_path).replace(adv_learning = False), dictionary_cache = False)
+
+@pytest.fixture(scope = "session")
+def sample_paths():
+    '''
+    A few of the sample preprocessed books, in sorted order.
+    '''
+    return [os.path.join(SAMPLE_DIR, name) for name in sorted(os.listdir(SAMPLE_DIR))[:12]]
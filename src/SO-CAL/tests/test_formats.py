@@ -0,0 +1,85 @@
+import io
+import os
+import shutil
+
+import pytest
+
+from conftest import DICTIONARY_DIR
+from SO_Calc import (DICTIONARY_CACHE_NAME, PackedCorpus, SOCalculator, TokenColumns, is_packed_corpus,
+                     pack_corpus, score_files)
+
+def test_packed_corpus_round_trip(sample_paths, tmp_path):
+    corpus_path = str(tmp_path / "books.pk")
+    pack_corpus(sample_paths, corpus_path)
+    assert is_packed_corpus(corpus_path)
+    assert not is_packed_corpus(sample_paths[0])
+    with PackedCorpus(corpus_path) as corpus:
+        assert corpus.names == [os.path.basename(path) for path in sample_paths]
+        for path in reversed(sample_paths):
+            with open(path, encoding = "ISO-8859-1", newline = "") as f:
+                assert corpus.open(os.path.basename(path)).read() == f.read()
+
+def test_packed_corpus_scores_like_the_files(unlearning_calculator, sample_paths, tmp_path):
+    calculator = unlearning_calculator
+    corpus_path = str(tmp_path / "books.pk")
+    pack_corpus(sample_paths, corpus_path)
+    richout = io.StringIO()
+    from_files = [text_SO for (_, text_SO, _) in score_files(calculator, sample_paths, richout = richout)]
+    with PackedCorpus(corpus_path) as corpus:
+        for workers in [1, 2]:
+            corpus_richout = io.StringIO()
+            assert [text_SO for (_, text_SO, _) in score_files(calculator, corpus.names, workers, corpus_richout,
+                                                               corpus = corpus)] == from_files
+            assert corpus_richout.getvalue() == richout.getvalue()
+
+def test_packed_corpus_rejects_bad_input(sample_paths, tmp_path):
+    with pytest.raises(ValueError):
+        pack_corpus([sample_paths[0], sample_paths[0]], str(tmp_path / "twice.pk"))
+    with pytest.raises(ValueError):
+        PackedCorpus(sample_paths[0])
+
+def test_empty_packed_corpus(tmp_path):
+    pack_corpus([], str(tmp_path / "empty.pk"))
+    with PackedCorpus(str(tmp_path / "empty.pk")) as corpus:
+        assert len(corpus) == 0
+
+def dictionaries(calculator):
+    return [calculator.adj_dict, calculator.adv_dict, calculator.verb_dict, calculator.noun_dict, calculator.int_dict,
+            calculator.c_adj_dict, calculator.c_adv_dict, calculator.c_verb_dict, calculator.c_noun_dict,
+            calculator.c_int_dict, calculator.c_int_trie]
+
+def test_dictionary_cache(config_path, calculator, tmp_path):
+    dic_dir = str(tmp_path / "English") + os.sep
+    shutil.copytree(DICTIONARY_DIR, dic_dir, ignore = shutil.ignore_patterns(DICTIONARY_CACHE_NAME))
+    cache_path = os.path.join(dic_dir, DICTIONARY_CACHE_NAME)
+    written = SOCalculator(config_path, dic_dir)
+    assert os.path.exists(cache_path)
+    assert dictionaries(written) == dictionaries(calculator)
+    cached = SOCalculator(config_path, dic_dir)
+    assert dictionaries(cached) == dictionaries(calculator)
+    # a changed dictionary file makes the cache out of date
+    with open(cached.adj_dict_path, "a", encoding = "ISO-8859-1") as f:
+        f.write("zzyzxish\t5\n")
+    changed = SOCalculator(config_path, dic_dir)
+    assert changed.adj_dict["zzyzxish"] == 5
+    assert SOCalculator(config_path, dic_dir).adj_dict["zzyzxish"] == 5
+
+def test_token_columns(calculator, sample_paths, tmp_path):
+    numpy = pytest.importorskip("numpy")
+    columns = TokenColumns()
+    rows_by_file = {}
+    for (path, _, rows) in score_files(calculator, sample_paths[:3], token_output = True):
+        rows_by_file[os.path.basename(path)] = rows
+        columns.add_file(os.path.basename(path), rows)
+    columns.save(str(tmp_path / "words.npz"))
+    with numpy.load(str(tmp_path / "words.npz")) as archive:
+        files = list(archive["files"])
+        tags = archive["POS_tags"]
+        lemmas = archive["lemmas"]
+        loaded = {}
+        for i in range(len(archive["index"])):
+            row = [int(archive["index"][i]), int(archive["sentence"][i]), str(tags[archive["POS_id"][i]]),
+                   str(lemmas[archive["lemma_id"][i]]), float(archive["raw_SO"][i]), float(archive["final_SO"][i]),
+                   float(archive["weight"][i])]
+            loaded.setdefault(str(files[archive["file_id"][i]]), []).append(row)
+    assert loaded == {name: [list(row) for row in rows] for (name, rows) in rows_by_file.items() if rows}
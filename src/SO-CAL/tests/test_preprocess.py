@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import threading
+
+import pytest
+
+SENTENCES = ["The butler was seen in the garden.", "Who killed him?", "\"Nobody,\" said Poirot.",
+             "It was", "a dark and stormy night", "without an end in sight", "x" * 40]
+
+def write_text(path, lines):
+    with open(path, "w", encoding = "utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def joined_lines(path):
+    with open(path, "rb") as f:
+        return "".join(" " + r.strip().decode("utf-8", "backslashreplace") for r in f)
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 40, 100, 250, 50000])
+def test_read_chunks_fit_and_rejoin(make_preprocess, tmp_path, chunk_size):
+    rng = random.Random(chunk_size)
+    lines = [rng.choice(SENTENCES + [""]) for _ in range(300)]
+    path = tmp_path / "book.txt"
+    write_text(path, lines)
+    preprocess = make_preprocess(chunk_size = chunk_size)
+    chunks = list(preprocess.read_chunks(str(path)))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    assert "".join(chunks) == joined_lines(path)
+
+def test_read_chunks_prefers_sentence_end(make_preprocess, tmp_path):
+    path = tmp_path / "book.txt"
+    write_text(path, ["The butler was seen.", "It was", "a dark and stormy night", "and nobody"])
+    chunks = list(make_preprocess(chunk_size = 50).read_chunks(str(path)))
+    assert chunks[0] == " The butler was seen."
+    assert all(len(chunk) <= 50 for chunk in chunks)
+
+def test_read_chunks_prefers_paragraph_end(make_preprocess, tmp_path):
+    path = tmp_path / "book.txt"
+    write_text(path, ["It was.", "", "A dark night.", "And stormy.", "Nobody saw."])
+    chunks = list(make_preprocess(chunk_size = 30).read_chunks(str(path)))
+    assert chunks[0] == " It was. "
+
+def test_read_chunks_splits_long_line_at_spaces(make_preprocess, tmp_path):
+    path = tmp_path / "book.txt"
+    write_text(path, ["one two three four five six seven eight nine ten"])
+    chunks = list(make_preprocess(chunk_size = 12).read_chunks(str(path)))
+    assert all(len(chunk) <= 12 for chunk in chunks)
+    assert "".join(chunks) == joined_lines(path)
+    assert all(chunk.startswith(" ") for chunk in chunks)
+
+def test_read_chunks_empty_file(make_preprocess, tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    assert list(make_preprocess().read_chunks(str(path))) == [""]
+
+def server_url(server):
+    return "http://127.0.0.1:%d" % server.server_address[1]
+
+def test_pos_tagging(make_preprocess, tmp_path, corenlp_server):
+    write_text(tmp_path / "input" / "book.txt", ["The butler was seen.", "Who killed him?"])
+    make_preprocess(server_url = server_url(corenlp_server), no_cache = True).pos_tagging()
+    with open(tmp_path / "output" / "book.txt") as f:
+        assert f.read() == "The/NN butler/NN was/NN seen./NN\nWho/NN killed/NN him?/NN\n"
+
+def test_failed_chunk_does_not_stop_the_run(make_preprocess, tmp_path, corenlp_server):
+    write_text(tmp_path / "input" / "a.txt", ["One.", "", "FAIL here.", "", "Two."])
+    write_text(tmp_path / "input" / "b.txt", ["Three."])
+    preprocess = make_preprocess(server_url = server_url(corenlp_server), chunk_size = 12, no_cache = True)
+    preprocess.pos_tagging()
+    with open(tmp_path / "output" / "a.txt") as f:
+        assert f.read() == "One./NN\nTwo./NN\n"
+    with open(tmp_path / "output" / "b.txt") as f:
+        assert f.read() == "Three./NN\n"
+
+def test_unreachable_server(make_preprocess, tmp_path):
+    path = tmp_path / "book.txt"
+    write_text(path, ["One."])
+    preprocess = make_preprocess(no_cache = True)
+    assert preprocess.tag_chunk(" One.") is None
+
+def test_one_session_per_thread(make_preprocess):
+    preprocess = make_preprocess()
+    sessions = []
+    thread = threading.Thread(target = lambda: sessions.append(preprocess.session()))
+    thread.start()
+    thread.join()
+    assert preprocess.session() is preprocess.session()
+    assert sessions[0] is not preprocess.session()
+
+ANNOTATION = {"docId": "book", "sentences": [
+    {"index": 0, "tokens": [{"index": 1, "word": "Café", "originalText": "Café", "pos": "NNP", "characterOffsetBegin": 0},
+                            {"index": 2, "word": "-LRB-", "originalText": "(", "pos": "-LRB-", "characterOffsetBegin": 12345}]},
+    {"index": 1, "tokens": [{"index": 1, "word": "“Yes”", "originalText": "“Yes”", "pos": "UH"}]}],
+    "corefs": {}}
+ROWS = ["Café/NNP (/-LRB-", "“Yes”/UH"]
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 1 << 16])
+def test_read_sentences_from_any_chunks(make_preprocess, indent, chunk_size):
+    body = json.dumps(ANNOTATION, indent = indent, ensure_ascii = False).encode("utf-8")
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    assert make_preprocess().read_sentences(chunks) == ROWS
+
+def test_read_sentences_without_sentences(make_preprocess):
+    assert make_preprocess().read_sentences([b'{}']) == []
+    assert make_preprocess().read_sentences([b'{"sentences": []}']) == []
+
+@pytest.mark.parametrize("body", [b'', b'{"sentences": [{"tokens": [', b'{"sentences": [] "x"', b'[]'])
+def test_read_sentences_rejects_broken_json(make_preprocess, body):
+    with pytest.raises(ValueError):
+        make_preprocess().read_sentences([body])
+
+def test_pos_annotator_is_required(make_preprocess):
+    with pytest.raises(ValueError):
+        make_preprocess(annotators = "tokenize,ssplit")
+    make_preprocess(annotators = "tokenize, ssplit, pos, lemma")
+
+def test_cache_reuses_annotations(make_preprocess, corenlp_server):
+    preprocess = make_preprocess(server_url = server_url(corenlp_server))
+    rows = preprocess.tag_chunk(" The butler was seen. Who killed him?")
+    assert rows == ["The/NN butler/NN was/NN seen./NN", "Who/NN killed/NN him?/NN"]
+    assert preprocess.tag_chunk(" The butler was seen. Who killed him?") == rows
+    assert len(corenlp_server.texts) == 1
+    # another server with the same annotators and version shares the cache
+    assert make_preprocess(server_url = "http://localhost:9").tag_chunk(" The butler was seen. Who killed him?") == rows
+
+def test_cache_key(make_preprocess):
+    preprocess = make_preprocess()
+    path = preprocess.cache_path(" One.")
+    assert path != preprocess.cache_path(" One. ")
+    assert path != make_preprocess(annotators = "tokenize,ssplit,pos,lemma").cache_path(" One.")
+    assert path != make_preprocess(corenlp_version = "4.5.4").cache_path(" One.")
+    assert path == make_preprocess().cache_path(" One.")
+
+def test_failures_and_no_cache_are_not_cached(make_preprocess, tmp_path, corenlp_server):
+    url = server_url(corenlp_server)
+    assert make_preprocess(server_url = url).tag_chunk(" FAIL now.") is None
+    assert make_preprocess(server_url = url, no_cache = True).tag_chunk(" One.") == ["One./NN"]
+    assert not (tmp_path / "cache").exists()
+
+def test_evict_cache(make_preprocess, tmp_path):
+    preprocess = make_preprocess()
+    preprocess.cache_size = 2500
+    paths = [preprocess.cache_path(" text %d" % i) for i in range(5)]
+    for (age, path) in enumerate(paths):
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(path, "w") as f:
+            f.write("x" * 1000)
+        os.utime(path, (1000 + age, 1000 + age)) # the first path is the least recently used
+    preprocess.evict_cache()
+    assert [os.path.exists(path) for path in paths] == [False, False, False, True, True]
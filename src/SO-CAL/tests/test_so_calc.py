@@ -0,0 +1,268 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SO_CAL_DIR
+from SO_Calc import SOCalculator, is_packed_corpus, location_index, read_settings, score_files
+
+def test_batch_matches_one_calculator_per_file(unlearning_calculator, sample_paths):
+    expected = []
+    (richout, jsonout) = (io.StringIO(), io.StringIO())
+    for path in sample_paths:
+        calculator = SOCalculator(unlearning_calculator.settings, dictionary_cache = False)
+        expected.append((path, calculator.score_file(path, richout, jsonout)))
+    for workers in [1, 3]:
+        (batch_richout, batch_jsonout) = (io.StringIO(), io.StringIO())
+        batch = [(path, text_SO) for (path, text_SO, _) in score_files(unlearning_calculator, sample_paths, workers,
+                                                                       batch_richout, batch_jsonout)]
+        assert batch == expected
+        assert batch_richout.getvalue() == richout.getvalue()
+        assert batch_jsonout.getvalue() == jsonout.getvalue()
+
+def run_runner(input_folder, output_folder, config_path, *options):
+### runs sentiment_calculator/SO_Run.py from the SO-CAL folder, where it finds
+### the script it runs for each file
+    runner = os.path.join("sentiment_calculator", "SO_Run.py")
+    subprocess.run([sys.executable, runner, "-i", str(input_folder), "-o", str(output_folder), "-c", config_path] + list(options),
+                   check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, cwd = SO_CAL_DIR)
+
+def test_runner_jsonl_matches_basic_output(make_scratch_config, sample_paths, tmp_path):
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    for path in sample_paths[:4]:
+        shutil.copy(path, input_folder)
+    run_runner(input_folder, tmp_path / "output", make_scratch_config("run"))
+    with open(tmp_path / "output" / "output.txt") as f:
+        basic = {line.split("\t")[0]: float(line.split("\t")[1]) for line in f}
+    with open(tmp_path / "output" / "rich_output.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert {record["file"]: record["SO"] for record in records if record["record"] == "text"} == basic
+    for name in basic:
+        kinds = [record["record"] for record in records if record["file"] == name]
+        assert kinds == sorted(kinds, key = ["token", "sentence", "text"].index)
+        assert kinds.count("text") == 1
+
+def scan_clause(calculator, index):
+### the words after the last boundary up to index, found by the backward
+### search the clause tables replace
+    words = []
+    while index != -1 and not calculator.at_boundary(index):
+        words.append(calculator.text.word(index).lower())
+        index -= 1
+    return words
+
+@pytest.mark.parametrize("use_boundary_words", [True, False])
+def test_clause_tables_match_backward_search(config_path, use_boundary_words):
+    settings = read_settings(config_path).replace(use_boundary_words = use_boundary_words, use_definite_assertion = False)
+    calculator = SOCalculator(settings, dictionary_cache = False)
+    words = "I hoped the film would be good , but it was dull . Although slow , it is great ! Could it be worse ?".split()
+    calculator.score([(word, "NN") for word in words], boundaries = [11, 19, len(words)])
+    for index in range(len(words)):
+        clause = scan_clause(calculator, index)
+        highlighters = [word for word in clause if word in calculator.highlighters]
+        assert calculator.get_sent_highlighter(index) == (highlighters[0] if highlighters else False)
+        assert calculator.has_sent_irrealis(index) == any(word in calculator.irrealis for word in clause)
+
+def tagged(text):
+    return [tuple(token.rsplit("/", 1)) for token in text.split()]
+
+def test_sentence_numbers(calculator):
+    # the number of the first boundary at or after the index, as the search it replaced (user-005)
+    boundaries = [2, 5, 6]
+    calculator.score(tagged("a/DT b/NN c/NN d/NN e/NN f/NN"), boundaries = boundaries)
+    assert [calculator.get_sentence_no(i) for i in range(6)] == [min(n for (n, b) in enumerate(boundaries) if b >= i) for i in range(6)]
+    assert [calculator.at_boundary(i) for i in range(6)] == [False, True, False, False, True, True]
+
+def scored_words(calculator, tokens, **settings):
+### the token records of the JSON lines output, by lemma
+    jsonout = io.StringIO()
+    calculator.score(tokens, "test", jsonout = jsonout, **settings)
+    records = [json.loads(line) for line in jsonout.getvalue().splitlines()]
+    return {record["lemma"]: record for record in records if record["record"] == "token"}
+
+def test_multiword_intensifier(calculator):
+    # the multi-word intensifiers were never matched before the trie (user-009)
+    words = scored_words(calculator, tagged("it/PRP is/VBZ a/DT bit/NN good/JJ ./."))
+    assert words["good"]["intensifier"] == pytest.approx(-0.3)
+    assert words["good"]["final_SO"] == pytest.approx(3 * 0.7)
+
+@pytest.mark.parametrize("length", [1, 2, 3, 7, 10, 99, 1000])
+def test_location_index(length):
+    for fraction in [0, 0.1, 0.25, 1 / 3, 0.5, 0.9, 0.99, 1]:
+        expected = [i for i in range(length) if float(i) / length >= fraction]
+        assert location_index(fraction, length) == (expected[0] if expected else length)
+
+def test_read_tokens_splits_at_the_last_slash(calculator):
+    # words with a slash were skipped (user-016)
+    lines = ["1/2/CD of/IN it/PRP\n", "<2>good/JJ</2> and/CC/CC\n"]
+    assert list(calculator.read_tokens(iter(lines))) == [("1/2", "CD", 1.0), ("of", "IN", 1.0), ("it", "PRP", 1.0), None,
+                                                         ("good", "JJ", 2.0), ("and/CC", "CC", 1.0), None]
+
+def test_irrealis_holds_for_the_whole_text(calculator):
+    # the irrealis list used to be an iterator used up by its first test (user-018)
+    words = scored_words(calculator, tagged("it/PRP could/MD be/VB good/JJ ./. it/PRP could/MD be/VB great/JJ ./."),
+                         boundaries = [5, 10])
+    assert words["good"]["final_SO"] == 0
+    assert words["great"]["final_SO"] == 0
+
+def test_boundary_words_stop_the_irrealis_search(calculator):
+    words = scored_words(calculator, tagged("it/PRP could/MD be/VB good/JJ and/CC it/PRP is/VBZ great/JJ ./."))
+    assert words["good"]["final_SO"] == 0
+    assert words["great"]["final_SO"] == 4
+
+def test_settings_are_read_only_and_shared(config_path):
+    settings = read_settings(config_path)
+    assert read_settings(config_path) is settings
+    assert isinstance(settings.irrealis, frozenset) and "could" in settings.irrealis and "could" in settings.irrealis
+    with pytest.raises(AttributeError):
+        settings.use_irrealis = False
+    assert settings.replace(use_irrealis = False).use_irrealis is False
+    assert settings.use_irrealis is True
+
+def test_weights_print_as_before(calculator, tmp_path):
+    # the weights used to be a list of Python numbers, where the 0 of a zero XML tag was an integer (user-014)
+    path = tmp_path / "weighted.txt"
+    path.write_text("it/PRP is/VBZ <DESCRIBE>good/JJ</DESCRIBE> and/CC <2>great/JJ</2> ./.\n", encoding = "ISO-8859-1")
+    richout = io.StringIO()
+    text_SO = calculator.score_file(str(path), richout)
+    assert type(text_SO) is float
+    assert "good 3.0  X 0 (WEIGHTED) = 0.0\n" in richout.getvalue()
+    assert "great 4.0  X 2.0 (WEIGHTED) = 8.0\n" in richout.getvalue()
+
+def test_token_records_keep_both_intensifiers(calculator):
+    # the intensifier of the negation (really not good) is kept apart from the one of the word (not very good) (user-012)
+    words = scored_words(calculator, tagged("it/PRP is/VBZ really/RB not/RB good/JJ ./."))
+    assert (words["good"]["intensifier"], words["good"]["negation_intensifier"]) == (0, pytest.approx(0.2))
+    words = scored_words(calculator, tagged("it/PRP is/VBZ not/RB very/RB good/JJ ./."))
+    assert (words["good"]["intensifier"], words["good"]["negation_intensifier"]) == (pytest.approx(0.2), 0)
+
+def test_score_files_streams_with_one_worker(calculator, sample_paths):
+    # with one worker the calculator writes to the output streams itself, as it scores (user-012)
+    (richout, jsonout) = (io.StringIO(), io.StringIO())
+    for _ in score_files(calculator, sample_paths[:2], 1, richout, jsonout):
+        assert (calculator.richout, calculator.jsonout) == (richout, jsonout)
+
+def test_learned_adverbs_do_not_depend_on_the_workers(config_path, tmp_path):
+    # a learned adverb changes the files after it, so the workers must not score them apart (user-003)
+    paths = []
+    for i in range(8):
+        paths.append(str(tmp_path / ("review%d.txt" % i)))
+        with open(paths[-1], "w", encoding = "ISO-8859-1") as f:
+            f.write("He/PRP was/VBD adorablely/RB awful/JJ ./.\n")
+    scores = []
+    for workers in [1, 3]:
+        calculator = SOCalculator(config_path, dictionary_cache = False)
+        assert calculator.adv_learning
+        scores.append([text_SO for (_, text_SO, _) in score_files(calculator, paths, workers, io.StringIO())])
+    assert scores[0] == scores[1]
+    assert scores[0][0] != scores[0][1]
+
+def test_script_jsonl_matches_its_outputs(make_scratch_config, sample_paths, tmp_path):
+    config_path = make_scratch_config("run")
+    # sentiment_calculator/SO_Calc.py writes the same records, and the same basic and rich output with them (user-012)
+    script = os.path.join(SO_CAL_DIR, "sentiment_calculator", "SO_Calc.py")
+    for name in ["plain", "json"]:
+        for path in sample_paths[:3]:
+            command = [sys.executable, script, "-i", path, "-bo", str(tmp_path / (name + ".txt")),
+                       "-ro", str(tmp_path / (name + "_rich.txt")), "-c", config_path]
+            if name == "json":
+                command += ["-jo", str(tmp_path / "rich_output.jsonl")]
+            subprocess.run(command, check = True)
+    for suffix in [".txt", "_rich.txt"]:
+        assert (tmp_path / ("json" + suffix)).read_bytes() == (tmp_path / ("plain" + suffix)).read_bytes()
+    with open(tmp_path / "json.txt") as f:
+        basic = {line.split("\t")[0]: float(line.split("\t")[1]) for line in f}
+    with open(tmp_path / "rich_output.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert {record["file"]: record["SO"] for record in records if record["record"] == "text"} == basic
+    assert {record["record"] for record in records} == {"token", "sentence", "text"}
+
+def test_runner_batch_matches_a_run_per_file(make_scratch_config, sample_paths, tmp_path):
+    # -b loads sentiment_calculator/SO_Calc.py once and writes what a run of it per file writes, with the adverbs
+    # learned from a file and a file that fails (user-002)
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    for path in sample_paths[:4]:
+        shutil.copy(path, input_folder)
+    for i in range(3):
+        (input_folder / ("adorable%d.txt" % i)).write_text("He/PRP was/VBD adorablely/RB awful/JJ ./.\n", encoding = "utf-8")
+        (input_folder / ("cliche%d.txt" % i)).write_text("It/PRP was/VBD clichédly/RB good/JJ ./.\n", encoding = "utf-8")
+    (input_folder / "broken.txt").write_bytes(b"bad/JJ \xff/NN\n")
+    for mode in ["default", "batch"]:
+        run_runner(input_folder, tmp_path / mode / "output", make_scratch_config(mode), *(["-b"] if mode == "batch" else []))
+    for name in ["output.txt", "richout.txt", "rich_output.jsonl", "file_sentiment.csv"]:
+        assert (tmp_path / "batch" / "output" / name).read_bytes() == (tmp_path / "default" / "output" / name).read_bytes()
+    for name in os.listdir(tmp_path / "default" / "dictionaries"):
+        assert (tmp_path / "batch" / "dictionaries" / name).read_bytes() == (tmp_path / "default" / "dictionaries" / name).read_bytes()
+    with open(tmp_path / "batch" / "output" / "output.txt", encoding = "utf-8") as f:
+        scores = dict(line.rstrip("\n").split("\t") for line in f)
+    assert "broken.txt" not in scores and len(scores) == 10
+    assert len({scores["adorable%d.txt" % i] for i in range(3)}) == 2
+
+@pytest.mark.parametrize("adv_learning", [True, False])
+def test_runner_workers_match_a_run_per_file(make_scratch_config, sample_paths, tmp_path, adv_learning):
+    # the workers only score files apart when no adverb is learned, and the outputs keep the order of the run per file (user-003)
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    for path in sample_paths[:6]:
+        shutil.copy(path, input_folder)
+    for i in range(3):
+        (input_folder / ("adorable%d.txt" % i)).write_text("He/PRP was/VBD adorablely/RB awful/JJ ./.\n", encoding = "utf-8")
+    (input_folder / "broken.txt").write_bytes(b"bad/JJ \xff/NN\n")
+    for mode in ["default", "workers"]:
+        run_runner(input_folder, tmp_path / mode / "output", make_scratch_config(mode, adv_learning = adv_learning),
+                   *(["-w", "3"] if mode == "workers" else []))
+    for name in ["output.txt", "richout.txt", "rich_output.jsonl", "file_sentiment.csv"]:
+        assert (tmp_path / "workers" / "output" / name).read_bytes() == (tmp_path / "default" / "output" / name).read_bytes()
+    with open(tmp_path / "workers" / "output" / "output.txt", encoding = "utf-8") as f:
+        scores = dict(line.rstrip("\n").split("\t") for line in f)
+    assert len({scores["adorable%d.txt" % i] for i in range(3)}) == (2 if adv_learning else 1)
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_runner_columns_match_the_jsonl_tokens(make_scratch_config, sample_paths, tmp_path, workers):
+    # -col saves the words scored by sentiment_calculator/SO_Calc.py, as in its JSON lines token records (user-013)
+    numpy = pytest.importorskip("numpy")
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    for path in sample_paths[:4]:
+        shutil.copy(path, input_folder)
+    (input_folder / "broken.txt").write_bytes(b"bad/JJ \xff/NN\n")
+    run_runner(input_folder, tmp_path / "output", make_scratch_config("run", adv_learning = False),
+               "-w", workers, "-col", str(tmp_path / "words.npz"))
+    with open(tmp_path / "output" / "rich_output.jsonl", encoding = "utf-8") as f:
+        tokens = [json.loads(line) for line in f]
+    tokens = [[record["file"], record["index"], record["sentence"], record["POS"], record["lemma"], record["base_SO"],
+               record["final_SO"]] for record in tokens if record["record"] == "token"]
+    with numpy.load(str(tmp_path / "words.npz")) as archive:
+        (files, tags, lemmas) = (archive["files"], archive["POS_tags"], archive["lemmas"])
+        rows = [[str(files[archive["file_id"][i]]), int(archive["index"][i]), int(archive["sentence"][i]),
+                 str(tags[archive["POS_id"][i]]), str(lemmas[archive["lemma_id"][i]]), float(archive["raw_SO"][i]),
+                 float(archive["final_SO"][i])] for i in range(len(archive["index"]))]
+        assert "broken.txt" not in list(files)
+    assert tokens and rows == tokens
+
+def test_runner_packed_corpus_matches_a_run_per_file(make_scratch_config, sample_paths, tmp_path):
+    # -pk packs the input folder and scores it with sentiment_calculator/SO_Calc.py, and a packed corpus can be
+    # the input of a later run; both write what a run per file writes (user-017)
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    for path in sample_paths[:4]:
+        shutil.copy(path, input_folder)
+    for i in range(3):
+        (input_folder / ("cliche%d.txt" % i)).write_text("It/PRP was/VBD clichédly/RB good/JJ ./.\n", encoding = "utf-8")
+    (input_folder / "broken.txt").write_bytes(b"bad/JJ \xff/NN\n")
+    corpus_path = str(tmp_path / "input.pk")
+    run_runner(input_folder, tmp_path / "default" / "output", make_scratch_config("default"))
+    run_runner(input_folder, tmp_path / "pack" / "output", make_scratch_config("pack"), "-pk", corpus_path)
+    assert is_packed_corpus(corpus_path)
+    run_runner(corpus_path, tmp_path / "packed" / "output", make_scratch_config("packed"))
+    for mode in ["pack", "packed"]:
+        for name in ["output.txt", "richout.txt", "rich_output.jsonl", "file_sentiment.csv"]:
+            assert (tmp_path / mode / "output" / name).read_bytes() == (tmp_path / "default" / "output" / name).read_bytes()
+        for name in os.listdir(tmp_path / "default" / "dictionaries"):
+            assert (tmp_path / mode / "dictionaries" / name).read_bytes() == (tmp_path / "default" / "dictionaries" / name).read_bytes()